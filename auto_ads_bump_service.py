@@ -11,7 +11,10 @@ Version: 2.0.0
 
 import asyncio
 import logging
+import os
 import random
+import tempfile
+import weakref
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
@@ -29,6 +32,9 @@ class AutoAdsBumpService:
         self.telethon_manager = auto_ads_telethon_manager
         self.bot_instance = bot_instance
         self.active_campaigns = {}
+        # Resolved chat entities per client - access hashes are per account, and a
+        # bridge channel or target group does not change for the process lifetime
+        self._entity_cache = weakref.WeakKeyDictionary()
     
     def get_user_campaigns(self, user_id: int) -> List[Dict]:
         """Get all campaigns for a user"""
@@ -167,6 +173,23 @@ class AutoAdsBumpService:
             results['message'] = f"Error: {str(e)}"
             return results
     
+    async def _get_cached_entity(self, client, chat):
+        """client.get_entity(chat), resolved once per client and then served from memory"""
+        entities = self._entity_cache.setdefault(client, {})
+        entity = entities.get(chat)
+        if entity is None:
+            entity = entities[chat] = await client.get_entity(chat)
+        return entity
+    
+    async def _get_cached_input_entity(self, client, chat):
+        """client.get_input_entity(chat) - only the peer and access hash, from the session when known"""
+        entities = self._entity_cache.setdefault(client, {})
+        key = ('input', chat)
+        entity = entities.get(key)
+        if entity is None:
+            entity = entities[key] = await client.get_input_entity(chat)
+        return entity
+    
     async def _resolve_target_chats(self, client, target_chats_raw: list) -> list:
         """Resolve target chats - convert 'all' to actual group list"""
         try:
@@ -193,7 +216,7 @@ class AutoAdsBumpService:
                 for chat in target_chats_raw:
                     try:
                         if isinstance(chat, str):
-                            entity = await client.get_entity(chat)
+                            entity = await self._get_cached_entity(client, chat)
                             target_entities.append(entity)
                         else:
                             # Already an entity or ID
@@ -227,8 +250,8 @@ class AutoAdsBumpService:
             source_chat = ad_content['bridge_channel_entity']
             message_id = ad_content['bridge_message_id']
             
-            # Get source entity once
-            source_entity = await client.get_entity(source_chat)
+            # Get source peer once - only fetched from and forwarded from, so no full channel info needed
+            source_entity = await self._get_cached_input_entity(client, source_chat)
             
             # Get the original message from bridge channel
             logger.info(f"📎 Bridge mode - fetching original message from storage channel")
@@ -268,16 +291,26 @@ class AutoAdsBumpService:
                     if original_message.media:
                         # For media messages, we need to copy the media
                         # Download media to temp location then upload with buttons
+                        # (Telethon streams the download to disk in chunks, so the whole
+                        # file never sits in memory as one bytes object)
                         logger.info(f"📥 Downloading media from original message...")
-                        media_file = await client.download_media(original_message, file=bytes)
-                        
-                        logger.info(f"📤 Uploading media with buttons to bridge channel using Bot API...")
-                        bot_msg = await self.bot_instance.send_photo(
-                            chat_id=int(source_chat),
-                            photo=media_file,
-                            caption=original_message.message or "",
-                            reply_markup=reply_markup
-                        )
+                        fd, media_path = tempfile.mkstemp()
+                        os.close(fd)
+                        try:
+                            await client.download_media(original_message, file=media_path)
+                            logger.info(f"📤 Uploading {os.path.getsize(media_path)} bytes of media with buttons to bridge channel using Bot API...")
+                            with open(media_path, 'rb') as media_file:
+                                bot_msg = await self.bot_instance.send_photo(
+                                    chat_id=int(source_chat),
+                                    photo=media_file,
+                                    caption=original_message.message or "",
+                                    reply_markup=reply_markup
+                                )
+                        finally:
+                            try:
+                                os.unlink(media_path)
+                            except OSError:
+                                pass
                         message_to_forward = bot_msg.message_id
                         logger.info(f"✅ Created bridge message with buttons (ID: {message_to_forward})")
                     else:
@@ -982,7 +982,7 @@ async def handle_auto_ads_ad_content_received(update: Update, context: ContextTy
         match = re.search(r't\.me/c/(\d+)/(\d+)', bridge_text)
         if match:
             # Private channel: https://t.me/c/1234567890/123
-            channel_id = int('-100' + match.group(1))  # Convert to full channel ID
+            channel_id = -1000000000000 - int(match.group(1))  # Bot API id of the MTProto channel id
             message_id = int(match.group(2))
             session['data']['ad_content'] = {
                 'type': 'bridge',
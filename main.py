@@ -242,6 +242,9 @@ try:
         handle_userbot_phone_message,
         handle_userbot_verification_code_message,
         handle_telethon_setup,
+        UserbotSetupState,
+        userbot_callback_gate,
+        USERBOT_CALLBACK_PATTERN,
     )
     
     print("🔍 DEBUG: Importing scout system handlers...")
@@ -1524,11 +1527,13 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
         'awaiting_new_userbot_phone': handle_new_userbot_phone_message if USERBOT_AVAILABLE else None,
         'awaiting_new_userbot_code': handle_new_userbot_code_message if USERBOT_AVAILABLE else None,
         
-        # Legacy userbot setup message handlers (kept for compatibility)
-        'awaiting_userbot_api_id': handle_userbot_api_id_message if USERBOT_AVAILABLE else None,
-        'awaiting_userbot_api_hash': handle_userbot_api_hash_message if USERBOT_AVAILABLE else None,
-        'awaiting_userbot_phone': handle_userbot_phone_message if USERBOT_AVAILABLE else None,
-        'awaiting_userbot_verification_code': handle_userbot_verification_code_message if USERBOT_AVAILABLE else None,
+        # Legacy userbot setup message handlers (kept for compatibility; keyed by IntEnum state)
+        **({
+            UserbotSetupState.API_ID: handle_userbot_api_id_message,
+            UserbotSetupState.API_HASH: handle_userbot_api_hash_message,
+            UserbotSetupState.PHONE: handle_userbot_phone_message,
+            UserbotSetupState.CODE: handle_userbot_verification_code_message,
+        } if USERBOT_AVAILABLE else {}),
         'awaiting_telethon_code': handle_telethon_verification_code_message if USERBOT_AVAILABLE else None,
         
         # Scout system message handlers
@@ -1800,6 +1805,14 @@ async def post_shutdown(application: Application) -> None:
         except Exception as e:
             logger.error(f"❌ Userbot shutdown error: {e}", exc_info=True)
     
+    # Write delivery completions still queued for the batched writer
+    if USERBOT_AVAILABLE:
+        try:
+            from userbot_database import flush_delivery_completions
+            await flush_delivery_completions()
+        except Exception as e:
+            logger.error(f"❌ Error flushing delivery completions: {e}", exc_info=True)
+    
     logger.info("Post_shutdown finished.")
 
 async def clear_expired_baskets_job_wrapper(context: ContextTypes.DEFAULT_TYPE):
@@ -1853,6 +1866,15 @@ async def stock_alerts_job_wrapper(context: ContextTypes.DEFAULT_TYPE):
     except Exception as e:
         logger.error(f"Error in stock alerts job: {e}", exc_info=True)
 
+async def userbot_delivery_partitions_job_wrapper(context: ContextTypes.DEFAULT_TYPE):
+    """Wrapper for the userbot delivery partition maintenance job."""
+    logger.debug("Running background job: userbot_delivery_partitions")
+    try:
+        from userbot_database import maintain_delivery_partitions
+        await asyncio.to_thread(maintain_delivery_partitions)
+    except Exception as e:
+        logger.error(f"Error in userbot delivery partitions job: {e}", exc_info=True)
+
 async def auto_ads_execution_job_wrapper(context: ContextTypes.DEFAULT_TYPE):
     """Wrapper for executing pending auto ads campaigns."""
     logger.debug("Running background job: auto_ads_execution")
@@ -3814,6 +3836,9 @@ def main() -> None:
     application.add_handler(CommandHandler("refresh", refresh_menu)) # Force refresh menu
     application.add_handler(CommandHandler("v3", check_version_command)) # Debug version check
     application.add_handler(CommandHandler("admin", admin_command_wrapper)) # Use wrapped admin with ban check
+    if USERBOT_AVAILABLE:
+        # Reject userbot/telethon callbacks from users without access before the router runs
+        application.add_handler(CallbackQueryHandler(userbot_callback_gate, pattern=USERBOT_CALLBACK_PATTERN), group=-1)
     application.add_handler(CallbackQueryHandler(handle_callback_query))
     application.add_handler(MessageHandler(
         (filters.TEXT & ~filters.COMMAND) | filters.PHOTO | filters.VIDEO | filters.ANIMATION | filters.Document.ALL,
@@ -3840,6 +3865,10 @@ def main() -> None:
             # Stock management: Low stock alerts (runs every hour)
             job_queue.run_repeating(stock_alerts_job_wrapper, interval=timedelta(hours=1), first=timedelta(minutes=10), name="stock_alerts")
             
+            # Userbot deliveries: create upcoming daily partitions, drop expired ones
+            if USERBOT_AVAILABLE:
+                job_queue.run_repeating(userbot_delivery_partitions_job_wrapper, interval=timedelta(hours=6), first=timedelta(minutes=5), name="userbot_delivery_partitions")
+            
             # --- SOLANA MONITORING ---
             try:
                 from payment_solana import check_solana_deposits
@@ -83,8 +83,6 @@ async def deliver_product_via_userbot(
             if not result['success']:
                 raise Exception(result.get('error', 'Failed to send welcome message'))
             
-            await asyncio.sleep(1)  # Small delay between messages
-            
             # Send product media if available
             media_sent = False
             if 'media_path' in product_data and product_data['media_path']:
@@ -121,8 +119,6 @@ async def deliver_product_via_userbot(
                     else:
                         logger.warning(f"⚠️ Failed to send media: {result.get('error')}")
             
-            await asyncio.sleep(1)
-            
             # Send product details
             details_msg = _format_product_details(product_data, order_id)
             
@@ -272,8 +268,6 @@ async def deliver_basket_via_userbot(
             if not result['success']:
                 raise Exception(result.get('error', 'Failed to send welcome message'))
             
-            await asyncio.sleep(1)
-            
             # Send each product
             media_count = 0
             for idx, item in enumerate(basket_items, 1):
@@ -320,8 +314,6 @@ async def deliver_basket_via_userbot(
                 
                 if not result['success']:
                     logger.warning(f"⚠️ Failed to send details for item {idx}")
-                
-                await asyncio.sleep(1)  # Delay between items
             
             # Send completion message
             completion_msg = (
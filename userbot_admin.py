@@ -3,53 +3,261 @@ Userbot Admin Interface
 Handles all admin interface for userbot configuration and management
 """
 
+import asyncio
 import logging
+import re
+import time
+from enum import IntEnum
+from functools import wraps
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import ContextTypes
+from telegram.ext import ContextTypes, ApplicationHandlerStop
+from telegram.constants import ParseMode
+import telegram.error as telegram_error
 from datetime import datetime
 
 from userbot_config import userbot_config
-from userbot_manager import userbot_manager
 from userbot_database import (
-    get_delivery_stats,
-    get_connection_status,
+    get_dashboard_bundle,
     reset_userbot_config,
     init_userbot_tables
 )
-from product_delivery import test_userbot_delivery
-from utils import is_primary_admin, send_message_with_retry
+import utils
+from utils import send_message_with_retry
 
 logger = logging.getLogger(__name__)
 
-# Helper function for permission checks
-def check_userbot_access(user_id):
-    """Check if user has access to userbot features (admin or worker with marketing permission)"""
+# ==================== STATIC TEMPLATES ====================
+# Messages and keyboards that never change are built once at import time
+
+class UserbotSetupState(IntEnum):
+    """Legacy setup wizard states stored in user_data['state'] (routed by main.handle_message)"""
+    API_ID = 1
+    API_HASH = 2
+    PHONE = 3
+    CODE = 4
+
+# Conversation keys owned by each setup flow, cleared together on finish/abort
+_USERBOT_CTX_KEYS = ("state", "userbot_api_id", "userbot_api_hash", "userbot_phone")
+_TELETHON_CTX_KEYS = ("state", "telethon_api_id", "telethon_api_hash", "telethon_phone")
+_NEW_USERBOT_CTX_KEYS = (
+    "state", "new_userbot_name", "new_userbot_api_id", "new_userbot_api_hash",
+    "new_userbot_phone", "new_userbot_phone_code_hash", "new_userbot_temp_client"
+)
+
+# Input validation for the setup flows (API ID, 32-char hex API hash, E.164 phone); ASCII
+# digits only - \d would also accept other scripts' digits
+_RE_API_ID = re.compile(r"^[0-9]{1,10}$")
+_RE_API_HASH = re.compile(r"^[0-9a-fA-F]{32}$")
+_RE_PHONE = re.compile(r"^\+[1-9][0-9]{6,14}$")
+
+# Status dashboard rows (buttons are immutable, so rows can be shared across renders)
+_DASH_CONNECTED_ROW = [
+    InlineKeyboardButton("🔌 Disconnect", callback_data="userbot_disconnect"),
+    InlineKeyboardButton("🧪 Test", callback_data="userbot_test")
+]
+_DASH_DISCONNECTED_ROW = [InlineKeyboardButton("🔌 Connect", callback_data="userbot_connect")]
+_DASH_STATIC_ROWS = (
+    [InlineKeyboardButton("⚙️ Settings", callback_data="userbot_settings"),
+     InlineKeyboardButton("📊 Stats", callback_data="userbot_stats")],
+    [InlineKeyboardButton("🔐 Setup Secret Chat", callback_data="telethon_setup")],
+    [InlineKeyboardButton("🗑️ Reset Config", callback_data="userbot_reset_confirm")],
+    [InlineKeyboardButton("⬅️ Back to Admin", callback_data="admin_menu")]
+)
+
+# Settings toggle callbacks keyed by the target value (only two strings each)
+_CB_TOGGLE_ENABLED = {v: f"userbot_toggle_enabled|{v}" for v in (True, False)}
+_CB_TOGGLE_RECONNECT = {v: f"userbot_toggle_reconnect|{v}" for v in (True, False)}
+_CB_TOGGLE_NOTIF = {v: f"userbot_toggle_notifications|{v}" for v in (True, False)}
+
+# Row template for the recent-deliveries list in the stats panel
+_DELIVERY_ROW_FMT = "{emoji} User {uid} - {time}".format
+
+_CANCEL_KB = InlineKeyboardMarkup([[InlineKeyboardButton("❌ Cancel", callback_data="userbot_control")]])
+
+_SETUP_WIZARD_MSG = (
+    "🤖 <b>Userbot Setup Wizard</b>\n\n"
+    "⚠️ <b>PURPOSE:</b> This userbot is used ONLY for delivering products via TRUE encrypted Telegram secret chats.\n\n"
+    "<b>What is a userbot?</b>\n"
+    "A Telegram user account that acts as a bot. It can:\n"
+    "• Create TRUE secret chats (end-to-end encrypted)\n"
+    "• Send self-destructing messages\n"
+    "• Deliver media securely with no server storage\n\n"
+    "<b>Requirements:</b>\n"
+    "• A separate Telegram account (NOT your main bot account)\n"
+    "• API ID and API Hash from https://my.telegram.org/apps\n"
+    "• Phone number for verification\n\n"
+    "<b>Two-Step Setup:</b>\n"
+    "1️⃣ First: Configure userbot credentials (Pyrogram)\n"
+    "2️⃣ Then: Enable secret chats (Telethon)\n\n"
+    "Click <b>Start Setup</b> to begin!"
+)
+
+_SETUP_WIZARD_KB = InlineKeyboardMarkup([
+    [InlineKeyboardButton("🚀 Start Setup", callback_data="userbot_setup_start")],
+    [InlineKeyboardButton("⬅️ Back to Admin", callback_data="admin_menu")]
+])
+
+_API_ID_PROMPT_MSG = (
+    "🔧 <b>Step 1/3: API ID</b>\n\n"
+    "Get your API ID from: https://my.telegram.org\n\n"
+    "1. Log in with your phone number\n"
+    "2. Go to 'API development tools'\n"
+    "3. Create an application if you haven't\n"
+    "4. Copy your <b>API ID</b>\n\n"
+    "📝 <b>Please send your API ID now:</b>"
+)
+
+_API_HASH_PROMPT_MSG = (
+    "✅ <b>API ID Saved!</b>\n\n"
+    "🔧 <b>Step 2/3: API Hash</b>\n\n"
+    "From the same page (https://my.telegram.org), copy your <b>API Hash</b>.\n\n"
+    "📝 <b>Please send your API Hash now:</b>"
+)
+
+_PHONE_PROMPT_MSG = (
+    "✅ <b>API Hash Saved!</b>\n\n"
+    "🔧 <b>Step 3/3: Phone Number</b>\n\n"
+    "Enter the phone number for your userbot account.\n\n"
+    "<b>Format:</b> +1234567890 (include country code)\n\n"
+    "📝 <b>Please send your phone number now:</b>"
+)
+
+_RESET_CONFIRM_MSG = (
+    "⚠️ <b>Reset Userbot Configuration</b>\n\n"
+    "This will:\n"
+    "• Delete all configuration\n"
+    "• Remove saved session\n"
+    "• Disconnect userbot\n"
+    "• Keep delivery statistics\n\n"
+    "<b>Are you sure you want to reset?</b>"
+)
+
+_RESET_CONFIRM_KB = InlineKeyboardMarkup([
+    [InlineKeyboardButton("✅ Yes, Reset", callback_data="userbot_reset_confirmed"),
+     InlineKeyboardButton("❌ Cancel", callback_data="userbot_control")]
+])
+
+# Short-lived snapshot of connection status + delivery stats so bursts of
+# dashboard refreshes share one DB read instead of hitting it per click
+_DASHBOARD_CACHE_TTL = 2.0
+_dashboard_cache = {"ts": 0.0, "status": None, "stats": None}
+
+def _get_dashboard_snapshot():
+    """Return (status, stats), re-reading the DB at most once per TTL window"""
+    now = time.monotonic()
+    if _dashboard_cache["status"] is None or now - _dashboard_cache["ts"] >= _DASHBOARD_CACHE_TTL:
+        _dashboard_cache["status"], _dashboard_cache["stats"] = get_dashboard_bundle()
+        _dashboard_cache["ts"] = now
+    return _dashboard_cache["status"], _dashboard_cache["stats"]
+
+def _invalidate_dashboard_snapshot():
+    """Force the next dashboard render to re-read status/stats (call after mutations)"""
+    _dashboard_cache["ts"] = 0.0
+
+# One in-flight userbot_manager.initialize() shared by concurrent Connect clicks
+_init_lock = asyncio.Lock()
+_init_inflight = None
+
+async def _coalesced_initialize() -> bool:
+    """Run userbot_manager.initialize(), joining an attempt already in progress"""
+    global _init_inflight
+    from userbot_manager import userbot_manager
+    async with _init_lock:
+        if _init_inflight is None or _init_inflight.done():
+            _init_inflight = asyncio.ensure_future(userbot_manager.initialize())
+        fut = _init_inflight
+    # Shield so one cancelled caller does not abort the attempt for the others
+    return await asyncio.shield(fut)
+
+# Primary admin IDs are fixed at startup (env), so snapshot them once for O(1) checks
+_PRIMARY_ADMINS: frozenset = frozenset(utils.PRIMARY_ADMIN_IDS)
+
+def invalidate_primary_admins():
+    """Reload the cached primary admin set (call if PRIMARY_ADMIN_IDS changes at runtime)"""
+    global _PRIMARY_ADMINS
+    _PRIMARY_ADMINS = frozenset(utils.PRIMARY_ADMIN_IDS)
+
+def _is_primary(user_id) -> bool:
+    """Check if user is a primary admin using the cached set"""
+    return user_id in _PRIMARY_ADMINS
+
+def _is_marketing_worker(user_id) -> bool:
+    """Check if user is a worker with marketing permission"""
     try:
         from worker_management import is_worker, check_worker_permission
-        is_auth_worker = is_worker(user_id) and check_worker_permission(user_id, 'marketing')
+        return is_worker(user_id) and check_worker_permission(user_id, 'marketing')
     except ImportError:
-        is_auth_worker = False
+        return False
+
+# Helper function for permission checks
+def check_userbot_access(user_id):
+    """Check if user has access to userbot features (admin or worker with marketing permission)"""
+    # Admin check first - it's a set lookup, the worker check hits the DB
+    return _is_primary(user_id) or _is_marketing_worker(user_id)
+
+def _uid(update: Update) -> int:
+    """User id of the caller for both callback and message updates"""
+    return update.callback_query.from_user.id if update.callback_query else update.effective_user.id
+
+def userbot_access_only(func):
+    """Reject callers without userbot access before the handler body runs (message handlers;
+    callback presses are already checked once by userbot_callback_gate)"""
+    @wraps(func)
+    async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE, *args, **kwargs):
+        if not check_userbot_access(_uid(update)):
+            if update.callback_query:
+                await update.callback_query.answer("Access denied", show_alert=True)
+            return
+        return await func(update, context, *args, **kwargs)
+    return wrapper
+
+# Callback prefixes owned by this module, gated by userbot_callback_gate before routing
+USERBOT_CALLBACK_PATTERN = r"^(userbot_|telethon_)"
+
+async def userbot_callback_gate(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Pre-dispatch filter (handler group -1): drop userbot callbacks from users without access
     
-    is_admin = is_primary_admin(user_id)
-    return is_admin or is_auth_worker
+    Authorized presses fall through to the main callback router, so the callback
+    handlers themselves carry no access check of their own.
+    """
+    if check_userbot_access(_uid(update)):
+        return
+    await update.callback_query.answer("Access denied", show_alert=True)
+    raise ApplicationHandlerStop
+
+def expects_state(state):
+    """Only run a message handler while the user is in the given conversation state"""
+    def decorator(func):
+        @wraps(func)
+        async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE, *args, **kwargs):
+            if context.user_data.get('state') != state:
+                return
+            return await func(update, context, *args, **kwargs)
+        return wrapper
+    return decorator
+
+# Seconds Telegram clients may reuse a navigation answer instead of re-sending the press
+_NAV_CACHE_TIME = 2
+
+async def _answer_nav(query):
+    """Answer an idempotent navigation callback with a short client-side cache"""
+    try:
+        await query.answer(cache_time=_NAV_CACHE_TIME)
+    except telegram_error.BadRequest:
+        pass  # Already answered by the handler that routed here
 
 # ==================== MAIN USERBOT CONTROL PANEL ====================
 
 async def handle_userbot_control(update: Update, context: ContextTypes.DEFAULT_TYPE, params=None):
     """Main userbot control panel - shows list of all userbots"""
     query = update.callback_query
-    user_id = query.from_user.id
-    
-    if not check_userbot_access(user_id):
-        await query.answer("Access denied", show_alert=True)
-        return
+    await _answer_nav(query)
     
     # Always show userbot list/dashboard
     await _show_userbot_dashboard(query, context)
 
 async def _show_userbot_dashboard(query, context):
     """Show minimalistic dashboard with list of all userbots"""
-    import time
     from userbot_database import get_db_connection
     
     update_time = time.strftime("%H:%M:%S")
@@ -143,28 +351,20 @@ async def _show_userbot_dashboard(query, context):
         ])
     
     # Dynamic back button for workers
-    try:
-        from worker_management import is_worker, check_worker_permission
-        is_auth_worker = is_worker(query.from_user.id) and check_worker_permission(query.from_user.id, 'marketing')
-    except:
-        is_auth_worker = False
-    
-    is_admin = is_primary_admin(query.from_user.id)
-    back_callback = "admin_menu" if not is_auth_worker or is_admin else "worker_marketing"
+    user_id = query.from_user.id
+    if _is_primary(user_id):
+        back_callback = "admin_menu"
+    else:
+        back_callback = "worker_marketing" if _is_marketing_worker(user_id) else "admin_menu"
     
     keyboard.append([InlineKeyboardButton("🔍 Scout System", callback_data="scout_menu")])
     keyboard.append([InlineKeyboardButton("⬅️ Back", callback_data=back_callback)])
     
-    await query.edit_message_text(msg, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='HTML')
+    await query.edit_message_text(msg, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode=ParseMode.HTML)
 
 async def handle_userbot_add_new(update: Update, context: ContextTypes.DEFAULT_TYPE, params=None):
     """Start add new userbot wizard"""
     query = update.callback_query
-    user_id = query.from_user.id
-    
-    if not check_userbot_access(user_id):
-        await query.answer("Access denied", show_alert=True)
-        return
     
     msg = "➕ <b>Add New Secret Chat Userbot</b>\n\n"
     msg += "⚠️ <b>PURPOSE:</b> This account will ONLY be used for delivering products via TRUE encrypted Telegram secret chats.\n\n"
@@ -185,16 +385,11 @@ async def handle_userbot_add_new(update: Update, context: ContextTypes.DEFAULT_T
         [InlineKeyboardButton("❌ Cancel", callback_data="userbot_control")]
     ]
     
-    await query.edit_message_text(msg, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='HTML')
+    await query.edit_message_text(msg, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode=ParseMode.HTML)
 
 async def handle_userbot_add_start_name(update: Update, context: ContextTypes.DEFAULT_TYPE, params=None):
     """Step 1: Ask for userbot name"""
     query = update.callback_query
-    user_id = query.from_user.id
-    
-    if not check_userbot_access(user_id):
-        await query.answer("Access denied", show_alert=True)
-        return
     
     msg = "➕ <b>Step 1/5: Userbot Name</b>\n\n"
     msg += "Give this userbot a name (for identification).\n\n"
@@ -206,17 +401,11 @@ async def handle_userbot_add_start_name(update: Update, context: ContextTypes.DE
     
     context.user_data['state'] = 'awaiting_new_userbot_name'
     
-    keyboard = [[InlineKeyboardButton("❌ Cancel", callback_data="userbot_control")]]
-    await query.edit_message_text(msg, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='HTML')
+    await query.edit_message_text(msg, reply_markup=_CANCEL_KB, parse_mode=ParseMode.HTML)
 
 async def handle_userbot_stats_all(update: Update, context: ContextTypes.DEFAULT_TYPE, params=None):
     """Show statistics for all userbots"""
     query = update.callback_query
-    user_id = query.from_user.id
-    
-    if not check_userbot_access(user_id):
-        await query.answer("Access denied", show_alert=True)
-        return
     
     msg = "📊 <b>Userbot Statistics</b>\n\n"
     msg += "Coming soon! This will show:\n"
@@ -226,16 +415,11 @@ async def handle_userbot_stats_all(update: Update, context: ContextTypes.DEFAULT
     msg += "• Load distribution\n"
     
     keyboard = [[InlineKeyboardButton("⬅️ Back", callback_data="userbot_control")]]
-    await query.edit_message_text(msg, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='HTML')
+    await query.edit_message_text(msg, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode=ParseMode.HTML)
 
 async def handle_userbot_reconnect_all(update: Update, context: ContextTypes.DEFAULT_TYPE, params=None):
     """Reconnect all userbots in the pool"""
     query = update.callback_query
-    user_id = query.from_user.id
-    
-    if not check_userbot_access(user_id):
-        await query.answer("Access denied", show_alert=True)
-        return
     
     await query.answer("🔄 Reconnecting all userbots...", show_alert=False)
     
@@ -261,229 +445,157 @@ async def handle_userbot_reconnect_all(update: Update, context: ContextTypes.DEF
 
 async def _show_setup_wizard(query, context):
     """Show initial setup wizard"""
-    msg = "🤖 <b>Userbot Setup Wizard</b>\n\n"
-    msg += "⚠️ <b>PURPOSE:</b> This userbot is used ONLY for delivering products via TRUE encrypted Telegram secret chats.\n\n"
-    msg += "<b>What is a userbot?</b>\n"
-    msg += "A Telegram user account that acts as a bot. It can:\n"
-    msg += "• Create TRUE secret chats (end-to-end encrypted)\n"
-    msg += "• Send self-destructing messages\n"
-    msg += "• Deliver media securely with no server storage\n\n"
-    msg += "<b>Requirements:</b>\n"
-    msg += "• A separate Telegram account (NOT your main bot account)\n"
-    msg += "• API ID and API Hash from https://my.telegram.org/apps\n"
-    msg += "• Phone number for verification\n\n"
-    msg += "<b>Two-Step Setup:</b>\n"
-    msg += "1️⃣ First: Configure userbot credentials (Pyrogram)\n"
-    msg += "2️⃣ Then: Enable secret chats (Telethon)\n\n"
-    msg += "Click <b>Start Setup</b> to begin!"
-    
-    keyboard = [
-        [InlineKeyboardButton("🚀 Start Setup", callback_data="userbot_setup_start")],
-        [InlineKeyboardButton("⬅️ Back to Admin", callback_data="admin_menu")]
-    ]
-    
-    await query.edit_message_text(msg, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='HTML')
+    await query.edit_message_text(_SETUP_WIZARD_MSG, reply_markup=_SETUP_WIZARD_KB, parse_mode=ParseMode.HTML)
 
 async def _show_status_dashboard(query, context):
     """Show userbot status dashboard"""
     # 🚀  Force FRESH read from DB, bypass cache completely
     config = userbot_config.get_dict(force_fresh=True)
-    status = get_connection_status()
-    stats = get_delivery_stats()
-    
-    # 🚀  Add timestamp to force message update
-    import time
-    update_time = time.strftime("%H:%M:%S")
-    
-    msg = f"🤖 <b>Userbot Control Panel</b> <i>(Updated: {update_time})</i>\n\n"
-    
-    # Configuration status
-    config_status = "✅ Configured" if userbot_config.is_configured() else "❌ Not Configured"
-    msg += f"<b>Configuration Status:</b> {config_status}\n"
-    
-    # Connection status
+    status, stats = _get_dashboard_snapshot()
+    
+    # Configuration / connection status
+    # Same rule as is_userbot_configured(), but from the row we already fetched
+    is_configured = bool(
+        config.get('api_id') and config.get('api_hash') and config.get('phone_number')
+        and config.get('api_id') != 'pending'
+    )
+    config_status = "✅ Configured" if is_configured else "❌ Not Configured"
     is_connected = status.get('is_connected', False)
     conn_status = "✅ Connected" if is_connected else "❌ Disconnected"
     status_msg = status.get('status_message', 'Unknown')
-    msg += f"<b>Connection Status:</b> {conn_status}\n"
-    msg += f"*{status_msg}*\n"
+    
+    lines = [
+        "🤖 <b>Userbot Control Panel</b>",
+        "",
+        f"<b>Configuration Status:</b> {config_status}",
+        f"<b>Connection Status:</b> {conn_status}",
+        f"*{status_msg}*",
+    ]
     
     # Last updated
     last_updated = status.get('last_updated')
     if last_updated:
-        msg += f"<b>Last Updated:</b> {last_updated.strftime('%Y-%m-%d %H:%M:%S UTC')}\n"
+        lines.append(f"<b>Last Updated:</b> {last_updated.strftime('%Y-%m-%d %H:%M:%S UTC')}")
     
     # 🔐 Telethon Secret Chat Status
-    msg += "\n<b>🔐 Secret Chat (Telethon):</b>\n"
+    lines += ["", "<b>🔐 Secret Chat (Telethon):</b>"]
     try:
         from userbot_telethon_secret import telethon_secret_chat
         if telethon_secret_chat.is_connected:
-            msg += "✅ Telethon Connected - TRUE SECRET CHATS ENABLED!\n"
+            lines.append("✅ Telethon Connected - TRUE SECRET CHATS ENABLED!")
         else:
-            msg += "⚠️ Telethon Not Connected - Regular delivery only\n"
-            msg += "<i>Set up Telethon for encrypted secret chats</i>\n"
+            lines.append("⚠️ Telethon Not Connected - Regular delivery only")
+            lines.append("<i>Set up Telethon for encrypted secret chats</i>")
     except Exception as e:
-        msg += "❌ Telethon Not Available\n"
-    
-    msg += "\n<b>Settings:</b>\n"
+        lines.append("❌ Telethon Not Available")
     
-    # Enabled status
+    # Settings
     enabled = config.get('enabled', False)
-    enabled_status = "✅ Enabled" if enabled else "❌ Disabled"
-    msg += f"• Delivery: {enabled_status}\n"
-    
-    # Auto-reconnect
     auto_reconnect = config.get('auto_reconnect', True)
-    reconnect_status = "✅ Enabled" if auto_reconnect else "❌ Disabled"
-    msg += f"• Auto-Reconnect: {reconnect_status}\n"
-    
-    # Notifications
     notifications = config.get('send_notifications', True)
-    notif_status = "✅ Enabled" if notifications else "❌ Disabled"
-    msg += f"• Admin Notifications: {notif_status}\n"
-    
-    # TTL
-    ttl = config.get('secret_chat_ttl', 86400)
-    ttl_hours = ttl // 3600
-    msg += f"• Message TTL: {ttl_hours} hours\n"
-    
-    # Max retries
+    ttl_hours = config.get('secret_chat_ttl', 86400) // 3600
     max_retries = config.get('max_retries', 3)
-    msg += f"• Max Retries: {max_retries}\n"
     
-    msg += "\n<b>Statistics:</b>\n"
-    msg += f"• Total Deliveries: {stats['total']}\n"
-    msg += f"• Success Rate: {stats['success_rate']}%\n"
-    msg += f"• Failed Deliveries: {stats['failed']}\n"
-    
-    # Build keyboard based on connection status
-    keyboard = []
-    
-    if is_connected:
-        keyboard.append([
-            InlineKeyboardButton("🔌 Disconnect", callback_data="userbot_disconnect"),
-            InlineKeyboardButton("🧪 Test", callback_data="userbot_test")
-        ])
-    else:
-        keyboard.append([InlineKeyboardButton("🔌 Connect", callback_data="userbot_connect")])
-    
-    keyboard.extend([
-        [InlineKeyboardButton("⚙️ Settings", callback_data="userbot_settings"),
-         InlineKeyboardButton("📊 Stats", callback_data="userbot_stats")],
-        [InlineKeyboardButton("🔐 Setup Secret Chat", callback_data="telethon_setup")],
-        [InlineKeyboardButton("🗑️ Reset Config", callback_data="userbot_reset_confirm")],
-        [InlineKeyboardButton("⬅️ Back to Admin", callback_data="admin_menu")]
-    ])
+    lines += [
+        "",
+        "<b>Settings:</b>",
+        f"• Delivery: {'✅ Enabled' if enabled else '❌ Disabled'}",
+        f"• Auto-Reconnect: {'✅ Enabled' if auto_reconnect else '❌ Disabled'}",
+        f"• Admin Notifications: {'✅ Enabled' if notifications else '❌ Disabled'}",
+        f"• Message TTL: {ttl_hours} hours",
+        f"• Max Retries: {max_retries}",
+        "",
+        "<b>Statistics:</b>",
+        f"• Total Deliveries: {stats['total']}",
+        f"• Success Rate: {stats['success_rate']}%",
+        f"• Failed Deliveries: {stats['failed']}",
+    ]
+    msg = "\n".join(lines)
+    
+    # Only the first row depends on connection status
+    keyboard = [_DASH_CONNECTED_ROW if is_connected else _DASH_DISCONNECTED_ROW, *_DASH_STATIC_ROWS]
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    
+    # Skip the edit entirely when this message already shows the same render.
+    # The keyboard comparison guards against the user having navigated away
+    # (another panel on the same message) since the hash was stored.
+    render_key = (
+        query.message.message_id if query.message else None,
+        hash((msg, tuple(b.callback_data for row in keyboard for b in row)))
+    )
+    if (context.user_data.get('last_dashboard_hash') == render_key
+            and query.message and query.message.reply_markup == reply_markup):
+        return
+    context.user_data['last_dashboard_hash'] = render_key
     
-    await query.edit_message_text(msg, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='HTML')
+    try:
+        await query.edit_message_text(msg, reply_markup=reply_markup, parse_mode=ParseMode.HTML)
+    except telegram_error.BadRequest as e:
+        if "message is not modified" not in str(e).lower():
+            raise
 
 # ==================== SETUP WIZARD ====================
 
 async def handle_userbot_setup_start(update: Update, context: ContextTypes.DEFAULT_TYPE, params=None):
     """Start setup wizard - ask for API ID"""
     query = update.callback_query
-    user_id = query.from_user.id
-    
-    if not check_userbot_access(user_id):
-        await query.answer("Access denied", show_alert=True)
-        return
     
-    msg = "🔧 <b>Step 1/3: API ID</b>\n\n"
-    msg += "Get your API ID from: https://my.telegram.org\n\n"
-    msg += "1. Log in with your phone number\n"
-    msg += "2. Go to 'API development tools'\n"
-    msg += "3. Create an application if you haven't\n"
-    msg += "4. Copy your <b>API ID</b>\n\n"
-    msg += "📝 <b>Please send your API ID now:</b>"
-    
-    keyboard = [[InlineKeyboardButton("❌ Cancel", callback_data="userbot_control")]]
-    
-    await query.edit_message_text(msg, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='HTML')
+    await query.edit_message_text(_API_ID_PROMPT_MSG, reply_markup=_CANCEL_KB, parse_mode=ParseMode.HTML)
     
     # Set state
-    context.user_data['state'] = 'awaiting_userbot_api_id'
+    context.user_data['state'] = UserbotSetupState.API_ID
 
+@expects_state(UserbotSetupState.API_ID)
+@userbot_access_only
 async def handle_userbot_api_id_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle API ID input"""
-    if context.user_data.get('state') != 'awaiting_userbot_api_id':
-        return
-    
-    user_id = update.effective_user.id
-    if not check_userbot_access(user_id):
-        return
-    
     api_id = update.message.text.strip()
     
     # Validate API ID (should be numeric)
-    if not api_id.isdigit():
+    if not _RE_API_ID.fullmatch(api_id):
         await update.message.reply_text(
             "❌ <b>Invalid API ID</b>\n\nAPI ID should be a number. Please try again:",
-            parse_mode='HTML'
+            parse_mode=ParseMode.HTML
         )
         return
     
     # Store in context
     context.user_data['userbot_api_id'] = api_id
-    context.user_data['state'] = 'awaiting_userbot_api_hash'
-    
-    msg = "✅ <b>API ID Saved!</b>\n\n"
-    msg += "🔧 <b>Step 2/3: API Hash</b>\n\n"
-    msg += "From the same page (https://my.telegram.org), copy your <b>API Hash</b>.\n\n"
-    msg += "📝 <b>Please send your API Hash now:</b>"
+    context.user_data['state'] = UserbotSetupState.API_HASH
     
-    keyboard = [[InlineKeyboardButton("❌ Cancel", callback_data="userbot_control")]]
-    
-    await update.message.reply_text(msg, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='HTML')
+    await update.message.reply_text(_API_HASH_PROMPT_MSG, reply_markup=_CANCEL_KB, parse_mode=ParseMode.HTML)
 
+@expects_state(UserbotSetupState.API_HASH)
+@userbot_access_only
 async def handle_userbot_api_hash_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle API Hash input"""
-    if context.user_data.get('state') != 'awaiting_userbot_api_hash':
-        return
-    
-    user_id = update.effective_user.id
-    if not check_userbot_access(user_id):
-        return
-    
     api_hash = update.message.text.strip()
     
     # Validate API Hash (should be alphanumeric, 32 chars)
-    if len(api_hash) < 20:
+    if not _RE_API_HASH.fullmatch(api_hash):
         await update.message.reply_text(
-            "❌ <b>Invalid API Hash</b>\n\nAPI Hash seems too short. Please check and try again:",
-            parse_mode='HTML'
+            "❌ <b>Invalid API Hash</b>\n\nAPI Hash should be 32 hexadecimal characters. Please check and try again:",
+            parse_mode=ParseMode.HTML
         )
         return
     
     # Store in context
     context.user_data['userbot_api_hash'] = api_hash
-    context.user_data['state'] = 'awaiting_userbot_phone'
-    
-    msg = "✅ <b>API Hash Saved!</b>\n\n"
-    msg += "🔧 <b>Step 3/3: Phone Number</b>\n\n"
-    msg += "Enter the phone number for your userbot account.\n\n"
-    msg += "<b>Format:</b> +1234567890 (include country code)\n\n"
-    msg += "📝 <b>Please send your phone number now:</b>"
-    
-    keyboard = [[InlineKeyboardButton("❌ Cancel", callback_data="userbot_control")]]
+    context.user_data['state'] = UserbotSetupState.PHONE
     
-    await update.message.reply_text(msg, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='HTML')
+    await update.message.reply_text(_PHONE_PROMPT_MSG, reply_markup=_CANCEL_KB, parse_mode=ParseMode.HTML)
 
+@expects_state(UserbotSetupState.PHONE)
+@userbot_access_only
 async def handle_userbot_phone_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle phone number input and start authentication"""
-    if context.user_data.get('state') != 'awaiting_userbot_phone':
-        return
-    
-    user_id = update.effective_user.id
-    if not check_userbot_access(user_id):
-        return
-    
     phone_number = update.message.text.strip()
     
     # Validate phone number (should start with +)
-    if not phone_number.startswith('+'):
+    if not _RE_PHONE.fullmatch(phone_number):
         await update.message.reply_text(
             "❌ <b>Invalid Phone Number</b>\n\nPhone number must start with + and include country code.\n\nExample: +1234567890\n\nPlease try again:",
-            parse_mode='HTML'
+            parse_mode=ParseMode.HTML
         )
         return
     
@@ -493,96 +605,92 @@ async def handle_userbot_phone_message(update: Update, context: ContextTypes.DEF
     
     if not api_id or not api_hash:
         await update.message.reply_text("❌ <b>Error:</b> Setup data lost. Please start again.")
-        context.user_data.pop('state', None)
+        for key in _USERBOT_CTX_KEYS:
+            context.user_data.pop(key, None)
         return
     
     # Save config to database
     userbot_config.save(api_id, api_hash, phone_number)
     
     # Start phone authentication
-    await update.message.reply_text("⏳ <b>Sending verification code...</b>", parse_mode='HTML')
+    from userbot_manager import userbot_manager
+    progress = await update.message.reply_text("⏳ <b>Sending verification code...</b>", parse_mode=ParseMode.HTML, disable_notification=True)
     
     result = await userbot_manager.start_phone_auth(phone_number)
     
     if not result['success']:
         error_msg = result.get('error', 'Unknown error')
-        await update.message.reply_text(
+        await progress.edit_text(
             f"❌ <b>Authentication Failed</b>\n\n{error_msg}\n\nPlease try again or contact support.",
-            parse_mode='HTML'
+            parse_mode=ParseMode.HTML
         )
-        context.user_data.pop('state', None)
+        for key in _USERBOT_CTX_KEYS:
+            context.user_data.pop(key, None)
         return
     
     # Store phone for verification step
     context.user_data['userbot_phone'] = phone_number
-    context.user_data['state'] = 'awaiting_userbot_verification_code'
+    context.user_data['state'] = UserbotSetupState.CODE
     
     msg = "✅ <b>Verification Code Sent!</b>\n\n"
     msg += f"A verification code has been sent to <b>{phone_number}</b>.\n\n"
     msg += "📝 <b>Please send the verification code now:</b>"
     
-    keyboard = [[InlineKeyboardButton("❌ Cancel", callback_data="userbot_control")]]
-    
-    await update.message.reply_text(msg, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='HTML')
+    await progress.edit_text(msg, reply_markup=_CANCEL_KB, parse_mode=ParseMode.HTML)
 
+@expects_state(UserbotSetupState.CODE)
+@userbot_access_only
 async def handle_userbot_verification_code_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle verification code input"""
-    if context.user_data.get('state') != 'awaiting_userbot_verification_code':
-        return
-    
-    user_id = update.effective_user.id
-    if not check_userbot_access(user_id):
-        return
-    
     code = update.message.text.strip()
     phone_number = context.user_data.get('userbot_phone')
     
     if not phone_number:
         await update.message.reply_text("❌ <b>Error:</b> Phone number not found. Please start again.")
-        context.user_data.pop('state', None)
+        for key in _USERBOT_CTX_KEYS:
+            context.user_data.pop(key, None)
         return
     
-    await update.message.reply_text("⏳ <b>Verifying code...</b>", parse_mode='HTML')
+    from userbot_manager import userbot_manager
+    progress = await update.message.reply_text("⏳ <b>Verifying code...</b>", parse_mode=ParseMode.HTML, disable_notification=True)
     
     result = await userbot_manager.verify_phone_code(phone_number, code)
     
     if not result['success']:
         error_msg = result.get('error', 'Unknown error')
-        await update.message.reply_text(
+        await progress.edit_text(
             f"❌ <b>Verification Failed</b>\n\n{error_msg}\n\nPlease try again:",
-            parse_mode='HTML'
+            parse_mode=ParseMode.HTML
         )
         return
     
     # Clear state
-    context.user_data.pop('state', None)
-    context.user_data.pop('userbot_api_id', None)
-    context.user_data.pop('userbot_api_hash', None)
-    context.user_data.pop('userbot_phone', None)
+    for key in _USERBOT_CTX_KEYS:
+        context.user_data.pop(key, None)
     
-    # Success message
+    # Success message (progress message is edited in place for each stage)
     username = result.get('username', 'User')
     msg = "🎉 <b>Setup Complete!</b>\n\n"
     msg += f"Userbot authenticated as <b>@{username}</b>!\n\n"
     msg += "✅ Configuration saved\n"
     msg += "✅ Session stored securely\n\n"
-    msg += "Now connecting to Telegram..."
     
-    await update.message.reply_text(msg, parse_mode='HTML')
+    await progress.edit_text(msg + "Now connecting to Telegram...", parse_mode=ParseMode.HTML)
     
     # Initialize userbot
     await asyncio.sleep(1)
-    success = await userbot_manager.initialize()
+    success = await _coalesced_initialize()
+    _invalidate_dashboard_snapshot()
     
     if success:
-        await update.message.reply_text(
-            "✅ <b>Userbot Connected!</b>\n\nYour userbot is now ready to deliver products via secret chats!",
-            parse_mode='HTML'
+        await progress.edit_text(
+            msg + "✅ <b>Userbot Connected!</b>\n\nYour userbot is now ready to deliver products via secret chats!",
+            parse_mode=ParseMode.HTML
         )
     else:
-        await update.message.reply_text(
-            "⚠️ <b>Connection Issue</b>\n\nSetup complete but failed to connect. Try reconnecting from the control panel.",
-            parse_mode='HTML'
+        await progress.edit_text(
+            msg + "⚠️ <b>Connection Issue</b>\n\nSetup complete but failed to connect. Try reconnecting from the control panel.",
+            parse_mode=ParseMode.HTML
         )
 
 # ==================== CONNECTION MANAGEMENT ====================
@@ -590,15 +698,15 @@ async def handle_userbot_verification_code_message(update: Update, context: Cont
 async def handle_userbot_connect(update: Update, context: ContextTypes.DEFAULT_TYPE, params=None):
     """Connect userbot"""
     query = update.callback_query
-    user_id = query.from_user.id
-    
-    if not check_userbot_access(user_id):
-        await query.answer("Access denied", show_alert=True)
-        return
     
-    await query.answer("Connecting...", show_alert=False)
+    # Acknowledge the click while the connection attempt is already in flight
+    ack = asyncio.create_task(query.answer("Connecting...", show_alert=False))
     
-    success = await userbot_manager.initialize()
+    try:
+        success = await _coalesced_initialize()
+        _invalidate_dashboard_snapshot()
+    finally:
+        await ack  # also when the work raised, so the spinner is answered and the task retrieved
     
     if success:
         await query.answer("✅ Connected successfully!", show_alert=True)
@@ -611,15 +719,15 @@ async def handle_userbot_connect(update: Update, context: ContextTypes.DEFAULT_T
 async def handle_userbot_disconnect(update: Update, context: ContextTypes.DEFAULT_TYPE, params=None):
     """Disconnect userbot"""
     query = update.callback_query
-    user_id = query.from_user.id
     
-    if not check_userbot_access(user_id):
-        await query.answer("Access denied", show_alert=True)
-        return
-    
-    await query.answer("Disconnecting...", show_alert=False)
+    ack = asyncio.create_task(query.answer("Disconnecting...", show_alert=False))
     
-    success = await userbot_manager.disconnect()
+    try:
+        from userbot_manager import userbot_manager
+        success = await userbot_manager.disconnect()
+        _invalidate_dashboard_snapshot()
+    finally:
+        await ack
     
     if success:
         await query.answer("✅ Disconnected successfully!", show_alert=True)
@@ -632,15 +740,15 @@ async def handle_userbot_disconnect(update: Update, context: ContextTypes.DEFAUL
 async def handle_userbot_test(update: Update, context: ContextTypes.DEFAULT_TYPE, params=None):
     """Test userbot delivery"""
     query = update.callback_query
-    user_id = query.from_user.id
-    
-    if not check_userbot_access(user_id):
-        await query.answer("Access denied", show_alert=True)
-        return
+    user_id = _uid(update)
     
-    await query.answer("Sending test message...", show_alert=False)
+    ack = asyncio.create_task(query.answer("Sending test message...", show_alert=False))
     
-    result = await test_userbot_delivery(user_id)
+    try:
+        from product_delivery import test_userbot_delivery
+        result = await test_userbot_delivery(user_id)
+    finally:
+        await ack
     
     if result['success']:
         await query.answer("✅ Test message sent! Check your messages.", show_alert=True)
@@ -650,223 +758,183 @@ async def handle_userbot_test(update: Update, context: ContextTypes.DEFAULT_TYPE
 
 # ==================== SETTINGS PANEL ====================
 
-async def handle_userbot_settings(update: Update, context: ContextTypes.DEFAULT_TYPE, params=None):
-    """Show settings panel"""
-    query = update.callback_query
-    user_id = query.from_user.id
-    
-    if not check_userbot_access(user_id):
-        await query.answer("Access denied", show_alert=True)
-        return
-    
-    # 🚀  Force FRESH read from DB, bypass cache completely
-    config = userbot_config.get_dict(force_fresh=True)
-    
-    # 🚀  Add microsecond timestamp to force message text change
-    import time
+def _render_settings(config: dict) -> tuple:
+    """Build settings panel text and keyboard from a config dict (no I/O)"""
+    # 🚀  Timestamp keeps the text distinct between consecutive renders
     update_time = time.strftime("%H:%M:%S")
     
-    msg = f"⚙️ <b>Userbot Settings</b> <i>(Updated: {update_time})</i>\n\n"
-    msg += "Configure userbot behavior:\n\n"
-    
     # Current settings
     enabled = config.get('enabled', False)
     auto_reconnect = config.get('auto_reconnect', True)
     notifications = config.get('send_notifications', True)
-    ttl = config.get('secret_chat_ttl', 86400)
-    ttl_hours = ttl // 3600
+    ttl_hours = config.get('secret_chat_ttl', 86400) // 3600
     max_retries = config.get('max_retries', 3)
     retry_delay = config.get('retry_delay', 5)
     
-    msg += f"<b>Delivery:</b> {'✅ Enabled' if enabled else '❌ Disabled'}\n"
-    msg += f"<b>Auto-Reconnect:</b> {'✅ Enabled' if auto_reconnect else '❌ Disabled'}\n"
-    msg += f"<b>Notifications:</b> {'✅ Enabled' if notifications else '❌ Disabled'}\n"
-    msg += f"<b>Message TTL:</b> {ttl_hours} hours\n"
-    msg += f"<b>Max Retries:</b> {max_retries}\n"
-    msg += f"<b>Retry Delay:</b> {retry_delay} seconds\n"
+    msg = (
+        f"⚙️ <b>Userbot Settings</b> <i>(Updated: {update_time})</i>\n\n"
+        "Configure userbot behavior:\n\n"
+        f"<b>Delivery:</b> {'✅ Enabled' if enabled else '❌ Disabled'}\n"
+        f"<b>Auto-Reconnect:</b> {'✅ Enabled' if auto_reconnect else '❌ Disabled'}\n"
+        f"<b>Notifications:</b> {'✅ Enabled' if notifications else '❌ Disabled'}\n"
+        f"<b>Message TTL:</b> {ttl_hours} hours\n"
+        f"<b>Max Retries:</b> {max_retries}\n"
+        f"<b>Retry Delay:</b> {retry_delay} seconds\n"
+    )
     
     keyboard = [
         [InlineKeyboardButton(
             f"{'🔴 Disable' if enabled else '🟢 Enable'} Delivery",
-            callback_data=f"userbot_toggle_enabled|{not enabled}"
+            callback_data=_CB_TOGGLE_ENABLED[not enabled]
         )],
         [InlineKeyboardButton(
             f"{'🔴 Disable' if auto_reconnect else '🟢 Enable'} Auto-Reconnect",
-            callback_data=f"userbot_toggle_reconnect|{not auto_reconnect}"
+            callback_data=_CB_TOGGLE_RECONNECT[not auto_reconnect]
         )],
         [InlineKeyboardButton(
             f"{'🔴 Disable' if notifications else '🟢 Enable'} Notifications",
-            callback_data=f"userbot_toggle_notifications|{not notifications}"
+            callback_data=_CB_TOGGLE_NOTIF[not notifications]
         )],
         [InlineKeyboardButton("⏰ Change TTL", callback_data="userbot_change_ttl"),
          InlineKeyboardButton("🔄 Change Retries", callback_data="userbot_change_retries")],
         [InlineKeyboardButton("⬅️ Back", callback_data="userbot_control")]
     ]
     
-    await query.edit_message_text(msg, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='HTML')
+    return msg, InlineKeyboardMarkup(keyboard)
+
+async def _render_settings_panel(query, config: dict = None) -> None:
+    """Edit the callback message into the settings panel (no access check)
+    
+    Args:
+        config: Config to render - toggles pass userbot_config.get_dict(), which their
+            setter just reloaded; omitted, the DB is re-read
+    """
+    if config is None:
+        # 🚀  Force FRESH read from DB, bypass cache completely
+        config = userbot_config.get_dict(force_fresh=True)
+    
+    msg, reply_markup = _render_settings(config)
+    try:
+        await query.edit_message_text(msg, reply_markup=reply_markup, parse_mode=ParseMode.HTML)
+    except telegram_error.BadRequest as e:
+        if "message is not modified" not in str(e).lower():
+            raise
+
+async def handle_userbot_settings(update: Update, context: ContextTypes.DEFAULT_TYPE, params=None):
+    """Show settings panel"""
+    query = update.callback_query
+    await _answer_nav(query)
+    
+    await _render_settings_panel(query)
 
 async def handle_userbot_toggle_enabled(update: Update, context: ContextTypes.DEFAULT_TYPE, params=None):
     """Toggle userbot enabled/disabled"""
     query = update.callback_query
-    user_id = query.from_user.id
-    
-    if not check_userbot_access(user_id):
-        await query.answer("Access denied", show_alert=True)
-        return
     
     if not params:
         return
     
     enabled = params[0] == 'True'
-    userbot_config.set_enabled(enabled)
+    if not userbot_config.set_enabled(enabled):
+        await query.answer("❌ Failed to save setting. Check logs.", show_alert=True)
+        return
     
-    # 🚀  Add timestamp to force message change (Telegram won't reject "unchanged" message)
-    import time
     status = "enabled" if enabled else "disabled"
-    timestamp = time.strftime("%H:%M:%S")
-    await query.answer(f"✅ Delivery {status}! ({timestamp})", show_alert=True)
-    
-    # Refresh settings (force_fresh=True will bypass cache)
-    await asyncio.sleep(0.5)
-    try:
-        await handle_userbot_settings(update, context)
-    except Exception as e:
-        # If refresh fails, just ignore (likely unchanged message)
-        logger.warning(f"Could not refresh settings after toggle: {e}")
+    await query.answer(f"✅ Delivery {status}!", show_alert=True)
+    await _render_settings_panel(query, userbot_config.get_dict())
 
 async def handle_userbot_toggle_reconnect(update: Update, context: ContextTypes.DEFAULT_TYPE, params=None):
     """Toggle auto-reconnect"""
     query = update.callback_query
-    user_id = query.from_user.id
-    
-    if not check_userbot_access(user_id):
-        await query.answer("Access denied", show_alert=True)
-        return
     
     if not params:
         return
     
     auto_reconnect = params[0] == 'True'
-    userbot_config.set_auto_reconnect(auto_reconnect)
+    if not userbot_config.set_auto_reconnect(auto_reconnect):
+        await query.answer("❌ Failed to save setting. Check logs.", show_alert=True)
+        return
     
-    # 🚀  Add timestamp to force UI update
-    import time
     status = "enabled" if auto_reconnect else "disabled"
-    timestamp = time.strftime("%H:%M:%S")
-    await query.answer(f"✅ Auto-reconnect {status}! ({timestamp})", show_alert=True)
-    
-    # Refresh settings (with a small delay to avoid BadRequest)
-    await asyncio.sleep(0.5)
-    try:
-        await handle_userbot_settings(update, context)
-    except Exception as e:
-        logger.warning(f"Could not refresh settings after toggle: {e}")
+    await query.answer(f"✅ Auto-reconnect {status}!", show_alert=True)
+    await _render_settings_panel(query, userbot_config.get_dict())
 
 async def handle_userbot_toggle_notifications(update: Update, context: ContextTypes.DEFAULT_TYPE, params=None):
     """Toggle notifications"""
     query = update.callback_query
-    user_id = query.from_user.id
-    
-    if not check_userbot_access(user_id):
-        await query.answer("Access denied", show_alert=True)
-        return
     
     if not params:
         return
     
     notifications = params[0] == 'True'
-    userbot_config.set_notifications(notifications)
+    if not userbot_config.set_notifications(notifications):
+        await query.answer("❌ Failed to save setting. Check logs.", show_alert=True)
+        return
     
-    # 🚀  Add timestamp to force UI update
-    import time
     status = "enabled" if notifications else "disabled"
-    timestamp = time.strftime("%H:%M:%S")
-    await query.answer(f"✅ Notifications {status}! ({timestamp})", show_alert=True)
-    
-    # Refresh settings (with a small delay to avoid BadRequest)
-    await asyncio.sleep(0.5)
-    try:
-        await handle_userbot_settings(update, context)
-    except Exception as e:
-        logger.warning(f"Could not refresh settings after toggle: {e}")
+    await query.answer(f"✅ Notifications {status}!", show_alert=True)
+    await _render_settings_panel(query, userbot_config.get_dict())
 
 # ==================== STATISTICS PANEL ====================
 
 async def handle_userbot_stats(update: Update, context: ContextTypes.DEFAULT_TYPE, params=None):
     """Show delivery statistics"""
     query = update.callback_query
-    user_id = query.from_user.id
-    
-    if not check_userbot_access(user_id):
-        await query.answer("Access denied", show_alert=True)
-        return
-    
-    stats = get_delivery_stats()
-    
-    msg = "📊 <b>Delivery Statistics</b>\n\n"
-    msg += f"<b>Total Deliveries:</b> {stats['total']}\n"
-    msg += f"<b>Successful:</b> {stats['success']} ✅\n"
-    msg += f"<b>Failed:</b> {stats['failed']} ❌\n"
-    msg += f"<b>Success Rate:</b> {stats['success_rate']}%\n\n"
+    await _answer_nav(query)
+    
+    _, stats = _get_dashboard_snapshot()
+    
+    lines = [
+        "📊 <b>Delivery Statistics</b>",
+        "",
+        f"<b>Total Deliveries:</b> {stats['total']}",
+        f"<b>Successful:</b> {stats['success']} ✅",
+        f"<b>Failed:</b> {stats['failed']} ❌",
+        f"<b>Success Rate:</b> {stats['success_rate']}%",
+        "",
+    ]
     
     # Recent deliveries
     recent = stats.get('recent_deliveries', [])
     if recent:
-        msg += "<b>Recent Deliveries:</b>\n\n"
+        lines += ["<b>Recent Deliveries:</b>", ""]
         for delivery in recent[:5]:
-            status_emoji = "✅" if delivery['delivery_status'] == 'success' else "❌"
             delivered_at = delivery.get('delivered_at')
-            time_str = delivered_at.strftime('%Y-%m-%d %H:%M') if delivered_at else 'N/A'
-            msg += f"{status_emoji} User {delivery['user_id']} - {time_str}\n"
-            if delivery.get('error_message'):
-                msg += f"   *Error: {delivery['error_message'][:50]}*\n"
+            lines.append(_DELIVERY_ROW_FMT(
+                emoji="✅" if delivery['delivery_status'] == 'success' else "❌",
+                uid=delivery['user_id'],
+                time=delivered_at.strftime('%Y-%m-%d %H:%M') if delivered_at else 'N/A'
+            ))
+            if err := delivery.get('error_message'):
+                lines.append(f"   *Error: {err[:50]}*")
     else:
-        msg += "No deliveries yet."
+        lines.append("No deliveries yet.")
+    msg = "\n".join(lines)
     
     keyboard = [[InlineKeyboardButton("⬅️ Back", callback_data="userbot_control")]]
     
-    await query.edit_message_text(msg, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='HTML')
+    await query.edit_message_text(msg, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode=ParseMode.HTML)
 
 # ==================== RESET CONFIRMATION ====================
 
 async def handle_userbot_reset_confirm(update: Update, context: ContextTypes.DEFAULT_TYPE, params=None):
     """Confirm reset configuration"""
     query = update.callback_query
-    user_id = query.from_user.id
+    await _answer_nav(query)
     
-    if not check_userbot_access(user_id):
-        await query.answer("Access denied", show_alert=True)
-        return
-    
-    msg = "⚠️ <b>Reset Userbot Configuration</b>\n\n"
-    msg += "This will:\n"
-    msg += "• Delete all configuration\n"
-    msg += "• Remove saved session\n"
-    msg += "• Disconnect userbot\n"
-    msg += "• Keep delivery statistics\n\n"
-    msg += "<b>Are you sure you want to reset?</b>"
-    
-    keyboard = [
-        [InlineKeyboardButton("✅ Yes, Reset", callback_data="userbot_reset_confirmed"),
-         InlineKeyboardButton("❌ Cancel", callback_data="userbot_control")]
-    ]
-    
-    await query.edit_message_text(msg, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='HTML')
+    await query.edit_message_text(_RESET_CONFIRM_MSG, reply_markup=_RESET_CONFIRM_KB, parse_mode=ParseMode.HTML)
 
 async def handle_userbot_reset_confirmed(update: Update, context: ContextTypes.DEFAULT_TYPE, params=None):
     """Reset userbot configuration"""
     query = update.callback_query
-    user_id = query.from_user.id
-    
-    if not check_userbot_access(user_id):
-        await query.answer("Access denied", show_alert=True)
-        return
     
     # Disconnect first
+    from userbot_manager import userbot_manager
     await userbot_manager.disconnect()
     
     # Reset config
     success = reset_userbot_config()
+    _invalidate_dashboard_snapshot()
     
     if success:
         await query.answer("✅ Configuration reset!", show_alert=True)
@@ -875,23 +943,15 @@ async def handle_userbot_reset_confirmed(update: Update, context: ContextTypes.D
             [InlineKeyboardButton("🚀 Setup Again", callback_data="userbot_setup_start")],
             [InlineKeyboardButton("⬅️ Back to Admin", callback_data="admin_menu")]
         ]
-        await query.edit_message_text(msg, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='HTML')
+        await query.edit_message_text(msg, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode=ParseMode.HTML)
     else:
         await query.answer("❌ Reset failed. Check logs.", show_alert=True)
 
-# Import asyncio for the phone verification handler
-import asyncio
-
 # ==================== TELETHON SECRET CHAT SETUP ====================
 
 async def handle_telethon_setup(update: Update, context: ContextTypes.DEFAULT_TYPE, params=None):
     """Show Telethon secret chat setup wizard"""
     query = update.callback_query
-    user_id = query.from_user.id
-    
-    if not check_userbot_access(user_id):
-        await query.answer("Access denied", show_alert=True)
-        return
     
     # Check if Telethon is already connected
     try:
@@ -912,7 +972,7 @@ async def handle_telethon_setup(update: Update, context: ContextTypes.DEFAULT_TY
                 [InlineKeyboardButton("⬅️ Back", callback_data="userbot_control")]
             ]
             
-            await query.edit_message_text(msg, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='HTML')
+            await query.edit_message_text(msg, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode=ParseMode.HTML)
             return
     except Exception as e:
         logger.error(f"Error checking Telethon status: {e}")
@@ -946,16 +1006,11 @@ async def handle_telethon_setup(update: Update, context: ContextTypes.DEFAULT_TY
         [InlineKeyboardButton("❌ Cancel", callback_data="userbot_control")]
     ]
     
-    await query.edit_message_text(msg, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='HTML')
+    await query.edit_message_text(msg, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode=ParseMode.HTML)
 
 async def handle_telethon_start_auth(update: Update, context: ContextTypes.DEFAULT_TYPE, params=None):
     """Start Telethon authentication process"""
     query = update.callback_query
-    user_id = query.from_user.id
-    
-    if not check_userbot_access(user_id):
-        await query.answer("Access denied", show_alert=True)
-        return
     
     await query.answer("⏳ Sending code...", show_alert=False)
     
@@ -1000,32 +1055,27 @@ async def handle_telethon_start_auth(update: Update, context: ContextTypes.DEFAU
             [InlineKeyboardButton("❌ Cancel", callback_data="telethon_cancel_auth")]
         ]
         
-        await query.edit_message_text(msg, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='HTML')
+        await query.edit_message_text(msg, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode=ParseMode.HTML)
         
     except Exception as e:
         logger.error(f"Error starting Telethon auth: {e}", exc_info=True)
         await query.answer(f"❌ Error: {str(e)}", show_alert=True)
 
+@expects_state('awaiting_telethon_code')
+@userbot_access_only
 async def handle_telethon_verification_code_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle Telethon verification code input"""
-    if context.user_data.get('state') != 'awaiting_telethon_code':
-        return
-    
-    user_id = update.effective_user.id
-    if not check_userbot_access(user_id):
-        return
-    
     code = update.message.text.strip()
     api_id = context.user_data.get('telethon_api_id')
     api_hash = context.user_data.get('telethon_api_hash')
     phone = context.user_data.get('telethon_phone')
     
     if not all([api_id, api_hash, phone]):
-        await update.message.reply_text("❌ <b>Error:</b> Setup data lost. Please start again.", parse_mode='HTML')
+        await update.message.reply_text("❌ <b>Error:</b> Setup data lost. Please start again.", parse_mode=ParseMode.HTML)
         context.user_data.pop('state', None)
         return
     
-    await update.message.reply_text("⏳ <b>Verifying code...</b>", parse_mode='HTML')
+    await update.message.reply_text("⏳ <b>Verifying code...</b>", parse_mode=ParseMode.HTML, disable_notification=True)
     
     try:
         from userbot_telethon_secret import telethon_secret_chat
@@ -1044,25 +1094,21 @@ async def handle_telethon_verification_code_message(update: Update, context: Con
                     f"❌ <b>Code Expired!</b>\n\n{message}\n\n"
                     "⚠️ Telegram codes expire in ~2 minutes.\n\n"
                     "Please go back to Admin → Userbot Control → Setup Secret Chat and try again with a NEW code.",
-                    parse_mode='HTML'
+                    parse_mode=ParseMode.HTML
                 )
                 # Clear state
-                context.user_data.pop('state', None)
-                context.user_data.pop('telethon_api_id', None)
-                context.user_data.pop('telethon_api_hash', None)
-                context.user_data.pop('telethon_phone', None)
+                for key in _TELETHON_CTX_KEYS:
+                    context.user_data.pop(key, None)
             else:
                 await update.message.reply_text(
                     f"❌ <b>Verification Failed</b>\n\n{message}\n\nPlease try again:",
-                    parse_mode='HTML'
+                    parse_mode=ParseMode.HTML
                 )
             return
         
         # Clear state
-        context.user_data.pop('state', None)
-        context.user_data.pop('telethon_api_id', None)
-        context.user_data.pop('telethon_api_hash', None)
-        context.user_data.pop('telethon_phone', None)
+        for key in _TELETHON_CTX_KEYS:
+            context.user_data.pop(key, None)
         
         # Success message
         msg = "🎉 <b>Telethon Setup Complete!</b>\n\n"
@@ -1075,11 +1121,11 @@ async def handle_telethon_verification_code_message(update: Update, context: Con
         msg += "• Perfect forward secrecy\n\n"
         msg += "Your buyers will receive products in encrypted secret chats! 🎯"
         
-        await update.message.reply_text(msg, parse_mode='HTML')
+        await update.message.reply_text(msg, parse_mode=ParseMode.HTML)
         
         # Now re-initialize Telethon to connect it
         await asyncio.sleep(1)
-        await update.message.reply_text("⏳ <b>Connecting Telethon...</b>", parse_mode='HTML')
+        await update.message.reply_text("⏳ <b>Connecting Telethon...</b>", parse_mode=ParseMode.HTML, disable_notification=True)
         
         telethon_initialized = await telethon_secret_chat.initialize(
             int(api_id),
@@ -1091,19 +1137,19 @@ async def handle_telethon_verification_code_message(update: Update, context: Con
         if telethon_initialized:
             await update.message.reply_text(
                 "✅ <b>Telethon Connected!</b>\n\nSecret chat delivery is now active! 🔐",
-                parse_mode='HTML'
+                parse_mode=ParseMode.HTML
             )
         else:
             await update.message.reply_text(
                 "⚠️ <b>Telethon saved but not connected</b>\n\nIt will connect on next restart.",
-                parse_mode='HTML'
+                parse_mode=ParseMode.HTML
             )
         
     except Exception as e:
         logger.error(f"Error completing Telethon auth: {e}", exc_info=True)
         await update.message.reply_text(
             f"❌ <b>Error:</b> {str(e)}\n\nPlease try again or contact support.",
-            parse_mode='HTML'
+            parse_mode=ParseMode.HTML
         )
 
 async def handle_telethon_cancel_auth(update: Update, context: ContextTypes.DEFAULT_TYPE, params=None):
@@ -1111,10 +1157,8 @@ async def handle_telethon_cancel_auth(update: Update, context: ContextTypes.DEFA
     query = update.callback_query
     
     # Clear state
-    context.user_data.pop('state', None)
-    context.user_data.pop('telethon_api_id', None)
-    context.user_data.pop('telethon_api_hash', None)
-    context.user_data.pop('telethon_phone', None)
+    for key in _TELETHON_CTX_KEYS:
+        context.user_data.pop(key, None)
     
     await query.answer("❌ Setup cancelled", show_alert=False)
     await handle_userbot_control(update, context)
@@ -1122,11 +1166,6 @@ async def handle_telethon_cancel_auth(update: Update, context: ContextTypes.DEFA
 async def handle_telethon_disconnect(update: Update, context: ContextTypes.DEFAULT_TYPE, params=None):
     """Disconnect Telethon"""
     query = update.callback_query
-    user_id = query.from_user.id
-    
-    if not check_userbot_access(user_id):
-        await query.answer("Access denied", show_alert=True)
-        return
     
     try:
         from userbot_telethon_secret import telethon_secret_chat
@@ -1154,21 +1193,16 @@ async def handle_telethon_disconnect(update: Update, context: ContextTypes.DEFAU
 
 # ==================== NEW USERBOT ADD FLOW (Message Handlers) ====================
 
+@expects_state('awaiting_new_userbot_name')
+@userbot_access_only
 async def handle_new_userbot_name_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle new userbot name input"""
-    if context.user_data.get('state') != 'awaiting_new_userbot_name':
-        return
-    
-    user_id = update.effective_user.id
-    if not check_userbot_access(user_id):
-        return
-    
     name = update.message.text.strip()
     
     if len(name) < 3:
         await update.message.reply_text(
             "❌ Name too short. Please enter at least 3 characters:",
-            parse_mode='HTML'
+            parse_mode=ParseMode.HTML
         )
         return
     
@@ -1181,7 +1215,7 @@ async def handle_new_userbot_name_message(update: Update, context: ContextTypes.
         if c.fetchone():
             await update.message.reply_text(
                 f"❌ A userbot with name '<b>{name}</b>' already exists.\n\nPlease choose a different name:",
-                parse_mode='HTML'
+                parse_mode=ParseMode.HTML
             )
             return
     finally:
@@ -1197,23 +1231,18 @@ async def handle_new_userbot_name_message(update: Update, context: ContextTypes.
     msg += "🔗 Get it from: https://my.telegram.org/apps\n\n"
     msg += "📝 Example: 12345678"
     
-    await update.message.reply_text(msg, parse_mode='HTML')
+    await update.message.reply_text(msg, parse_mode=ParseMode.HTML)
 
+@expects_state('awaiting_new_userbot_api_id')
+@userbot_access_only
 async def handle_new_userbot_api_id_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle new userbot API ID input"""
-    if context.user_data.get('state') != 'awaiting_new_userbot_api_id':
-        return
-    
-    user_id = update.effective_user.id
-    if not check_userbot_access(user_id):
-        return
-    
     api_id = update.message.text.strip()
     
-    if not api_id.isdigit():
+    if not _RE_API_ID.fullmatch(api_id):
         await update.message.reply_text(
             "❌ API ID must be a number.\n\nPlease try again:",
-            parse_mode='HTML'
+            parse_mode=ParseMode.HTML
         )
         return
     
@@ -1229,23 +1258,18 @@ async def handle_new_userbot_api_id_message(update: Update, context: ContextType
     msg += "🔗 Get it from: https://my.telegram.org/apps\n\n"
     msg += "📝 Example: 1234567890abcdef1234567890abcdef"
     
-    await update.message.reply_text(msg, parse_mode='HTML')
+    await update.message.reply_text(msg, parse_mode=ParseMode.HTML)
 
+@expects_state('awaiting_new_userbot_api_hash')
+@userbot_access_only
 async def handle_new_userbot_api_hash_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle new userbot API Hash input"""
-    if context.user_data.get('state') != 'awaiting_new_userbot_api_hash':
-        return
-    
-    user_id = update.effective_user.id
-    if not check_userbot_access(user_id):
-        return
-    
     api_hash = update.message.text.strip()
     
-    if len(api_hash) < 32:
+    if not _RE_API_HASH.fullmatch(api_hash):
         await update.message.reply_text(
-            "❌ API Hash seems too short (should be 32 characters).\n\nPlease try again:",
-            parse_mode='HTML'
+            "❌ API Hash should be 32 hexadecimal characters.\n\nPlease try again:",
+            parse_mode=ParseMode.HTML
         )
         return
     
@@ -1263,23 +1287,18 @@ async def handle_new_userbot_api_hash_message(update: Update, context: ContextTy
     msg += "📱 <b>Format:</b> +1234567890\n\n"
     msg += "⚠️ Must start with +"
     
-    await update.message.reply_text(msg, parse_mode='HTML')
+    await update.message.reply_text(msg, parse_mode=ParseMode.HTML)
 
+@expects_state('awaiting_new_userbot_phone')
+@userbot_access_only
 async def handle_new_userbot_phone_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle new userbot phone number input and send verification code"""
-    if context.user_data.get('state') != 'awaiting_new_userbot_phone':
-        return
-    
-    user_id = update.effective_user.id
-    if not check_userbot_access(user_id):
-        return
-    
     phone = update.message.text.strip()
     
-    if not phone.startswith('+'):
+    if not _RE_PHONE.fullmatch(phone):
         await update.message.reply_text(
             "❌ Phone number must start with + and include country code.\n\nExample: +1234567890\n\nPlease try again:",
-            parse_mode='HTML'
+            parse_mode=ParseMode.HTML
         )
         return
     
@@ -1292,7 +1311,7 @@ async def handle_new_userbot_phone_message(update: Update, context: ContextTypes
         if c.fetchone():
             await update.message.reply_text(
                 f"❌ A userbot with phone <b>{phone}</b> already exists.\n\nPlease use a different phone number:",
-                parse_mode='HTML'
+                parse_mode=ParseMode.HTML
             )
             return
     finally:
@@ -1301,7 +1320,7 @@ async def handle_new_userbot_phone_message(update: Update, context: ContextTypes
     context.user_data['new_userbot_phone'] = phone
     
     # Send verification code via Telethon
-    await update.message.reply_text("⏳ <b>Sending verification code...</b>", parse_mode='HTML')
+    await update.message.reply_text("⏳ <b>Sending verification code...</b>", parse_mode=ParseMode.HTML, disable_notification=True)
     
     api_id = context.user_data.get('new_userbot_api_id')
     api_hash = context.user_data.get('new_userbot_api_hash')
@@ -1335,28 +1354,23 @@ async def handle_new_userbot_phone_message(update: Update, context: ContextTypes
         msg += "⏰ <b>IMPORTANT:</b> Enter the code within 2 minutes!\n\n"
         msg += "📱 Please enter the code you received:"
         
-        await update.message.reply_text(msg, parse_mode='HTML')
+        await update.message.reply_text(msg, parse_mode=ParseMode.HTML)
         
     except Exception as e:
         logger.error(f"Error sending code for new userbot: {e}", exc_info=True)
         await update.message.reply_text(
             f"❌ <b>Error:</b> {str(e)}\n\nPlease start over from Admin → Userbot Control.",
-            parse_mode='HTML'
+            parse_mode=ParseMode.HTML
         )
         context.user_data.pop('state', None)
 
+@expects_state('awaiting_new_userbot_code')
+@userbot_access_only
 async def handle_new_userbot_code_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle new userbot verification code and complete setup"""
-    if context.user_data.get('state') != 'awaiting_new_userbot_code':
-        return
-    
-    user_id = update.effective_user.id
-    if not check_userbot_access(user_id):
-        return
-    
     code = update.message.text.strip()
     
-    await update.message.reply_text("⏳ <b>Verifying code and creating userbot...</b>", parse_mode='HTML')
+    await update.message.reply_text("⏳ <b>Verifying code and creating userbot...</b>", parse_mode=ParseMode.HTML, disable_notification=True)
     
     # Get all stored data INCLUDING the temp client
     name = context.user_data.get('new_userbot_name')
@@ -1369,7 +1383,7 @@ async def handle_new_userbot_code_message(update: Update, context: ContextTypes.
     if not all([name, api_id, api_hash, phone, phone_code_hash, temp_client]):
         await update.message.reply_text(
             "❌ <b>Error:</b> Setup data lost. Please start over from Admin → Userbot Control.",
-            parse_mode='HTML'
+            parse_mode=ParseMode.HTML
         )
         context.user_data.pop('state', None)
         return
@@ -1389,7 +1403,7 @@ async def handle_new_userbot_code_message(update: Update, context: ContextTypes.
                 "❌ <b>Code Expired!</b>\n\n"
                 "⚠️ Telegram codes expire in ~2 minutes.\n\n"
                 "Please go back to Admin → Userbot Control → Add New Userbot and try again.",
-                parse_mode='HTML'
+                parse_mode=ParseMode.HTML
             )
             context.user_data.pop('state', None)
             return
@@ -1397,7 +1411,7 @@ async def handle_new_userbot_code_message(update: Update, context: ContextTypes.
             # DON'T disconnect on invalid code - let user retry
             await update.message.reply_text(
                 "❌ <b>Invalid Code!</b>\n\nPlease try again:",
-                parse_mode='HTML'
+                parse_mode=ParseMode.HTML
             )
             return
         except SessionPasswordNeededError:
@@ -1407,7 +1421,7 @@ async def handle_new_userbot_code_message(update: Update, context: ContextTypes.
                 "❌ <b>2FA Enabled</b>\n\n"
                 "This account has Two-Factor Authentication enabled.\n"
                 "Please disable it temporarily and try again.",
-                parse_mode='HTML'
+                parse_mode=ParseMode.HTML
             )
             context.user_data.pop('state', None)
             return
@@ -1422,7 +1436,7 @@ async def handle_new_userbot_code_message(update: Update, context: ContextTypes.
         await temp_client.disconnect()
         
         # Save to database
-        from userbot_database import get_db_connection
+        from userbot_database import get_db_connection, notify_userbots_changed
         conn = get_db_connection()
         c = conn.cursor()
         try:
@@ -1433,6 +1447,7 @@ async def handle_new_userbot_code_message(update: Update, context: ContextTypes.
             """, (name, api_id, api_hash, phone, session_string))
             
             new_userbot_id = c.fetchone()['id']
+            notify_userbots_changed(c)
             conn.commit()
             
             logger.info(f"✅ New userbot created: ID={new_userbot_id}, Name={name}, Phone={phone}")
@@ -1442,7 +1457,7 @@ async def handle_new_userbot_code_message(update: Update, context: ContextTypes.
             conn.rollback()
             await update.message.reply_text(
                 f"❌ <b>Database Error:</b> {str(db_err)}\n\nPlease try again.",
-                parse_mode='HTML'
+                parse_mode=ParseMode.HTML
             )
             context.user_data.pop('state', None)
             return
@@ -1450,13 +1465,8 @@ async def handle_new_userbot_code_message(update: Update, context: ContextTypes.
             conn.close()
         
         # Clear state and temp client
-        context.user_data.pop('state', None)
-        context.user_data.pop('new_userbot_name', None)
-        context.user_data.pop('new_userbot_api_id', None)
-        context.user_data.pop('new_userbot_api_hash', None)
-        context.user_data.pop('new_userbot_phone', None)
-        context.user_data.pop('new_userbot_phone_code_hash', None)
-        context.user_data.pop('new_userbot_temp_client', None)  # Clear the temp client too
+        for key in _NEW_USERBOT_CTX_KEYS:
+            context.user_data.pop(key, None)
         
         # Auto-connect the userbot
         logger.info(f"🔄 Auto-connecting newly created userbot #{new_userbot_id}...")
@@ -1480,13 +1490,13 @@ async def handle_new_userbot_code_message(update: Update, context: ContextTypes.
         msg += f"🔐 Status: {connection_status}\n\n"
         msg += f"This userbot is now ready for TRUE SECRET CHAT delivery!"
         
-        await update.message.reply_text(msg, parse_mode='HTML')
+        await update.message.reply_text(msg, parse_mode=ParseMode.HTML)
         
     except Exception as e:
         logger.error(f"Error completing new userbot setup: {e}", exc_info=True)
         await update.message.reply_text(
             f"❌ <b>Error:</b> {str(e)}\n\nPlease try again or contact support.",
-            parse_mode='HTML'
+            parse_mode=ParseMode.HTML
         )
         context.user_data.pop('state', None)
 
@@ -132,7 +132,7 @@ async def handle_userbot_toggle_enable_single(update: Update, context: ContextTy
             return
     
     # Toggle in database
-    from userbot_database import get_db_connection
+    from userbot_database import get_db_connection, notify_userbots_changed
     conn = get_db_connection()
     c = conn.cursor()
     try:
@@ -146,6 +146,7 @@ async def handle_userbot_toggle_enable_single(update: Update, context: ContextTy
         new_status = not current_status
         
         c.execute("UPDATE userbots SET is_enabled = %s WHERE id = %s", (new_status, userbot_id))
+        notify_userbots_changed(c)
         conn.commit()
         
         status_text = "enabled" if new_status else "disabled"
@@ -221,7 +222,7 @@ async def handle_userbot_delete_confirmed(update: Update, context: ContextTypes.
             return
     
     # Delete from database
-    from userbot_database import get_db_connection
+    from userbot_database import get_db_connection, notify_userbots_changed
     conn = get_db_connection()
     c = conn.cursor()
     try:
@@ -233,6 +234,7 @@ async def handle_userbot_delete_confirmed(update: Update, context: ContextTypes.
             return
         
         name = result['name']
+        notify_userbots_changed(c)
         conn.commit()
         
         logger.info(f"✅ Userbot deleted: ID={userbot_id}, Name={name}")
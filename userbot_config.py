@@ -10,7 +10,8 @@ from userbot_database import (
     is_userbot_configured,
     is_userbot_enabled,
     save_userbot_config,
-    update_userbot_setting
+    update_userbot_setting,
+    invalidate_userbot_cache
 )
 
 logger = logging.getLogger(__name__)
@@ -176,7 +177,8 @@ class UserbotConfig:
             force_fresh: If True, bypasses cache and reads directly from DB
         """
         if force_fresh:
-            # 🚀  Force fresh read from DB, bypass cache completely
+            # 🚀  Force fresh read from DB, bypass cache completely (including the TTL cache)
+            invalidate_userbot_cache('userbots')
             fresh_config = get_userbot_config()
             if fresh_config:
                 self._config = fresh_config  # Update cache for next time
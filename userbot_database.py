@@ -3,88 +3,265 @@ Multi-Userbot Database Management
 Handles all database operations for the multi-userbot system
 """
 
+import asyncio
+import csv
+import io
 import logging
-from typing import Optional, List, Dict, Any
-from datetime import datetime, timedelta
-from utils import get_db_connection
+import os
+import select
+import threading
+import time
+import weakref
+from functools import wraps
+from typing import Optional, List, Dict, Any, Iterable, Iterator, Tuple
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+import psycopg2
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+from psycopg2.extras import execute_values
+from utils import get_db_connection, acquire_db_connection, release_db_connection, db_cursor, POSTGRES_URL
 
 logger = logging.getLogger(__name__)
 
+# Legacy dashboard data for userbot #1, fetched together by get_dashboard_bundle()
+DashboardBundle = namedtuple('DashboardBundle', ['status', 'stats'])
+
+# ==================== READ CACHE ====================
+# Hot delivery-path reads (available userbots, global settings) are cached
+# in-process. Writers publish NOTIFY on _CACHE_CHANNEL inside their transaction,
+# and a listener thread in every process drops the matching entry on commit.
+# The TTL only bounds staleness if the listener is down.
+
+_CACHE_CHANNEL = 'userbot_cache_invalidate'
+_USERBOTS_CACHE_TTL = 2.0
+_SETTINGS_CACHE_TTL = 30.0
+_LEGACY_CONFIG_CACHE_TTL = 30.0
+
+_cache: Dict[str, tuple] = {}
+_cache_lock = threading.Lock()
+_listener_pid = None
+
+def _ttl_cached(key: str, ttl: float):
+    """Cache a zero-argument loader under `key` for `ttl` seconds"""
+    def decorator(func):
+        @wraps(func)
+        def wrapper():
+            _ensure_cache_listener()
+            now = time.monotonic()
+            with _cache_lock:
+                hit = _cache.get(key)
+            if hit and hit[1] > now:
+                return hit[0]
+            value = func()
+            with _cache_lock:
+                _cache[key] = (value, now + ttl)
+            return value
+        return wrapper
+    return decorator
+
+def invalidate_userbot_cache(*keys: str):
+    """Drop cached entries in this process (all entries if no keys given)
+
+    A key also drops its sub-keys, e.g. 'userbots' drops 'userbots:1'.
+    """
+    with _cache_lock:
+        if not keys:
+            _cache.clear()
+            return
+        for cached_key in list(_cache):
+            if cached_key in keys or cached_key.split(':', 1)[0] in keys:
+                del _cache[cached_key]
+
+def _notify_cache_invalidate(c, key: str):
+    """Publish an invalidation to every process; delivered when the transaction commits"""
+    c.execute("SELECT pg_notify(%s, %s)", (_CACHE_CHANNEL, key))
+    invalidate_userbot_cache(key)
+
+def notify_userbots_changed(c):
+    """For raw SQL writers outside this module: invalidate cached userbot reads everywhere on commit"""
+    _notify_cache_invalidate(c, 'userbots')
+
+def _ensure_cache_listener():
+    """Start the LISTEN thread once per process"""
+    global _listener_pid
+    pid = os.getpid()
+    if _listener_pid == pid:
+        return
+    with _cache_lock:
+        if _listener_pid == pid:
+            return
+        _listener_pid = pid
+    threading.Thread(target=_cache_listener_loop, name="userbot-cache-listener", daemon=True).start()
+
+def _cache_listener_loop():
+    """Hold a dedicated LISTEN connection and apply invalidations as they arrive"""
+    while True:
+        conn = None
+        try:
+            conn = psycopg2.connect(POSTGRES_URL)
+            conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+            conn.cursor().execute(f"LISTEN {_CACHE_CHANNEL}")
+            # Anything cached while we were not listening may be stale
+            invalidate_userbot_cache()
+            logger.info("✅ Userbot cache invalidation listener connected")
+            while True:
+                if select.select([conn], [], [], 60) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    invalidate_userbot_cache(conn.notifies.pop(0).payload)
+        except Exception as e:
+            logger.warning(f"⚠️ Userbot cache listener error (falling back to TTL, retrying): {e}")
+            time.sleep(5)
+        finally:
+            if conn:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+
+# ==================== PREPARED STATEMENTS ====================
+# Hot statements are PREPAREd once per pooled connection and run with EXECUTE,
+# so the server skips parse/plan on every call. Connections are tracked weakly:
+# a reconnected (new) connection object simply prepares again.
+
+_PREPARED_SQL = {
+    # Explicit columns: a prepared SELECT * fails with "cached plan must not change
+    # result type" once ALTER TABLE adds a column; the session goes via ub_get_session
+    'ub_get': ("(integer)", """
+        SELECT id, name, api_id, api_hash, phone_number, is_enabled, is_connected,
+               status_message, priority, max_deliveries_per_hour, created_at, updated_at,
+               last_connected_at, last_error, scout_mode_enabled, scout_reply_in_pm, scout_groups_only
+        FROM userbots WHERE id = $1
+    """),
+    'ub_get_session': ("(integer)", "SELECT session_string FROM userbots WHERE id = $1"),
+    'ub_get_legacy': ("(integer)", """
+        SELECT api_id, api_hash, phone_number, session_string, is_enabled
+        FROM userbots WHERE id = $1
+    """),
+    'ub_rec_start': ("(integer, bigint, text)", """
+        INSERT INTO userbot_deliveries (userbot_id, user_id, order_id, delivery_status)
+        VALUES ($1, $2, $3, 'pending')
+        RETURNING id, created_at
+    """),
+}
+
+_prepared_on = weakref.WeakKeyDictionary()
+
+def _execute_prepared(c, name: str, params: tuple = ()):
+    """EXECUTE a statement from _PREPARED_SQL, preparing it on this connection first if needed"""
+    prepared = _prepared_on.setdefault(c.connection, set())
+    if name not in prepared:
+        arg_types, sql = _PREPARED_SQL[name]
+        c.execute(f"PREPARE {name}{arg_types} AS {sql}")
+        prepared.add(name)
+    if params:
+        c.execute(f"EXECUTE {name}({', '.join(['%s'] * len(params))})", params)
+    else:
+        c.execute(f"EXECUTE {name}")
+
 # ==================== SCHEMA CREATION ====================
 
 def init_userbot_tables():
     """Initialize userbot tables - called from main.py"""
     return create_multi_userbot_schema()
 
+# ==================== DELIVERY PARTITIONS ====================
+# userbot_deliveries has one partition per UTC day plus a DEFAULT partition for rows
+# outside them; history migrated from the old unpartitioned table gets dated partitions too.
+
+DELIVERY_PARTITION_DAYS_AHEAD = 2
+DELIVERY_RETENTION_DAYS = int(os.getenv('USERBOT_DELIVERY_RETENTION_DAYS', '90'))
+
+def _create_delivery_partition(c, day):
+    """Create the daily partition holding `day` (UTC) if it doesn't exist"""
+    start = datetime(day.year, day.month, day.day, tzinfo=timezone.utc)
+    # Savepoint so a clash with rows already in the DEFAULT partition only skips this day
+    c.execute("SAVEPOINT ubd_partition")
+    try:
+        c.execute(f"""
+            CREATE TABLE IF NOT EXISTS userbot_deliveries_{day:%Y%m%d}
+            PARTITION OF userbot_deliveries FOR VALUES FROM (%s) TO (%s)
+        """, (start, start + timedelta(days=1)))
+        c.execute("RELEASE SAVEPOINT ubd_partition")
+    except Exception as e:
+        c.execute("ROLLBACK TO SAVEPOINT ubd_partition")
+        logger.warning(f"⚠️ Could not create delivery partition for {day}: {e}")
+
+def _create_delivery_partitions(c, days_ahead: int = DELIVERY_PARTITION_DAYS_AHEAD):
+    """Create daily partitions from today through `days_ahead` days out"""
+    today = datetime.now(timezone.utc).date()
+    for offset in range(days_ahead + 1):
+        _create_delivery_partition(c, today + timedelta(days=offset))
+
+def _drop_expired_delivery_partitions(c, retention_days: int = DELIVERY_RETENTION_DAYS) -> List[str]:
+    """Drop daily partitions older than `retention_days`; returns the dropped table names"""
+    cutoff = datetime.now(timezone.utc).date() - timedelta(days=retention_days)
+    c.execute("""
+        SELECT child.relname
+        FROM pg_inherits i
+        JOIN pg_class child ON child.oid = i.inhrelid
+        WHERE i.inhparent = 'userbot_deliveries'::regclass
+    """)
+    dropped = []
+    for row in c.fetchall():
+        suffix = row['relname'].rsplit('_', 1)[-1]
+        if len(suffix) != 8 or not suffix.isdigit():
+            continue  # DEFAULT partition
+        if datetime.strptime(suffix, '%Y%m%d').date() < cutoff:
+            c.execute(f"DROP TABLE IF EXISTS {row['relname']}")
+            dropped.append(row['relname'])
+    return dropped
+
+def maintain_delivery_partitions() -> bool:
+    """Create upcoming daily delivery partitions and drop ones past retention (run periodically)"""
+    try:
+        with db_cursor() as c:
+            _create_delivery_partitions(c)
+            dropped = _drop_expired_delivery_partitions(c)
+        
+        if dropped:
+            logger.info(f"🗑️ Dropped {len(dropped)} expired delivery partition(s): {', '.join(dropped)}")
+        return True
+        
+    except Exception as e:
+        logger.error(f"❌ Error maintaining delivery partitions: {e}")
+        return False
+
 # ==================== BACKWARDS COMPATIBILITY (OLD SINGLE-USERBOT SYSTEM) ====================
 
 def save_session_string(session_string: str) -> bool:
     """Save session string (legacy single-userbot function)"""
-    conn = None
     try:
-        conn = get_db_connection()
-        c = conn.cursor()
-        
-        # Try to update existing userbot #1 (legacy default)
-        c.execute("SELECT id FROM userbots WHERE id = 1")
-        if c.fetchone():
-            c.execute("""
-                UPDATE userbots 
-                SET session_string = %s, updated_at = CURRENT_TIMESTAMP
-                WHERE id = 1
-            """, (session_string,))
-        else:
-            # Create default userbot if doesn't exist
+        with db_cursor() as c:
+            # Upsert userbot #1 (legacy default) in one statement; an unchanged
+            # session string matches no row, so nothing is written or invalidated
             c.execute("""
                 INSERT INTO userbots (id, name, api_id, api_hash, phone_number, session_string)
                 VALUES (1, 'Default Userbot', 'pending', 'pending', 'pending', %s)
                 ON CONFLICT (id) DO UPDATE SET session_string = EXCLUDED.session_string
+                WHERE userbots.session_string IS DISTINCT FROM EXCLUDED.session_string
             """, (session_string,))
-        
-        conn.commit()
-        logger.info("✅ Session string saved successfully")
-        return True
+            if c.rowcount:
+                _notify_cache_invalidate(c, 'userbots')
+            
+            logger.info("✅ Session string saved successfully")
+            return True
         
     except Exception as e:
         logger.error(f"❌ Error saving session string: {e}")
-        if conn:
-            try:
-                conn.rollback()
-            except:
-                pass
         return False
-    finally:
-        if conn:
-            conn.close()
 
 def get_session_string() -> Optional[str]:
     """Get session string (legacy single-userbot function)"""
-    conn = None
-    try:
-        conn = get_db_connection()
-        c = conn.cursor()
-        
-        c.execute("SELECT session_string FROM userbots WHERE id = 1")
-        row = c.fetchone()
-        
-        if row and row['session_string']:
-            return row['session_string']
-        return None
-        
-    except Exception as e:
-        logger.error(f"❌ Error getting session string: {e}")
-        return None
-    finally:
-        if conn:
-            conn.close()
+    return get_userbot_session(1) or None
 
 def update_connection_status(is_connected: bool, status_message: str = None):
     """Update connection status (legacy single-userbot function)"""
     update_userbot_connection(1, is_connected, status_message)
 
-def get_connection_status() -> Dict[str, Any]:
-    """Get connection status (legacy single-userbot function)"""
-    userbot = get_userbot(1)
+def _legacy_status_from_row(userbot: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Shape a userbots row into the legacy connection status dict"""
     if userbot:
         return {
             'is_connected': userbot.get('is_connected', False),
@@ -97,8 +274,19 @@ def get_connection_status() -> Dict[str, Any]:
         'last_updated': None
     }
 
-def log_delivery(user_id: int, order_id: str, status: str, error_msg: Optional[str] = None):
-    """Log delivery (legacy function - maps to new system)"""
+def get_connection_status() -> Dict[str, Any]:
+    """Get connection status (legacy single-userbot function)"""
+    row = None
+    try:
+        with db_cursor(readonly=True) as c:
+            c.execute("SELECT is_connected, status_message, updated_at FROM userbots WHERE id = 1")
+            row = c.fetchone()
+    except Exception as e:
+        logger.error(f"❌ Error getting connection status: {e}")
+    return _legacy_status_from_row(row)
+
+async def log_delivery(user_id: int, order_id: str, status: str, error_msg: Optional[str] = None):
+    """Log delivery (legacy function - maps to new system; awaited from the async delivery path)"""
     # For backwards compatibility, use userbot ID #1
     if status == 'success':
         # This would be set when delivery starts - for now just log
@@ -116,9 +304,8 @@ def get_secret_chat_id(user_id: int) -> Optional[int]:
     logger.info(f"Legacy get_secret_chat_id called: user={user_id}")
     return None  # New system doesn't use secret chats, uses Saved Messages forwarding
 
-def get_delivery_stats() -> Dict[str, Any]:
-    """Get delivery statistics (legacy function - maps to userbot ID #1)"""
-    stats = get_userbot_stats(1)
+def _legacy_stats_from_row(stats: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Shape a userbot_stats row into the legacy delivery stats dict"""
     if stats:
         total = stats.get('total_deliveries') or 0
         success = stats.get('successful_deliveries') or 0
@@ -130,7 +317,10 @@ def get_delivery_stats() -> Dict[str, Any]:
             'success': success,
             'failed': failed,
             'success_rate': success_rate,
-            'recent_deliveries': []  # TODO: Implement recent deliveries query if needed
+            'recent_deliveries': [
+                {**d, 'delivered_at': datetime.fromisoformat(d['delivered_at']) if d.get('delivered_at') else None}
+                for d in stats.get('recent_deliveries') or []
+            ]
         }
     
     return {
@@ -141,9 +331,95 @@ def get_delivery_stats() -> Dict[str, Any]:
         'recent_deliveries': []
     }
 
+def get_delivery_stats() -> Dict[str, Any]:
+    """Get delivery statistics (legacy function - maps to userbot ID #1)"""
+    return get_dashboard_bundle().stats
+
+def get_dashboard_bundle() -> DashboardBundle:
+    """Get legacy connection status + delivery stats for userbot #1 in one query"""
+    row = None
+    try:
+        with db_cursor(readonly=True) as c:
+            # Counters and the last 10 deliveries (as one JSON array) in a single round-trip
+            c.execute("""
+                SELECT u.is_connected, u.status_message, u.updated_at,
+                       s.total_deliveries, s.successful_deliveries, s.failed_deliveries,
+                       rd.recent_deliveries
+                FROM userbots u
+                LEFT JOIN userbot_stats s ON u.id = s.userbot_id
+                LEFT JOIN LATERAL (
+                    SELECT json_agg(r ORDER BY r.delivered_at DESC) AS recent_deliveries
+                    FROM (
+                        SELECT user_id,
+                               CASE WHEN delivery_status = 'delivered' THEN 'success' ELSE delivery_status END AS delivery_status,
+                               error_message,
+                               COALESCE(completed_at, created_at) AS delivered_at
+                        FROM userbot_deliveries
+                        WHERE userbot_id = u.id
+                        ORDER BY created_at DESC
+                        LIMIT 10
+                    ) r
+                ) rd ON TRUE
+                WHERE u.id = 1
+            """)
+            row = c.fetchone()
+        
+    except Exception as e:
+        logger.error(f"❌ Error getting dashboard bundle: {e}")
+    
+    return DashboardBundle(_legacy_status_from_row(row), _legacy_stats_from_row(row))
+
+@_ttl_cached('userbots:1', _LEGACY_CONFIG_CACHE_TTL)
+def _load_legacy_userbot() -> Optional[Dict[str, Any]]:
+    """Read the userbot #1 columns get_userbot_config needs (raises on DB error)"""
+    with db_cursor(readonly=True) as c:
+        _execute_prepared(c, 'ub_get_legacy', (1,))
+        return c.fetchone()
+
+def _get_legacy_userbot() -> Optional[Dict[str, Any]]:
+    """Userbot #1 row, cached for _LEGACY_CONFIG_CACHE_TTL and invalidated with 'userbots'"""
+    try:
+        userbot = _load_legacy_userbot()
+        return dict(userbot) if userbot else None
+    except Exception as e:
+        logger.error(f"❌ Error getting userbot 1: {e}")
+        return None
+
+@_ttl_cached('userbots:1:enabled', _LEGACY_CONFIG_CACHE_TTL)
+def _load_enabled() -> bool:
+    """Read only userbot #1's is_enabled flag (raises on DB error)"""
+    with db_cursor(readonly=True, tuples=True) as c:
+        c.execute("SELECT is_enabled FROM userbots WHERE id = 1")
+        row = c.fetchone()
+        return bool(row and row[0])
+
+def _get_enabled() -> bool:
+    """Fast path for is_userbot_enabled - one boolean instead of the whole row"""
+    try:
+        return _load_enabled()
+    except Exception as e:
+        logger.error(f"❌ Error getting userbot 1 enabled flag: {e}")
+        return False
+
+@_ttl_cached('userbots:1:credentials', _LEGACY_CONFIG_CACHE_TTL)
+def _load_credentials() -> Optional[Tuple[str, str, str]]:
+    """Read only userbot #1's (api_id, api_hash, phone_number) (raises on DB error)"""
+    with db_cursor(readonly=True) as c:
+        c.execute("SELECT api_id, api_hash, phone_number FROM userbots WHERE id = 1")
+        row = c.fetchone()
+        return (row['api_id'], row['api_hash'], row['phone_number']) if row else None
+
+def _get_credentials() -> Optional[Tuple[str, str, str]]:
+    """Fast path for is_userbot_configured - the three credential columns only"""
+    try:
+        return _load_credentials()
+    except Exception as e:
+        logger.error(f"❌ Error getting userbot 1 credentials: {e}")
+        return None
+
 def get_userbot_config() -> Dict[str, Any]:
     """Get userbot config (legacy function - returns userbot #1 data)"""
-    userbot = get_userbot(1)
+    userbot = _get_legacy_userbot()
     if userbot:
         return {
             'api_id': userbot.get('api_id'),
@@ -164,139 +440,99 @@ def get_userbot_config() -> Dict[str, Any]:
 
 def is_userbot_configured() -> bool:
     """Check if userbot is configured (legacy function)"""
-    userbot = get_userbot(1)
-    if userbot:
-        return (userbot.get('api_id') and 
-                userbot.get('api_hash') and 
-                userbot.get('phone_number') and
-                userbot.get('api_id') != 'pending')
+    credentials = _get_credentials()
+    if credentials:
+        api_id, api_hash, phone_number = credentials
+        return bool(api_id and api_hash and phone_number and api_id != 'pending')
     return False
 
 def is_userbot_enabled() -> bool:
     """Check if userbot is enabled (legacy function)"""
-    userbot = get_userbot(1)
-    return userbot.get('is_enabled', False) if userbot else False
+    return _get_enabled()
 
 def save_userbot_config(api_id: str, api_hash: str, phone_number: str) -> bool:
     """Save userbot config (legacy function - saves to userbot #1)"""
-    conn = None
     try:
-        conn = get_db_connection()
-        c = conn.cursor()
-        
-        # Check if userbot #1 exists
-        c.execute("SELECT id FROM userbots WHERE id = 1")
-        if c.fetchone():
-            # Update existing
-            c.execute("""
-                UPDATE userbots 
-                SET api_id = %s, api_hash = %s, phone_number = %s, updated_at = CURRENT_TIMESTAMP
-                WHERE id = 1
-            """, (api_id, api_hash, phone_number))
-        else:
-            # Create new
+        with db_cursor() as c:
+            # Create or update userbot #1 in one statement - nothing is read back
             c.execute("""
                 INSERT INTO userbots (id, name, api_id, api_hash, phone_number)
                 VALUES (1, 'Default Userbot', %s, %s, %s)
+                ON CONFLICT (id) DO UPDATE
+                SET api_id = EXCLUDED.api_id, api_hash = EXCLUDED.api_hash, phone_number = EXCLUDED.phone_number
             """, (api_id, api_hash, phone_number))
-        
-        conn.commit()
-        logger.info("✅ Userbot config saved successfully")
-        return True
+            
+            _notify_cache_invalidate(c, 'userbots')
+            logger.info("✅ Userbot config saved successfully")
+            return True
         
     except Exception as e:
         logger.error(f"❌ Error saving userbot config: {e}")
-        if conn:
-            try:
-                conn.rollback()
-            except:
-                pass
         return False
-    finally:
-        if conn:
-            conn.close()
+
+# Legacy setting name -> userbots column; None means the value lives in userbot_settings
+_LEGACY_SETTING_COLUMNS = {
+    'enabled': 'is_enabled',
+    'max_retries': 'max_deliveries_per_hour',  # Approximate mapping
+    'auto_reconnect': None,  # No column - must not flip is_enabled
+    'send_notifications': None,
+    'retry_delay': None,
+    'secret_chat_ttl': None,
+}
+_ALLOWED_SETTINGS = frozenset(_LEGACY_SETTING_COLUMNS)
+
+# One fixed statement per column, so no caller-supplied text ever reaches the SQL
+_UPDATE_SETTING_SQL = {
+    column: f"UPDATE userbots SET {column} = %s WHERE id = 1"
+    for column in set(_LEGACY_SETTING_COLUMNS.values()) if column
+}
 
 def update_userbot_setting(setting_name: str, setting_value: Any) -> bool:
     """Update userbot setting (legacy function - updates userbot #1)"""
-    conn = None
+    if setting_name not in _ALLOWED_SETTINGS:
+        raise ValueError(f"Unknown userbot setting: {setting_name}")
+    db_column = _LEGACY_SETTING_COLUMNS[setting_name]
+    if db_column is None:
+        # No column backs this setting - report it instead of claiming a write
+        logger.warning(f"⚠️ Userbot setting {setting_name} is not persisted")
+        return False
     try:
-        conn = get_db_connection()
-        c = conn.cursor()
-        
-        # Map legacy setting names to new schema
-        setting_map = {
-            'enabled': 'is_enabled',
-            'max_retries': 'max_deliveries_per_hour',  # Approximate mapping
-            'auto_reconnect': 'is_enabled',  # Approximate mapping
-            # Other settings are stored in global settings table
-        }
-        
-        db_column = setting_map.get(setting_name, setting_name)
-        
-        # Try to update userbot #1
-        if db_column in ['is_enabled', 'max_deliveries_per_hour']:
-            c.execute(f"""
-                UPDATE userbots 
-                SET {db_column} = %s, updated_at = CURRENT_TIMESTAMP
-                WHERE id = 1
-            """, (setting_value,))
-            conn.commit()
+        with db_cursor() as c:
+            c.execute(_UPDATE_SETTING_SQL[db_column], (setting_value,))
+            _notify_cache_invalidate(c, 'userbots')
             logger.info(f"✅ Updated userbot setting {setting_name} = {setting_value}")
             return True
-        else:
-            # Store in global settings
-            logger.info(f"ℹ️ Setting {setting_name} stored in global userbot_settings")
-            return True
         
     except Exception as e:
         logger.error(f"❌ Error updating userbot setting: {e}")
-        if conn:
-            try:
-                conn.rollback()
-            except:
-                pass
         return False
-    finally:
-        if conn:
-            conn.close()
 
 def reset_userbot_config() -> bool:
     """Reset userbot configuration (legacy function - resets userbot #1)"""
-    conn = None
     try:
-        conn = get_db_connection()
-        c = conn.cursor()
-        
-        # Delete userbot #1 completely
-        c.execute("DELETE FROM userbots WHERE id = 1")
-        c.execute("DELETE FROM userbot_stats WHERE userbot_id = 1")
-        
-        conn.commit()
-        logger.info("✅ Userbot configuration reset successfully")
-        return True
+        with db_cursor() as c:
+            # Delete userbot #1 completely (its userbot_stats and deliveries go with it via ON DELETE CASCADE)
+            c.execute("DELETE FROM userbots WHERE id = 1")
+            
+            _notify_cache_invalidate(c, 'userbots')
+            logger.info("✅ Userbot configuration reset successfully")
+            return True
         
     except Exception as e:
         logger.error(f"❌ Error resetting userbot config: {e}")
-        if conn:
-            try:
-                conn.rollback()
-            except:
-                pass
         return False
-    finally:
-        if conn:
-            conn.close()
 
 def create_multi_userbot_schema():
     """Create all tables for multi-userbot system"""
     logger.info("🔍 Creating multi-userbot schema...")
     conn = None
     try:
-        conn = get_db_connection()
+        conn = acquire_db_connection()
         c = conn.cursor()
         logger.debug("✅ Database connection established")
         
-        # Main userbot accounts table
+        # Main userbot accounts table (plus the session_file column for existing databases)
+        # and the id sequence for the partitioned deliveries table - one round-trip
         c.execute("""
             CREATE TABLE IF NOT EXISTS userbots (
                 id SERIAL PRIMARY KEY,
@@ -315,34 +551,84 @@ def create_multi_userbot_schema():
                 updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
                 last_connected_at TIMESTAMP WITH TIME ZONE,
                 last_error TEXT
-            )
+            );
+            ALTER TABLE userbots ADD COLUMN IF NOT EXISTS session_file BYTEA;
+            CREATE SEQUENCE IF NOT EXISTS userbot_deliveries_id_seq;
         """)
         
-        # 🚀  Add session_file column if it doesn't exist (for existing databases)
-        try:
-            c.execute("ALTER TABLE userbots ADD COLUMN IF NOT EXISTS session_file BYTEA")
-            conn.commit()
-            logger.info("✅ session_file column added/verified in userbots table")
-        except Exception as e:
-            logger.info(f"ℹ️ session_file column handling: {e}")
+        # Userbot delivery assignments - range-partitioned by day on created_at so the
+        # 24h stats scan stays bounded and retention is a DROP of whole partitions
+        c.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass('userbot_deliveries')")
+        existing = c.fetchone()
+        migrate_unpartitioned = bool(existing and existing['relkind'] == 'r')
+        if migrate_unpartitioned:
+            logger.info("🔄 Migrating userbot_deliveries to a partitioned table...")
+            c.execute("ALTER SEQUENCE userbot_deliveries_id_seq OWNED BY NONE")
+            c.execute("ALTER TABLE userbot_deliveries RENAME TO userbot_deliveries_unpartitioned")
+            c.execute("ALTER INDEX IF EXISTS userbot_deliveries_pkey RENAME TO userbot_deliveries_unpartitioned_pkey")
+            # Secondary indexes keep their names across the rename - drop them so the batch
+            # below builds them on the partitioned table instead of skipping them as existing
+            c.execute("""
+                DROP INDEX IF EXISTS idx_userbot_deliveries_status, idx_userbot_deliveries_userbot_id,
+                    idx_userbot_deliveries_created_at, idx_ubd_userbot_recent,
+                    idx_ubd_userbot_recent_cov, idx_ubd_created_brin
+            """)
         
-        # Userbot delivery assignments
         c.execute("""
             CREATE TABLE IF NOT EXISTS userbot_deliveries (
-                id SERIAL PRIMARY KEY,
+                id INTEGER NOT NULL DEFAULT nextval('userbot_deliveries_id_seq'),
                 userbot_id INTEGER NOT NULL REFERENCES userbots(id) ON DELETE CASCADE,
                 user_id BIGINT NOT NULL,
                 order_id TEXT NOT NULL,
                 delivery_status TEXT NOT NULL,
                 delivery_time REAL,
                 error_message TEXT,
-                created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
-                completed_at TIMESTAMP WITH TIME ZONE
-            )
+                created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                completed_at TIMESTAMP WITH TIME ZONE,
+                PRIMARY KEY (id, created_at)
+            ) PARTITION BY RANGE (created_at);
+            ALTER SEQUENCE userbot_deliveries_id_seq OWNED BY userbot_deliveries.id;
+            CREATE TABLE IF NOT EXISTS userbot_deliveries_default PARTITION OF userbot_deliveries DEFAULT;
         """)
+        _create_delivery_partitions(c)
+        
+        if migrate_unpartitioned:
+            # History inside the retention window goes to its own dated partitions (never DEFAULT,
+            # which retention can't drop and every new partition would have to scan); older
+            # rows stay behind in userbot_deliveries_archive
+            cutoff = datetime.now(timezone.utc) - timedelta(days=DELIVERY_RETENTION_DAYS)
+            c.execute("""
+                SELECT DISTINCT (COALESCE(created_at, CURRENT_TIMESTAMP) AT TIME ZONE 'UTC')::date AS day
+                FROM userbot_deliveries_unpartitioned
+                WHERE COALESCE(created_at, CURRENT_TIMESTAMP) >= %s
+            """, (cutoff,))
+            for row in c.fetchall():
+                _create_delivery_partition(c, row['day'])
+            c.execute("""
+                WITH moved AS (
+                    DELETE FROM userbot_deliveries_unpartitioned
+                    WHERE COALESCE(created_at, CURRENT_TIMESTAMP) >= %s
+                    RETURNING *
+                )
+                INSERT INTO userbot_deliveries (id, userbot_id, user_id, order_id, delivery_status,
+                                                delivery_time, error_message, created_at, completed_at)
+                SELECT id, userbot_id, user_id, order_id, delivery_status,
+                       delivery_time, error_message, COALESCE(created_at, CURRENT_TIMESTAMP), completed_at
+                FROM moved
+            """, (cutoff,))
+            c.execute("SELECT EXISTS (SELECT 1 FROM userbot_deliveries_unpartitioned) AS has_old")
+            if c.fetchone()['has_old']:
+                c.execute("ALTER TABLE userbot_deliveries_unpartitioned RENAME TO userbot_deliveries_archive")
+                c.execute("ALTER INDEX IF EXISTS userbot_deliveries_unpartitioned_pkey RENAME TO userbot_deliveries_archive_pkey")
+                logger.info(f"📦 Deliveries older than {DELIVERY_RETENTION_DAYS} days kept in userbot_deliveries_archive")
+            else:
+                c.execute("DROP TABLE userbot_deliveries_unpartitioned")
+            logger.info("✅ userbot_deliveries migrated to daily partitions")
         
-        # Userbot statistics
+        # Remaining tables, triggers and indexes are all idempotent, so they go to the
+        # server as one multi-statement batch inside this transaction
         c.execute("""
+            -- Userbot statistics
             CREATE TABLE IF NOT EXISTS userbot_stats (
                 userbot_id INTEGER PRIMARY KEY REFERENCES userbots(id) ON DELETE CASCADE,
                 total_deliveries INTEGER DEFAULT 0,
@@ -352,11 +638,9 @@ def create_multi_userbot_schema():
                 last_delivery_at TIMESTAMP WITH TIME ZONE,
                 deliveries_last_hour INTEGER DEFAULT 0,
                 last_hour_reset_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        
-        # Global userbot settings
-        c.execute("""
+            );
+            
+            -- Global userbot settings (default row inserted if not exists)
             CREATE TABLE IF NOT EXISTS userbot_settings (
                 id INTEGER PRIMARY KEY DEFAULT 1,
                 enabled BOOLEAN DEFAULT TRUE,
@@ -368,19 +652,72 @@ def create_multi_userbot_schema():
                 saved_messages_cleanup_hours INTEGER DEFAULT 6,
                 delivery_delay_seconds INTEGER DEFAULT 30,
                 updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        
-        # Insert default settings if not exists
-        c.execute("SELECT COUNT(*) as count FROM userbot_settings WHERE id = 1")
-        result = c.fetchone()
-        if result and result['count'] == 0:
-            c.execute("INSERT INTO userbot_settings (id) VALUES (1)")
-        
-        # === SCOUT SYSTEM TABLES ===
-        
-        # Scout keywords - keyword triggers and responses
-        c.execute("""
+            );
+            INSERT INTO userbot_settings (id) VALUES (1) ON CONFLICT (id) DO NOTHING;
+            
+            -- updated_at is stamped by trigger, so UPDATE statements never need to set it
+            CREATE OR REPLACE FUNCTION touch_updated_at() RETURNS trigger AS $$
+            BEGIN
+                NEW.updated_at = CURRENT_TIMESTAMP;
+                RETURN NEW;
+            END
+            $$ LANGUAGE plpgsql;
+            DROP TRIGGER IF EXISTS t_userbots_updated ON userbots;
+            CREATE TRIGGER t_userbots_updated
+            BEFORE UPDATE ON userbots
+            FOR EACH ROW EXECUTE PROCEDURE touch_updated_at();
+            DROP TRIGGER IF EXISTS t_userbot_settings_updated ON userbot_settings;
+            CREATE TRIGGER t_userbot_settings_updated
+            BEFORE UPDATE ON userbot_settings
+            FOR EACH ROW EXECUTE PROCEDURE touch_updated_at();
+            
+            -- Userbot counters kept current by a trigger so dashboards read one row, not scan userbots
+            CREATE TABLE IF NOT EXISTS userbot_summary (
+                id INTEGER PRIMARY KEY DEFAULT 1,
+                total INTEGER NOT NULL DEFAULT 0,
+                connected INTEGER NOT NULL DEFAULT 0,
+                enabled INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE OR REPLACE FUNCTION userbot_summary_sync() RETURNS trigger AS $$
+            DECLARE
+                d_total INTEGER := 0;
+                d_connected INTEGER := 0;
+                d_enabled INTEGER := 0;
+            BEGIN
+                IF TG_OP <> 'INSERT' THEN
+                    d_total := -1;
+                    d_connected := -(OLD.is_connected IS TRUE)::int;
+                    d_enabled := -(OLD.is_enabled IS TRUE)::int;
+                END IF;
+                IF TG_OP <> 'DELETE' THEN
+                    d_total := d_total + 1;
+                    d_connected := d_connected + (NEW.is_connected IS TRUE)::int;
+                    d_enabled := d_enabled + (NEW.is_enabled IS TRUE)::int;
+                END IF;
+                IF d_total <> 0 OR d_connected <> 0 OR d_enabled <> 0 THEN
+                    UPDATE userbot_summary
+                    SET total = total + d_total,
+                        connected = connected + d_connected,
+                        enabled = enabled + d_enabled
+                    WHERE id = 1;
+                END IF;
+                RETURN NULL;
+            END
+            $$ LANGUAGE plpgsql;
+            DROP TRIGGER IF EXISTS t_userbot_summary ON userbots;
+            CREATE TRIGGER t_userbot_summary
+            AFTER INSERT OR DELETE OR UPDATE OF is_enabled, is_connected ON userbots
+            FOR EACH ROW EXECUTE PROCEDURE userbot_summary_sync();
+            -- Recount on every startup so the counters heal from any drift (e.g. TRUNCATE)
+            INSERT INTO userbot_summary (id, total, connected, enabled)
+            SELECT 1, COUNT(*), COUNT(*) FILTER (WHERE is_connected), COUNT(*) FILTER (WHERE is_enabled)
+            FROM userbots
+            ON CONFLICT (id) DO UPDATE
+            SET total = EXCLUDED.total, connected = EXCLUDED.connected, enabled = EXCLUDED.enabled;
+            
+            -- === SCOUT SYSTEM TABLES ===
+            
+            -- Scout keywords - keyword triggers and responses
             CREATE TABLE IF NOT EXISTS scout_keywords (
                 id SERIAL PRIMARY KEY,
                 keyword TEXT NOT NULL,
@@ -393,11 +730,9 @@ def create_multi_userbot_schema():
                 created_by BIGINT,
                 uses_count INTEGER DEFAULT 0,
                 last_used_at TIMESTAMP WITH TIME ZONE
-            )
-        """)
-        
-        # Scout triggers log - logs all keyword detections
-        c.execute("""
+            );
+            
+            -- Scout triggers log - logs all keyword detections
             CREATE TABLE IF NOT EXISTS scout_triggers (
                 id SERIAL PRIMARY KEY,
                 userbot_id INTEGER REFERENCES userbots(id) ON DELETE CASCADE,
@@ -412,38 +747,42 @@ def create_multi_userbot_schema():
                 response_message_id INTEGER,
                 error_message TEXT,
                 triggered_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        
-        # Add scout mode columns to userbots table if they don't exist
-        c.execute("""
-            ALTER TABLE userbots 
-            ADD COLUMN IF NOT EXISTS scout_mode_enabled BOOLEAN DEFAULT FALSE
-        """)
-        c.execute("""
-            ALTER TABLE userbots 
-            ADD COLUMN IF NOT EXISTS scout_reply_in_pm BOOLEAN DEFAULT FALSE
-        """)
-        c.execute("""
-            ALTER TABLE userbots 
-            ADD COLUMN IF NOT EXISTS scout_groups_only BOOLEAN DEFAULT TRUE
+            );
+            
+            -- Add scout mode columns to userbots table if they don't exist
+            ALTER TABLE userbots
+                ADD COLUMN IF NOT EXISTS scout_mode_enabled BOOLEAN DEFAULT FALSE,
+                ADD COLUMN IF NOT EXISTS scout_reply_in_pm BOOLEAN DEFAULT FALSE,
+                ADD COLUMN IF NOT EXISTS scout_groups_only BOOLEAN DEFAULT TRUE;
+            
+            -- Create indexes
+            -- Single-column boolean indexes are superseded by the partial dispatch index below
+            DROP INDEX IF EXISTS idx_userbots_enabled;
+            DROP INDEX IF EXISTS idx_userbots_connected;
+            CREATE INDEX IF NOT EXISTS idx_userbots_priority ON userbots(priority DESC);
+            CREATE INDEX IF NOT EXISTS idx_userbots_avail ON userbots(priority DESC, id)
+            WHERE is_enabled AND is_connected;
+            CREATE INDEX IF NOT EXISTS idx_userbot_deliveries_status ON userbot_deliveries(delivery_status);
+            -- Serves the dashboard's "last 10 deliveries of userbot N"; its leading column also
+            -- covers the old userbot_id-only index. error_message is free text of any length, so
+            -- it is heap-fetched rather than INCLUDEd (an oversized entry would fail the UPDATE)
+            DROP INDEX IF EXISTS idx_userbot_deliveries_userbot_id;
+            DROP INDEX IF EXISTS idx_ubd_userbot_recent;
+            CREATE INDEX IF NOT EXISTS idx_ubd_userbot_recent_cov ON userbot_deliveries(userbot_id, created_at DESC)
+            INCLUDE (user_id, delivery_status, completed_at);
+            -- created_at grows with insert order, so a BRIN index (created on every partition)
+            -- serves the 24h window at a fraction of the size
+            DROP INDEX IF EXISTS idx_userbot_deliveries_created_at;
+            CREATE INDEX IF NOT EXISTS idx_ubd_created_brin ON userbot_deliveries USING BRIN (created_at);
+            
+            -- Scout system indexes
+            CREATE INDEX IF NOT EXISTS idx_scout_keywords_active ON scout_keywords(is_active);
+            CREATE INDEX IF NOT EXISTS idx_scout_triggers_userbot ON scout_triggers(userbot_id);
+            CREATE INDEX IF NOT EXISTS idx_scout_triggers_keyword ON scout_triggers(keyword_id);
+            CREATE INDEX IF NOT EXISTS idx_scout_triggers_date ON scout_triggers(triggered_at DESC);
+            CREATE INDEX IF NOT EXISTS idx_userbots_scout_mode ON userbots(scout_mode_enabled);
         """)
         
-        # Create indexes
-        c.execute("CREATE INDEX IF NOT EXISTS idx_userbots_enabled ON userbots(is_enabled)")
-        c.execute("CREATE INDEX IF NOT EXISTS idx_userbots_connected ON userbots(is_connected)")
-        c.execute("CREATE INDEX IF NOT EXISTS idx_userbots_priority ON userbots(priority DESC)")
-        c.execute("CREATE INDEX IF NOT EXISTS idx_userbot_deliveries_status ON userbot_deliveries(delivery_status)")
-        c.execute("CREATE INDEX IF NOT EXISTS idx_userbot_deliveries_userbot_id ON userbot_deliveries(userbot_id)")
-        c.execute("CREATE INDEX IF NOT EXISTS idx_userbot_deliveries_created_at ON userbot_deliveries(created_at DESC)")
-        
-        # Scout system indexes
-        c.execute("CREATE INDEX IF NOT EXISTS idx_scout_keywords_active ON scout_keywords(is_active)")
-        c.execute("CREATE INDEX IF NOT EXISTS idx_scout_triggers_userbot ON scout_triggers(userbot_id)")
-        c.execute("CREATE INDEX IF NOT EXISTS idx_scout_triggers_keyword ON scout_triggers(keyword_id)")
-        c.execute("CREATE INDEX IF NOT EXISTS idx_scout_triggers_date ON scout_triggers(triggered_at DESC)")
-        c.execute("CREATE INDEX IF NOT EXISTS idx_userbots_scout_mode ON userbots(scout_mode_enabled)")
-        
         conn.commit()
         print("✅  Multi-userbot schema committed successfully")
         logger.info("✅ Multi-userbot database schema created successfully")
@@ -464,608 +803,745 @@ def create_multi_userbot_schema():
         return False
     finally:
         if conn:
-            conn.close()
+            release_db_connection(conn)
 
 # ==================== USERBOT MANAGEMENT ====================
 
-def add_userbot(name: str, api_id: str, api_hash: str, phone_number: str, 
-                session_string: Optional[str] = None, priority: int = 0) -> Optional[int]:
-    """Add a new userbot"""
-    conn = None
+def add_userbots_bulk(rows: List[tuple]) -> List[int]:
+    """Add several userbots in one statement
+    
+    Args:
+        rows: (name, api_id, api_hash, phone_number, session_string, priority) tuples
+    
+    Returns:
+        New userbot IDs in insertion order (empty list on error)
+    """
+    if not rows:
+        return []
+    if len(rows) >= _USERBOT_COPY_THRESHOLD:
+        return _copy_userbots_bulk(rows)
     try:
-        conn = get_db_connection()
-        c = conn.cursor()
-        
-        c.execute("""
-            INSERT INTO userbots (name, api_id, api_hash, phone_number, session_string, priority)
-            VALUES (%s, %s, %s, %s, %s, %s)
-            RETURNING id
-        """, (name, api_id, api_hash, phone_number, session_string, priority))
-        
-        userbot_id = c.fetchone()[0]
+        with db_cursor() as c:
+            # Userbots and their stats rows in a single statement
+            inserted = execute_values(c, """
+                WITH ins AS (
+                    INSERT INTO userbots (name, api_id, api_hash, phone_number, session_string, priority)
+                    VALUES %s
+                    RETURNING id
+                )
+                INSERT INTO userbot_stats (userbot_id)
+                SELECT id FROM ins ORDER BY id
+                RETURNING userbot_id
+            """, rows, fetch=True)
+            userbot_ids = [row['userbot_id'] for row in inserted]
+            _notify_cache_invalidate(c, 'userbots')
+        
+        logger.info(f"✅ Added {len(userbot_ids)} userbot(s) (IDs: {userbot_ids})")
+        return userbot_ids
         
-        # Initialize stats
-        c.execute("""
-            INSERT INTO userbot_stats (userbot_id)
-            VALUES (%s)
-        """, (userbot_id,))
-        
-        conn.commit()
-        logger.info(f"✅ Added userbot '{name}' (ID: {userbot_id})")
-        return userbot_id
+    except Exception as e:
+        logger.error(f"❌ Error adding userbots: {e}", exc_info=True)
+        return []
+
+# Imports at or above this size stream through COPY instead of a VALUES list
+_USERBOT_COPY_THRESHOLD = 1000
+
+def _copy_userbots_bulk(rows: List[tuple]) -> List[int]:
+    """Backfill path for add_userbots_bulk: COPY into a staging table, then one CTE insert"""
+    buf = io.StringIO()
+    csv.writer(buf).writerows(rows)
+    buf.seek(0)
+    try:
+        with db_cursor() as c:
+            c.execute("""
+                CREATE TEMP TABLE ub_import (
+                    name TEXT, api_id TEXT, api_hash TEXT, phone_number TEXT,
+                    session_string TEXT, priority INTEGER
+                ) ON COMMIT DROP
+            """)
+            c.copy_expert("""
+                COPY ub_import (name, api_id, api_hash, phone_number, session_string, priority)
+                FROM STDIN WITH CSV
+            """, buf)
+            c.execute("""
+                WITH ins AS (
+                    INSERT INTO userbots (name, api_id, api_hash, phone_number, session_string, priority)
+                    SELECT name, api_id, api_hash, phone_number, session_string, COALESCE(priority, 0)
+                    FROM ub_import
+                    RETURNING id
+                )
+                INSERT INTO userbot_stats (userbot_id)
+                SELECT id FROM ins ORDER BY id
+                RETURNING userbot_id
+            """)
+            userbot_ids = [row['userbot_id'] for row in c.fetchall()]
+            _notify_cache_invalidate(c, 'userbots')
+        
+        logger.info(f"✅ Imported {len(userbot_ids)} userbot(s) via COPY")
+        return userbot_ids
         
     except Exception as e:
-        logger.error(f"❌ Error adding userbot: {e}", exc_info=True)
-        if conn:
-            try:
-                conn.rollback()
-            except:
-                pass
-        return None
-    finally:
-        if conn:
-            conn.close()
+        logger.error(f"❌ Error importing userbots: {e}", exc_info=True)
+        return []
+
+def add_userbot(name: str, api_id: str, api_hash: str, phone_number: str, 
+                session_string: Optional[str] = None, priority: int = 0) -> Optional[int]:
+    """Add a new userbot"""
+    userbot_ids = add_userbots_bulk([(name, api_id, api_hash, phone_number, session_string, priority)])
+    return userbot_ids[0] if userbot_ids else None
+
+# Columns for list/dispatch views; leaves out the credentials, session_string and session_file blobs
+USERBOT_LIST_COLS = (
+    "u.id, u.name, u.phone_number, u.is_enabled, u.is_connected, u.status_message, "
+    "u.priority, u.max_deliveries_per_hour, u.last_connected_at, u.last_error"
+)
 
 def get_userbot(userbot_id: int) -> Optional[Dict[str, Any]]:
     """Get userbot by ID"""
-    conn = None
     try:
-        conn = get_db_connection()
-        c = conn.cursor()
-        
-        c.execute("SELECT * FROM userbots WHERE id = %s", (userbot_id,))
-        row = c.fetchone()
-        
-        if row:
-            return dict(row)
-        return None
+        with db_cursor(readonly=True) as c:
+            _execute_prepared(c, 'ub_get', (userbot_id,))
+            return c.fetchone()
         
     except Exception as e:
         logger.error(f"❌ Error getting userbot {userbot_id}: {e}")
         return None
-    finally:
-        if conn:
-            conn.close()
 
-def get_all_userbots() -> List[Dict[str, Any]]:
-    """Get all userbots"""
-    conn = None
+def get_userbot_session(userbot_id: int) -> Optional[str]:
+    """Get a userbot's session string (only for building a client)"""
     try:
-        conn = get_db_connection()
-        c = conn.cursor()
-        
-        c.execute("""
-            SELECT u.*, 
-                   s.total_deliveries, s.successful_deliveries, s.failed_deliveries,
-                   s.last_delivery_at, s.deliveries_last_hour
-            FROM userbots u
-            LEFT JOIN userbot_stats s ON u.id = s.userbot_id
-            ORDER BY u.priority DESC, u.id ASC
-        """)
-        
-        return [dict(row) for row in c.fetchall()]
+        with db_cursor(readonly=True, tuples=True) as c:
+            _execute_prepared(c, 'ub_get_session', (userbot_id,))
+            row = c.fetchone()
+            return row[0] if row else None
         
     except Exception as e:
-        logger.error(f"❌ Error getting all userbots: {e}")
-        return []
-    finally:
-        if conn:
-            conn.close()
+        logger.error(f"❌ Error getting session for userbot {userbot_id}: {e}")
+        return None
 
-def get_available_userbots() -> List[Dict[str, Any]]:
-    """Get all enabled and connected userbots"""
-    conn = None
+def is_scout_mode_enabled(userbot_id: int) -> bool:
+    """Check whether scout mode is on for a userbot (checked per incoming group message)"""
     try:
-        conn = get_db_connection()
-        c = conn.cursor()
+        with db_cursor(readonly=True, tuples=True) as c:
+            c.execute("SELECT scout_mode_enabled FROM userbots WHERE id = %s", (userbot_id,))
+            row = c.fetchone()
+            return bool(row and row[0])
         
-        c.execute("""
-            SELECT u.*, 
-                   s.deliveries_last_hour, s.last_hour_reset_at
+    except Exception as e:
+        logger.error(f"❌ Error checking scout mode for userbot {userbot_id}: {e}")
+        return False
+
+def get_connectable_userbots(userbot_id: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Get enabled userbots with a session, in priority order (everything the pool needs to connect one)"""
+    try:
+        with db_cursor(readonly=True) as c:
+            c.execute("""
+                SELECT id, name, api_id, api_hash, phone_number, session_string, priority, scout_mode_enabled
+                FROM userbots
+                WHERE is_enabled = TRUE AND session_string IS NOT NULL
+                  AND (%(id)s::int IS NULL OR id = %(id)s::int)
+                ORDER BY priority DESC, id ASC
+            """, {'id': userbot_id})
+            
+            return c.fetchall()
+        
+    except Exception as e:
+        logger.error(f"❌ Error getting connectable userbots: {e}")
+        return []
+
+def get_all_userbots() -> List[Dict[str, Any]]:
+    """Get all userbots"""
+    try:
+        with db_cursor(readonly=True) as c:
+            c.execute(f"""
+                SELECT {USERBOT_LIST_COLS}, 
+                       s.total_deliveries, s.successful_deliveries, s.failed_deliveries,
+                       s.last_delivery_at, s.deliveries_last_hour
+                FROM userbots u
+                LEFT JOIN userbot_stats s ON u.id = s.userbot_id
+                ORDER BY u.priority DESC, u.id ASC
+            """)
+            
+            return c.fetchall()
+        
+    except Exception as e:
+        logger.error(f"❌ Error getting all userbots: {e}")
+        return []
+
+def iter_all_userbots(chunk: int = 500) -> Iterator[Dict[str, Any]]:
+    """Stream all userbots through a server-side cursor, `chunk` rows per round-trip.
+
+    Holds a pooled connection until the iterator is exhausted or closed, so consume it fully.
+    Database errors propagate, even mid-stream.
+    """
+    try:
+        with db_cursor(name='ub_all') as c:
+            c.itersize = chunk
+            c.execute(f"""
+                SELECT {USERBOT_LIST_COLS}, 
+                       s.total_deliveries, s.successful_deliveries, s.failed_deliveries,
+                       s.last_delivery_at, s.deliveries_last_hour
+                FROM userbots u
+                LEFT JOIN userbot_stats s ON u.id = s.userbot_id
+                ORDER BY u.priority DESC, u.id ASC
+            """)
+            
+            yield from c
+        
+    except Exception as e:
+        # Re-raised: ending quietly would look like a complete iteration to the caller
+        logger.error(f"❌ Error streaming userbots: {e}")
+        raise
+
+def get_available_userbots() -> List[Dict[str, Any]]:
+    """Get all enabled and connected userbots (cached for _USERBOTS_CACHE_TTL)"""
+    try:
+        # Copy so callers sorting the list don't reorder the cached one
+        return list(_load_available_userbots())
+    except Exception as e:
+        logger.error(f"❌ Error getting available userbots: {e}")
+        return []
+
+@_ttl_cached('userbots', _USERBOTS_CACHE_TTL)
+def _load_available_userbots() -> List[Dict[str, Any]]:
+    """Query enabled + connected userbots under their hourly rate limit (raises on DB error)"""
+    with db_cursor() as c:
+        # Roll over stale hourly windows and read the result in one statement. The SELECT
+        # sees the pre-UPDATE snapshot, so rows touched by `r` are patched via the join.
+        c.execute(f"""
+            WITH r AS (
+                UPDATE userbot_stats
+                SET deliveries_last_hour = 0, last_hour_reset_at = CURRENT_TIMESTAMP
+                WHERE last_hour_reset_at < CURRENT_TIMESTAMP - INTERVAL '1 hour'
+                RETURNING userbot_id, last_hour_reset_at
+            )
+            SELECT {USERBOT_LIST_COLS}, 
+                   CASE WHEN r.userbot_id IS NULL THEN s.deliveries_last_hour ELSE 0 END AS deliveries_last_hour,
+                   COALESCE(r.last_hour_reset_at, s.last_hour_reset_at) AS last_hour_reset_at
             FROM userbots u
             LEFT JOIN userbot_stats s ON u.id = s.userbot_id
+            LEFT JOIN r ON u.id = r.userbot_id
             WHERE u.is_enabled = TRUE AND u.is_connected = TRUE
+              AND (r.userbot_id IS NOT NULL
+                   OR COALESCE(s.deliveries_last_hour, 0) < COALESCE(u.max_deliveries_per_hour, 30))
             ORDER BY u.priority DESC, u.id ASC
         """)
-        
-        userbots = [dict(row) for row in c.fetchall()]
-        
-        # Filter out userbots that exceeded rate limit
-        available = []
-        for ub in userbots:
-            # Reset hourly counter if needed
-            if ub.get('last_hour_reset_at'):
-                reset_time = ub['last_hour_reset_at']
-                if datetime.now(reset_time.tzinfo) - reset_time > timedelta(hours=1):
-                    reset_hourly_deliveries(ub['id'])
-                    ub['deliveries_last_hour'] = 0
+        return c.fetchall()
+
+# Columns update_userbot() may set; keys are interpolated into SQL so they must be whitelisted
+_UPDATABLE_USERBOT_COLUMNS = frozenset({
+    'name', 'api_id', 'api_hash', 'phone_number', 'session_string', 'is_enabled',
+    'is_connected', 'status_message', 'last_error', 'last_connected_at', 'priority',
+    'max_deliveries_per_hour',
+})
+
+def update_userbot(userbot_id: int, **fields) -> bool:
+    """Update any whitelisted userbot columns in one statement
+    
+    Setting is_connected to true also stamps last_connected_at with the DB clock,
+    unless the caller passes last_connected_at itself.
+    """
+    unknown = set(fields) - _UPDATABLE_USERBOT_COLUMNS
+    if unknown:
+        raise ValueError(f"Unknown userbot column(s): {', '.join(sorted(unknown))}")
+    if not fields:
+        return True
+    try:
+        with db_cursor() as c:
+            assignments = [f"{column} = %s" for column in fields]
+            params = list(fields.values())
+            if 'is_connected' in fields and 'last_connected_at' not in fields:
+                # Same clock as update_userbots()
+                assignments.append("last_connected_at = CASE WHEN %s THEN CURRENT_TIMESTAMP ELSE last_connected_at END")
+                params.append(fields['is_connected'])
+            c.execute(f"""
+                UPDATE userbots
+                SET {', '.join(assignments)}
+                WHERE id = %s
+            """, [*params, userbot_id])
             
-            # Check rate limit
-            if ub.get('deliveries_last_hour', 0) < ub.get('max_deliveries_per_hour', 30):
-                available.append(ub)
+            _notify_cache_invalidate(c, 'userbots')
+            return True
         
-        return available
+    except Exception as e:
+        logger.error(f"❌ Error updating userbot {userbot_id}: {e}")
+        return False
+
+def update_userbots(rows: List[Tuple[int, bool, Optional[str]]]) -> bool:
+    """Write connection status for many userbots in one statement
+    
+    Args:
+        rows: (userbot_id, is_connected, status_message) tuples
+    """
+    if not rows:
+        return True
+    try:
+        with db_cursor() as c:
+            execute_values(c, """
+                UPDATE userbots AS u
+                SET is_connected = v.is_connected,
+                    status_message = v.status_message,
+                    last_connected_at = CASE WHEN v.is_connected THEN CURRENT_TIMESTAMP ELSE u.last_connected_at END
+                FROM (VALUES %s) AS v(id, is_connected, status_message)
+                WHERE u.id = v.id
+            """, rows, template="(%s::integer, %s::boolean, %s::text)")
+            _notify_cache_invalidate(c, 'userbots')
+            return True
         
     except Exception as e:
-        logger.error(f"❌ Error getting available userbots: {e}")
-        return []
-    finally:
-        if conn:
-            conn.close()
+        logger.error(f"❌ Error updating userbot connections: {e}")
+        return False
 
 def update_userbot_connection(userbot_id: int, is_connected: bool, 
                                status_message: Optional[str] = None,
                                error_message: Optional[str] = None):
     """Update userbot connection status"""
-    conn = None
-    try:
-        conn = get_db_connection()
-        c = conn.cursor()
-        
-        updates = ["is_connected = %s", "updated_at = CURRENT_TIMESTAMP"]
-        params = [is_connected]
-        
-        if is_connected:
-            updates.append("last_connected_at = CURRENT_TIMESTAMP")
-        
-        if status_message is not None:
-            updates.append("status_message = %s")
-            params.append(status_message)
-        
-        if error_message is not None:
-            updates.append("last_error = %s")
-            params.append(error_message)
-        
-        params.append(userbot_id)
-        
-        c.execute(f"""
-            UPDATE userbots
-            SET {', '.join(updates)}
-            WHERE id = %s
-        """, params)
-        
-        conn.commit()
-        
-    except Exception as e:
-        logger.error(f"❌ Error updating userbot connection: {e}")
-        if conn:
-            try:
-                conn.rollback()
-            except:
-                pass
-    finally:
-        if conn:
-            conn.close()
+    fields = {'is_connected': is_connected}
+    if status_message is not None:
+        fields['status_message'] = status_message
+    if error_message is not None:
+        fields['last_error'] = error_message
+    update_userbot(userbot_id, **fields)
 
-def update_userbot_session(userbot_id: int, session_string: str):
-    """Update userbot session string"""
-    conn = None
+def update_userbot_session(userbot_id: int, session_string: str) -> int:
+    """Update userbot session string if it changed; returns rows written (0 = unchanged or error)"""
     try:
-        conn = get_db_connection()
-        c = conn.cursor()
-        
-        c.execute("""
-            UPDATE userbots
-            SET session_string = %s, updated_at = CURRENT_TIMESTAMP
-            WHERE id = %s
-        """, (session_string, userbot_id))
-        
-        conn.commit()
-        logger.info(f"✅ Updated session for userbot {userbot_id}")
+        with db_cursor() as c:
+            # Reconnects usually re-save the same session - skip the write then
+            c.execute("""
+                UPDATE userbots
+                SET session_string = %s
+                WHERE id = %s AND session_string IS DISTINCT FROM %s
+            """, (session_string, userbot_id, session_string))
+            
+            if c.rowcount:
+                _notify_cache_invalidate(c, 'userbots')
+                logger.info(f"✅ Updated session for userbot {userbot_id}")
+            return c.rowcount
         
     except Exception as e:
         logger.error(f"❌ Error updating userbot session: {e}")
-        if conn:
-            try:
-                conn.rollback()
-            except:
-                pass
-    finally:
-        if conn:
-            conn.close()
+        return 0
 
 def save_session_file(userbot_id: int, session_file_data: bytes) -> bool:
     """Save Pyrogram session file to PostgreSQL (for persistent peer cache)"""
-    conn = None
     try:
         import psycopg2
-        conn = get_db_connection()
-        c = conn.cursor()
-        
-        c.execute("""
-            UPDATE userbots
-            SET session_file = %s, updated_at = CURRENT_TIMESTAMP
-            WHERE id = %s
-        """, (psycopg2.Binary(session_file_data), userbot_id))
-        
-        conn.commit()
-        logger.info(f"✅ Saved session file for userbot {userbot_id} ({len(session_file_data)} bytes)")
-        return True
+        with db_cursor() as c:
+            c.execute("""
+                UPDATE userbots
+                SET session_file = %s
+                WHERE id = %s
+            """, (psycopg2.Binary(session_file_data), userbot_id))
+            
+            logger.info(f"✅ Saved session file for userbot {userbot_id} ({len(session_file_data)} bytes)")
+            return True
         
     except Exception as e:
         logger.error(f"Error saving session file: {e}")
-        if conn:
-            try:
-                conn.rollback()
-            except:
-                pass
         return False
-        
-    finally:
-        if conn:
-            conn.close()
 
 def get_session_file(userbot_id: int) -> Optional[bytes]:
     """Get Pyrogram session file from PostgreSQL"""
-    conn = None
     try:
-        conn = get_db_connection()
-        c = conn.cursor()
-        
-        c.execute("SELECT session_file FROM userbots WHERE id = %s", (userbot_id,))
-        row = c.fetchone()
-        
-        if row and row['session_file']:
-            logger.info(f"✅ Retrieved session file for userbot {userbot_id} ({len(row['session_file'])} bytes)")
-            return bytes(row['session_file'])
-        
-        logger.info(f"ℹ️ No session file found for userbot {userbot_id}")
-        return None
+        with db_cursor(readonly=True, tuples=True) as c:
+            c.execute("SELECT session_file FROM userbots WHERE id = %s", (userbot_id,))
+            row = c.fetchone()
+            
+            if row and row[0]:
+                logger.info(f"✅ Retrieved session file for userbot {userbot_id} ({len(row[0])} bytes)")
+                return bytes(row[0])
+            
+            logger.info(f"ℹ️ No session file found for userbot {userbot_id}")
+            return None
         
     except Exception as e:
         logger.error(f"Error getting session file: {e}")
         return None
-        
-    finally:
-        if conn:
-            conn.close()
 
 def toggle_userbot_enabled(userbot_id: int, is_enabled: bool):
     """Enable/disable userbot"""
-    conn = None
-    try:
-        conn = get_db_connection()
-        c = conn.cursor()
-        
-        c.execute("""
-            UPDATE userbots
-            SET is_enabled = %s, updated_at = CURRENT_TIMESTAMP
-            WHERE id = %s
-        """, (is_enabled, userbot_id))
-        
-        conn.commit()
+    if update_userbot(userbot_id, is_enabled=is_enabled):
         logger.info(f"✅ Userbot {userbot_id} {'enabled' if is_enabled else 'disabled'}")
-        
-    except Exception as e:
-        logger.error(f"❌ Error toggling userbot enabled: {e}")
-        if conn:
-            try:
-                conn.rollback()
-            except:
-                pass
-    finally:
-        if conn:
-            conn.close()
 
 def update_userbot_priority(userbot_id: int, priority: int):
     """Update userbot priority"""
-    conn = None
-    try:
-        conn = get_db_connection()
-        c = conn.cursor()
-        
-        c.execute("""
-            UPDATE userbots
-            SET priority = %s, updated_at = CURRENT_TIMESTAMP
-            WHERE id = %s
-        """, (priority, userbot_id))
-        
-        conn.commit()
+    if update_userbot(userbot_id, priority=priority):
         logger.info(f"✅ Updated userbot {userbot_id} priority to {priority}")
-        
-    except Exception as e:
-        logger.error(f"❌ Error updating userbot priority: {e}")
-        if conn:
-            try:
-                conn.rollback()
-            except:
-                pass
-    finally:
-        if conn:
-            conn.close()
 
 def update_userbot_name(userbot_id: int, name: str):
     """Update userbot name"""
-    conn = None
-    try:
-        conn = get_db_connection()
-        c = conn.cursor()
-        
-        c.execute("""
-            UPDATE userbots
-            SET name = %s, updated_at = CURRENT_TIMESTAMP
-            WHERE id = %s
-        """, (name, userbot_id))
-        
-        conn.commit()
+    if update_userbot(userbot_id, name=name):
         logger.info(f"✅ Updated userbot {userbot_id} name to '{name}'")
         return True
-        
-    except Exception as e:
-        logger.error(f"❌ Error updating userbot name: {e}")
-        if conn:
-            try:
-                conn.rollback()
-            except:
-                pass
-        return False
-    finally:
-        if conn:
-            conn.close()
+    return False
 
 def delete_userbot(userbot_id: int):
     """Delete userbot"""
-    conn = None
     try:
-        conn = get_db_connection()
-        c = conn.cursor()
-        
-        c.execute("DELETE FROM userbots WHERE id = %s", (userbot_id,))
-        conn.commit()
-        logger.info(f"✅ Deleted userbot {userbot_id}")
-        return True
+        with db_cursor() as c:
+            c.execute("DELETE FROM userbots WHERE id = %s", (userbot_id,))
+            _notify_cache_invalidate(c, 'userbots')
+            logger.info(f"✅ Deleted userbot {userbot_id}")
+            return True
         
     except Exception as e:
         logger.error(f"❌ Error deleting userbot: {e}")
-        if conn:
-            try:
-                conn.rollback()
-            except:
-                pass
         return False
-    finally:
-        if conn:
-            conn.close()
 
 # ==================== DELIVERY TRACKING ====================
 
-def record_delivery_start(userbot_id: int, user_id: int, order_id: str) -> Optional[int]:
-    """Record delivery start"""
-    conn = None
+# A delivery row is addressed by its (id, created_at) primary key, so completions can
+# prune to the row's daily partition instead of probing every one
+DeliveryKey = Tuple[int, datetime]
+
+def record_delivery_start(userbot_id: int, user_id: int, order_id: str) -> Optional[DeliveryKey]:
+    """Record delivery start (prefer record_delivery); returns the key for record_delivery_complete"""
     try:
-        conn = get_db_connection()
-        c = conn.cursor()
-        
-        c.execute("""
-            INSERT INTO userbot_deliveries (userbot_id, user_id, order_id, delivery_status)
-            VALUES (%s, %s, %s, 'pending')
-            RETURNING id
-        """, (userbot_id, user_id, order_id))
-        
-        delivery_id = c.fetchone()[0]
-        conn.commit()
-        return delivery_id
+        with db_cursor() as c:
+            _execute_prepared(c, 'ub_rec_start', (userbot_id, user_id, order_id))
+            
+            row = c.fetchone()
+            return row['id'], row['created_at']
         
     except Exception as e:
         logger.error(f"❌ Error recording delivery start: {e}")
-        if conn:
-            try:
-                conn.rollback()
-            except:
-                pass
         return None
-    finally:
-        if conn:
-            conn.close()
 
-def record_delivery_complete(delivery_id: int, success: bool, delivery_time: float,
-                             error_message: Optional[str] = None):
-    """Record delivery completion"""
-    conn = None
+def record_delivery_starts_bulk(rows: List[Tuple[int, int, str]]) -> List[DeliveryKey]:
+    """Record several pending deliveries in one statement
+    
+    Args:
+        rows: (userbot_id, user_id, order_id) tuples
+    
+    Returns:
+        Delivery keys in input order (empty list on error)
+    """
+    if not rows:
+        return []
     try:
-        conn = get_db_connection()
-        c = conn.cursor()
-        
-        status = 'delivered' if success else 'failed'
+        with db_cursor() as c:
+            inserted = execute_values(c, """
+                INSERT INTO userbot_deliveries (userbot_id, user_id, order_id, delivery_status)
+                VALUES %s
+                RETURNING id, created_at
+            """, rows, template="(%s, %s, %s, 'pending')", page_size=500, fetch=True)
+            return [(row['id'], row['created_at']) for row in inserted]
         
-        c.execute("""
-            UPDATE userbot_deliveries
-            SET delivery_status = %s, delivery_time = %s, error_message = %s, 
-                completed_at = CURRENT_TIMESTAMP
-            WHERE id = %s
-            RETURNING userbot_id
-        """, (status, delivery_time, error_message, delivery_id))
+    except Exception as e:
+        logger.error(f"❌ Error recording {len(rows)} delivery start(s): {e}")
+        return []
+
+DELIVERY_COPY_COLUMNS = (
+    'userbot_id', 'user_id', 'order_id', 'delivery_status',
+    'delivery_time', 'error_message', 'created_at', 'completed_at'
+)
+
+def copy_deliveries(rows: Iterable[tuple]) -> int:
+    """Bulk-load finished delivery rows (history migration / replay) with COPY
+    
+    Rows are routed to their daily partitions by created_at. userbot_stats is not
+    touched - replayed history is not live traffic.
+    
+    Args:
+        rows: tuples in DELIVERY_COPY_COLUMNS order; None becomes NULL
+    
+    Returns:
+        Number of rows loaded (0 on error)
+    """
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    count = 0
+    for row in rows:
+        writer.writerow(row)
+        count += 1
+    if not count:
+        return 0
+    buf.seek(0)
+    try:
+        with db_cursor() as c:
+            c.copy_expert(f"""
+                COPY userbot_deliveries ({', '.join(DELIVERY_COPY_COLUMNS)})
+                FROM STDIN WITH CSV
+            """, buf)
         
-        result = c.fetchone()
-        if result:
-            userbot_id = result[0]
-            
-            # Update stats
-            if success:
-                c.execute("""
-                    UPDATE userbot_stats
-                    SET total_deliveries = total_deliveries + 1,
-                        successful_deliveries = successful_deliveries + 1,
-                        total_delivery_time = total_delivery_time + %s,
-                        deliveries_last_hour = deliveries_last_hour + 1,
-                        last_delivery_at = CURRENT_TIMESTAMP
-                    WHERE userbot_id = %s
-                """, (delivery_time, userbot_id))
-            else:
-                c.execute("""
-                    UPDATE userbot_stats
-                    SET total_deliveries = total_deliveries + 1,
-                        failed_deliveries = failed_deliveries + 1,
-                        deliveries_last_hour = deliveries_last_hour + 1,
-                        last_delivery_at = CURRENT_TIMESTAMP
-                    WHERE userbot_id = %s
-                """, (userbot_id,))
+        logger.info(f"✅ Loaded {count} delivery row(s) via COPY")
+        return count
         
-        conn.commit()
+    except Exception as e:
+        logger.error(f"❌ Error loading {count} delivery row(s): {e}", exc_info=True)
+        return 0
+
+async def record_delivery(delivery_coro, userbot_id: int, user_id: int, order_id: str):
+    """Run a delivery with its start and completion rows recorded around it
+    
+    The pending row is committed (and its connection returned to the pool) before the
+    delivery runs, so slow sends never pin a pooled connection and the row is visible
+    while in flight. A truthy result from `delivery_coro` counts as delivered; an
+    exception is recorded as failed and re-raised. Bookkeeping errors are logged and
+    never block the delivery itself.
+    """
+    delivery_key = await asyncio.to_thread(record_delivery_start, userbot_id, user_id, order_id)
+    if delivery_key is None:
+        return await delivery_coro
+    
+    started = time.monotonic()
+    try:
+        result = await delivery_coro
+    except asyncio.CancelledError:
+        # No awaiting here - queue the failure for the batched writer
+        record_delivery_complete(delivery_key, False, time.monotonic() - started, "cancelled")
+        raise
+    except Exception as e:
+        await asyncio.to_thread(_write_delivery_completions,
+                                [(delivery_key, 'failed', time.monotonic() - started, str(e))])
+        raise
+    
+    status = 'delivered' if result else 'failed'
+    await asyncio.to_thread(_write_delivery_completions,
+                            [(delivery_key, status, time.monotonic() - started, None)])
+    return result
+
+# Completions are buffered and written in batches: one UPDATE ... FROM (VALUES ...)
+# for the delivery rows plus one grouped stats UPDATE per flush
+_DELIVERY_FLUSH_MAX = 100
+_DELIVERY_FLUSH_INTERVAL = 0.5  # seconds
+_delivery_flush_queue: Optional[asyncio.Queue] = None
+_delivery_writer_task: Optional[asyncio.Task] = None
+
+def record_delivery_complete(delivery_key: DeliveryKey, success: bool, delivery_time: float,
+                             error_message: Optional[str] = None):
+    """Record delivery completion (prefer record_delivery; queued for the batched writer when called from the event loop)"""
+    item = (delivery_key, 'delivered' if success else 'failed', delivery_time, error_message)
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        # Called from a worker thread / sync context - write through directly
+        _write_delivery_completions([item])
+        return
+    
+    _ensure_delivery_writer()
+    _delivery_flush_queue.put_nowait(item)
+
+def _ensure_delivery_writer():
+    """Start the background completion writer on the running loop if needed"""
+    global _delivery_flush_queue, _delivery_writer_task
+    if _delivery_flush_queue is None:
+        _delivery_flush_queue = asyncio.Queue()
+    if _delivery_writer_task is None or _delivery_writer_task.done():
+        _delivery_writer_task = asyncio.create_task(_delivery_writer())
+
+async def _delivery_writer():
+    """Drain queued completions in batches of up to _DELIVERY_FLUSH_MAX every _DELIVERY_FLUSH_INTERVAL
+    
+    On cancellation, finishes the write in progress and writes everything still collected or queued.
+    """
+    loop = asyncio.get_running_loop()
+    batch = []
+    write = None
+    try:
+        while True:
+            batch.append(await _delivery_flush_queue.get())
+            deadline = loop.time() + _DELIVERY_FLUSH_INTERVAL
+            while len(batch) < _DELIVERY_FLUSH_MAX:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(_delivery_flush_queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            pending, batch = batch, []
+            write = asyncio.ensure_future(asyncio.to_thread(_write_delivery_completions, pending))
+            await asyncio.shield(write)
+    except asyncio.CancelledError:
+        if write is not None and not write.done():
+            await write
+        while not _delivery_flush_queue.empty():
+            batch.append(_delivery_flush_queue.get_nowait())
+        if batch:
+            await asyncio.to_thread(_write_delivery_completions, batch)
+        raise
+
+async def flush_delivery_completions():
+    """Write all queued and in-flight completions and stop the writer (call before shutdown)"""
+    global _delivery_writer_task
+    if _delivery_writer_task is not None and not _delivery_writer_task.done():
+        _delivery_writer_task.cancel()
+        try:
+            await _delivery_writer_task
+        except asyncio.CancelledError:
+            pass
+    _delivery_writer_task = None
+    if not _delivery_flush_queue:
+        return
+    batch = []
+    while not _delivery_flush_queue.empty():
+        batch.append(_delivery_flush_queue.get_nowait())
+    if batch:
+        await asyncio.to_thread(_write_delivery_completions, batch)
+
+def _write_delivery_completions(batch: List[tuple]):
+    """Write a batch of completions in its own transaction"""
+    try:
+        with db_cursor() as c:
+            _apply_delivery_completions(c, batch)
         
     except Exception as e:
-        logger.error(f"❌ Error recording delivery complete: {e}")
-        if conn:
-            try:
-                conn.rollback()
-            except:
-                pass
-    finally:
-        if conn:
-            conn.close()
+        logger.error(f"❌ Error recording {len(batch)} delivery completion(s): {e}")
+
+def _apply_delivery_completions(c, batch: List[tuple]):
+    """Apply (delivery_key, status, delivery_time, error_message) rows and roll them into userbot_stats"""
+    rows = [(key[0], key[1], status, delivery_time, error_message)
+            for key, status, delivery_time, error_message in batch]
+    # Literal created_at bounds let the planner prune to the partitions this batch touches;
+    # matching against the VALUES list alone would probe every daily partition
+    lo = c.mogrify("%s", (min(row[1] for row in rows),)).decode()
+    hi = c.mogrify("%s", (max(row[1] for row in rows),)).decode()
+    # One statement: update the delivery rows, aggregate per userbot, bump the stats
+    execute_values(c, f"""
+        WITH upd AS (
+            UPDATE userbot_deliveries d
+            SET delivery_status = v.status, delivery_time = v.delivery_time,
+                error_message = v.error_message, completed_at = CURRENT_TIMESTAMP
+            FROM (VALUES %s) AS v(id, created_at, status, delivery_time, error_message)
+            WHERE d.id = v.id AND d.created_at = v.created_at
+              AND d.created_at BETWEEN {lo} AND {hi}
+            RETURNING d.userbot_id, v.status, v.delivery_time
+        ), agg AS (
+            SELECT userbot_id,
+                   COUNT(*) AS n,
+                   COUNT(*) FILTER (WHERE status = 'delivered') AS ok,
+                   COUNT(*) FILTER (WHERE status <> 'delivered') AS fail,
+                   COALESCE(SUM(delivery_time) FILTER (WHERE status = 'delivered'), 0) AS ok_time
+            FROM upd
+            GROUP BY userbot_id
+        )
+        UPDATE userbot_stats s
+        SET total_deliveries = s.total_deliveries + agg.n,
+            successful_deliveries = s.successful_deliveries + agg.ok,
+            failed_deliveries = s.failed_deliveries + agg.fail,
+            total_delivery_time = s.total_delivery_time + agg.ok_time,
+            deliveries_last_hour = s.deliveries_last_hour + agg.n,
+            last_delivery_at = CURRENT_TIMESTAMP
+        FROM agg
+        WHERE s.userbot_id = agg.userbot_id
+    """, rows, template="(%s::integer, %s::timestamptz, %s::text, %s::real, %s::text)", page_size=max(len(rows), 1))
 
 def reset_hourly_deliveries(userbot_id: int):
     """Reset hourly delivery counter"""
-    conn = None
     try:
-        conn = get_db_connection()
-        c = conn.cursor()
-        
-        c.execute("""
-            UPDATE userbot_stats
-            SET deliveries_last_hour = 0, last_hour_reset_at = CURRENT_TIMESTAMP
-            WHERE userbot_id = %s
-        """, (userbot_id,))
-        
-        conn.commit()
+        with db_cursor() as c:
+            c.execute("""
+                UPDATE userbot_stats
+                SET deliveries_last_hour = 0, last_hour_reset_at = CURRENT_TIMESTAMP
+                WHERE userbot_id = %s
+            """, (userbot_id,))
         
     except Exception as e:
         logger.error(f"❌ Error resetting hourly deliveries: {e}")
-        if conn:
-            try:
-                conn.rollback()
-            except:
-                pass
-    finally:
-        if conn:
-            conn.close()
 
 # ==================== GLOBAL SETTINGS ====================
 
 def get_global_settings() -> Dict[str, Any]:
-    """Get global userbot settings"""
-    conn = None
+    """Get global userbot settings (cached for _SETTINGS_CACHE_TTL)"""
     try:
-        conn = get_db_connection()
-        c = conn.cursor()
-        
-        c.execute("SELECT * FROM userbot_settings WHERE id = 1")
-        row = c.fetchone()
-        
-        if row:
-            return dict(row)
-        return {}
-        
+        return dict(_load_global_settings())
     except Exception as e:
         logger.error(f"❌ Error getting global settings: {e}")
         return {}
-    finally:
-        if conn:
-            conn.close()
+
+@_ttl_cached('settings', _SETTINGS_CACHE_TTL)
+def _load_global_settings() -> Dict[str, Any]:
+    """Read the userbot_settings row (raises on DB error)"""
+    with db_cursor(readonly=True) as c:
+        c.execute("SELECT * FROM userbot_settings WHERE id = 1")
+        row = c.fetchone()
+    return row or {}
+
+# Columns update_global_settings() may set; keys are interpolated into SQL so they must be whitelisted
+_UPDATABLE_SETTINGS_COLUMNS = frozenset({
+    'enabled', 'load_balancing_strategy', 'auto_reconnect', 'max_retry_attempts',
+    'retry_delay_seconds', 'secret_chat_ttl_hours', 'saved_messages_cleanup_hours',
+    'delivery_delay_seconds',
+})
 
 def update_global_settings(**kwargs):
     """Update global userbot settings"""
-    conn = None
+    unknown = set(kwargs) - _UPDATABLE_SETTINGS_COLUMNS
+    if unknown:
+        raise ValueError(f"Unknown userbot setting(s): {', '.join(sorted(unknown))}")
+    if not kwargs:
+        return
     try:
-        conn = get_db_connection()
-        c = conn.cursor()
-        
-        updates = ["updated_at = CURRENT_TIMESTAMP"]
-        params = []
-        
-        for key, value in kwargs.items():
-            updates.append(f"{key} = %s")
-            params.append(value)
-        
-        c.execute(f"""
-            UPDATE userbot_settings
-            SET {', '.join(updates)}
-            WHERE id = 1
-        """, params)
-        
-        conn.commit()
-        logger.info(f"✅ Updated global settings: {kwargs}")
+        with db_cursor() as c:
+            updates = [f"{key} = %s" for key in kwargs]
+            params = list(kwargs.values())
+            
+            c.execute(f"""
+                UPDATE userbot_settings
+                SET {', '.join(updates)}
+                WHERE id = 1
+            """, params)
+            
+            _notify_cache_invalidate(c, 'settings')
+            logger.info(f"✅ Updated global settings: {kwargs}")
         
     except Exception as e:
         logger.error(f"❌ Error updating global settings: {e}")
-        if conn:
-            try:
-                conn.rollback()
-            except:
-                pass
-    finally:
-        if conn:
-            conn.close()
 
 # ==================== STATISTICS ====================
 
 def get_overall_stats() -> Dict[str, Any]:
     """Get overall statistics for all userbots"""
-    conn = None
     try:
-        conn = get_db_connection()
-        c = conn.cursor()
-        
-        # Overall stats
-        c.execute("""
-            SELECT 
-                COUNT(*) as total_userbots,
-                SUM(CASE WHEN is_connected THEN 1 ELSE 0 END) as connected_userbots,
-                SUM(CASE WHEN is_enabled THEN 1 ELSE 0 END) as enabled_userbots
-            FROM userbots
-        """)
-        overall = dict(c.fetchone())
-        
-        # Delivery stats
-        c.execute("""
-            SELECT 
-                SUM(total_deliveries) as total_deliveries,
-                SUM(successful_deliveries) as successful_deliveries,
-                SUM(failed_deliveries) as failed_deliveries,
-                AVG(total_delivery_time / NULLIF(successful_deliveries, 0)) as avg_delivery_time
-            FROM userbot_stats
-        """)
-        delivery_stats = dict(c.fetchone())
-        
-        # Last 24 hours
-        c.execute("""
-            SELECT COUNT(*) as deliveries_24h
-            FROM userbot_deliveries
-            WHERE created_at > NOW() - INTERVAL '24 hours'
-        """)
-        recent = dict(c.fetchone())
-        
-        return {**overall, **delivery_stats, **recent}
+        with db_cursor(readonly=True) as c:
+            # One round-trip and one snapshot for all three metric groups
+            c.execute("""
+                SELECT o.total_userbots, o.connected_userbots, o.enabled_userbots,
+                       d.total_deliveries, d.successful_deliveries, d.failed_deliveries, d.avg_delivery_time,
+                       r.deliveries_24h
+                FROM (
+                    SELECT 
+                        SUM(total_deliveries) as total_deliveries,
+                        SUM(successful_deliveries) as successful_deliveries,
+                        SUM(failed_deliveries) as failed_deliveries,
+                        AVG(total_delivery_time / NULLIF(successful_deliveries, 0)) as avg_delivery_time
+                    FROM userbot_stats
+                ) d
+                CROSS JOIN (
+                    SELECT COUNT(*) as deliveries_24h
+                    FROM userbot_deliveries
+                    WHERE created_at > NOW() - INTERVAL '24 hours'
+                ) r
+                -- Trigger-maintained counters instead of scanning userbots
+                LEFT JOIN (
+                    SELECT total as total_userbots, connected as connected_userbots, enabled as enabled_userbots
+                    FROM userbot_summary
+                    WHERE id = 1
+                ) o ON TRUE
+            """)
+            return c.fetchone()
         
     except Exception as e:
         logger.error(f"❌ Error getting overall stats: {e}")
         return {}
-    finally:
-        if conn:
-            conn.close()
 
 def get_userbot_stats(userbot_id: int) -> Dict[str, Any]:
     """Get statistics for specific userbot"""
-    conn = None
     try:
-        conn = get_db_connection()
-        c = conn.cursor()
-        
-        c.execute("""
-            SELECT u.*, s.*
-            FROM userbots u
-            LEFT JOIN userbot_stats s ON u.id = s.userbot_id
-            WHERE u.id = %s
-        """, (userbot_id,))
-        
-        row = c.fetchone()
-        if row:
-            return dict(row)
-        return {}
+        with db_cursor(readonly=True) as c:
+            c.execute(f"""
+                SELECT {USERBOT_LIST_COLS},
+                       s.userbot_id, s.total_deliveries, s.successful_deliveries, s.failed_deliveries,
+                       s.total_delivery_time, s.last_delivery_at, s.deliveries_last_hour, s.last_hour_reset_at
+                FROM userbots u
+                LEFT JOIN userbot_stats s ON u.id = s.userbot_id
+                WHERE u.id = %s
+            """, (userbot_id,))
+            
+            return c.fetchone() or {}
         
     except Exception as e:
         logger.error(f"❌ Error getting userbot stats: {e}")
         return {}
-    finally:
-        if conn:
-            conn.close()
@@ -5,6 +5,8 @@ Handles Telegram userbot connection, session management, and auto-reconnect
 
 import logging
 import asyncio
+import random
+from functools import wraps
 from typing import Optional
 from datetime import datetime, timezone
 
@@ -16,6 +18,7 @@ try:
         UserDeactivated, UserDeactivatedBan, FloodWait
     )
     from pyrogram.types import User
+    from pyrogram.handlers import DisconnectHandler
     PYROGRAM_AVAILABLE = True
 except ImportError:
     PYROGRAM_AVAILABLE = False
@@ -32,21 +35,68 @@ from userbot_database import (
 
 logger = logging.getLogger(__name__)
 
+# Longest FloodWait (seconds) slept out before a retry; Pyrogram already absorbs short
+# ones itself, so anything longer is reported as rate limited instead of stalling the caller
+_MAX_FLOOD_WAIT = 30
+
+# Connection monitor wake-up interval (seconds, plus up to 5 s jitter)
+_MONITOR_INTERVAL = 30
+
+# Monitor wake-ups between get_me() probes; the other checks only read the client's own flag
+_MONITOR_DEEP_CHECK_EVERY = 10
+
+def _connected_send(what: str):
+    """Wrap a send_* method: refuse when disconnected and turn errors into the {'success': False} envelope"""
+    def decorator(fn):
+        @wraps(fn)
+        async def wrapper(self, *args, **kwargs) -> dict:
+            if not self.is_connected or not self.client:
+                return {'success': False, 'error': 'Userbot not connected'}
+            try:
+                return await fn(self, *args, **kwargs)
+            except FloodWait as e:
+                logger.warning(f"⚠️ FloodWait: {e.value} seconds")
+                return {'success': False, 'error': f'Rate limited. Wait {e.value}s'}
+            except Exception as e:
+                logger.error(f"❌ Error sending {what}: {e}")
+                return {'success': False, 'error': str(e)}
+        return wrapper
+    return decorator
+
 class UserbotManager:
     """Manages Pyrogram userbot client and connections"""
     
     def __init__(self):
         self.client: Optional[Client] = None
         self.is_connected: bool = False
+        self.me: Optional[User] = None  # the connected account, fetched once per connection
         self.is_initializing: bool = False
         self.reconnect_task: Optional[asyncio.Task] = None
         self._setup_phone_code_hash: Optional[str] = None
+        self._disconnect_event = asyncio.Event()
+        self._pending_status: Optional[tuple] = None  # latest (is_connected, message) not yet written
+        self._status_writer: Optional[asyncio.Task] = None
         
+    def _queue_status(self, is_connected: bool, status_message: str):
+        """Record a connection status write-behind; only the latest pending status reaches the DB"""
+        self._pending_status = (is_connected, status_message)
+        if self._status_writer is None or self._status_writer.done():
+            self._status_writer = asyncio.create_task(self._write_status())
+    
+    async def _write_status(self):
+        """Drain _pending_status on a worker thread until no newer status is queued"""
+        while self._pending_status is not None:
+            status, self._pending_status = self._pending_status, None
+            try:
+                await asyncio.to_thread(update_connection_status, *status)
+            except Exception as e:
+                logger.error(f"❌ Error writing connection status: {e}")
+    
     async def initialize(self) -> bool:
         """Initialize userbot client from database config"""
         if not PYROGRAM_AVAILABLE:
             logger.error("❌ Pyrogram not available")
-            await asyncio.to_thread(update_connection_status, False, "Pyrogram not installed")
+            self._queue_status(False, "Pyrogram not installed")
             return False
         
         if self.is_initializing:
@@ -55,7 +105,7 @@ class UserbotManager:
         
         if not userbot_config.is_configured():
             logger.warning("⚠️ Userbot not configured")
-            await asyncio.to_thread(update_connection_status, False, "Not configured")
+            self._queue_status(False, "Not configured")
             return False
         
         self.is_initializing = True
@@ -68,11 +118,11 @@ class UserbotManager:
             
             if not api_id or not api_hash:
                 logger.error("❌ Missing API credentials")
-                await asyncio.to_thread(update_connection_status, False, "Missing API credentials")
+                self._queue_status(False, "Missing API credentials")
                 return False
             
             # Get session string from database
-            session_string = get_session_string()
+            session_string = await asyncio.to_thread(get_session_string)
             
             # 🚀 MODE: Load session file from PostgreSQL for persistent peer cache!
             from userbot_database import get_session_file, save_session_file
@@ -82,7 +132,7 @@ class UserbotManager:
             os.makedirs("./userbot_data", exist_ok=True)
             
             # Try to load session file from PostgreSQL
-            session_file_data = get_session_file(1)  # Userbot ID #1 (legacy)
+            session_file_data = await asyncio.to_thread(get_session_file, 1)  # Userbot ID #1 (legacy)
             if session_file_data:
                 logger.info(f"✅ Loading session file from PostgreSQL ({len(session_file_data)} bytes)")
                 # Write it to disk for Pyrogram to use
@@ -104,14 +154,15 @@ class UserbotManager:
             )
             
             # Connect to Telegram
+            self.client.add_handler(DisconnectHandler(self._on_disconnect))
             await self.client.start()
             
             # Verify connection
-            me = await self.client.get_me()
+            me = self.me = await self.client.get_me()
             logger.info(f"✅ Userbot connected as @{me.username or me.first_name} (ID: {me.id})")
             
             self.is_connected = True
-            await asyncio.to_thread(update_connection_status, True, f"Connected as @{me.username or me.first_name}")
+            self._queue_status(True, f"Connected as @{me.username or me.first_name}")
             
             # 🚀 MODE: Save session file to PostgreSQL for persistence!
             try:
@@ -145,7 +196,7 @@ class UserbotManager:
             # Save session string for future use
             if not session_string:
                 new_session = await self.client.export_session_string()
-                save_session_string(new_session)
+                await asyncio.to_thread(save_session_string, new_session)
                 logger.info("✅ Session string saved to database")
             
             # 🔍 SCOUT MODE: Setup keyword detection handlers
@@ -165,22 +216,22 @@ class UserbotManager:
             
         except AuthKeyUnregistered:
             logger.error("❌ Session expired - need to re-authenticate")
-            await asyncio.to_thread(update_connection_status, False, "Session expired")
+            self._queue_status(False, "Session expired")
             return False
             
         except (UserDeactivated, UserDeactivatedBan):
             logger.error("❌ User account deactivated or banned")
-            await asyncio.to_thread(update_connection_status, False, "Account deactivated")
+            self._queue_status(False, "Account deactivated")
             return False
             
         except ApiIdInvalid:
             logger.error("❌ Invalid API ID or Hash")
-            await asyncio.to_thread(update_connection_status, False, "Invalid API credentials")
+            self._queue_status(False, "Invalid API credentials")
             return False
             
         except Exception as e:
             logger.error(f"❌ Error initializing userbot: {e}", exc_info=True)
-            await asyncio.to_thread(update_connection_status, False, f"Error: {str(e)[:100]}")
+            self._queue_status(False, f"Error: {str(e)[:100]}")
             return False
             
         finally:
@@ -208,7 +259,10 @@ class UserbotManager:
                         raise
             
             self.is_connected = False
-            await asyncio.to_thread(update_connection_status, False, "Manually disconnected")
+            self.me = None
+            self._queue_status(False, "Manually disconnected")
+            # Wait for the write so a shutdown right after this doesn't leave the DB showing "connected"
+            await self._status_writer
             return True
             
         except Exception as e:
@@ -222,24 +276,40 @@ class UserbotManager:
         await asyncio.sleep(2)
         return await self.initialize()
     
+    async def _on_disconnect(self, client):
+        """DisconnectHandler: wake the monitor now instead of at its next interval"""
+        if client is self.client:
+            self._disconnect_event.set()
+    
     async def _monitor_connection(self):
         """Monitor connection and auto-reconnect if needed"""
         logger.info("👁️ Connection monitor started")
+        checks = 0
         
         while True:
             try:
-                await asyncio.sleep(30)  # Check every 30 seconds
+                # Jittered so userbots sharing a process don't all reconnect on the same tick
+                try:
+                    await asyncio.wait_for(self._disconnect_event.wait(), _MONITOR_INTERVAL + random.random() * 5)
+                except asyncio.TimeoutError:
+                    pass
+                self._disconnect_event.clear()
                 
                 if not self.client or not self.is_connected:
                     continue
                 
-                # Check if still connected
+                # Check if still connected - the client's own flag, with a get_me() round-trip
+                # only every _MONITOR_DEEP_CHECK_EVERY checks
+                checks += 1
                 try:
-                    await self.client.get_me()
+                    if not self.client.is_connected:
+                        raise ConnectionError("client reports disconnected")
+                    if checks % _MONITOR_DEEP_CHECK_EVERY == 0:
+                        self.me = await self.client.get_me()
                 except Exception as e:
                     logger.warning(f"⚠️ Connection lost: {e}")
                     self.is_connected = False
-                    await asyncio.to_thread(update_connection_status, False, "Connection lost")
+                    self._queue_status(False, "Connection lost")
                     
                     if userbot_config.auto_reconnect:
                         logger.info("🔄 Auto-reconnecting...")
@@ -314,7 +384,7 @@ class UserbotManager:
             
             # Export and save session
             session_string = await self.client.export_session_string()
-            save_session_string(session_string)
+            await asyncio.to_thread(save_session_string, session_string)
             
             logger.info(f"✅ Authentication successful: @{me.username or me.first_name}")
             
@@ -348,6 +418,18 @@ class UserbotManager:
             logger.error(f"❌ Error verifying code: {e}", exc_info=True)
             return {'success': False, 'error': str(e)}
     
+    async def _send_with_flood_retry(self, send, **kwargs):
+        """Call a client send method, sleeping out one short FloodWait and retrying once"""
+        try:
+            return await send(**kwargs)
+        except FloodWait as e:
+            if e.value > _MAX_FLOOD_WAIT:
+                raise
+            logger.warning(f"⏳ FloodWait {e.value}s, retrying once")
+            await asyncio.sleep(e.value + 0.1)
+            return await send(**kwargs)
+    
+    @_connected_send('message')
     async def send_message(
         self,
         user_id: int,
@@ -356,27 +438,18 @@ class UserbotManager:
         disable_web_page_preview: bool = True
     ) -> dict:
         """Send text message to user"""
-        if not self.is_connected or not self.client:
-            return {'success': False, 'error': 'Userbot not connected'}
+        message = await self._send_with_flood_retry(
+            self.client.send_message,
+            chat_id=user_id,
+            text=text,
+            parse_mode=parse_mode,
+            disable_web_page_preview=disable_web_page_preview
+        )
         
-        try:
-            message = await self.client.send_message(
-                chat_id=user_id,
-                text=text,
-                parse_mode=parse_mode,
-                disable_web_page_preview=disable_web_page_preview
-            )
-            
-            logger.info(f"✅ Message sent to user {user_id}")
-            return {'success': True, 'message_id': message.id}
-            
-        except FloodWait as e:
-            logger.warning(f"⚠️ FloodWait: {e.value} seconds")
-            return {'success': False, 'error': f'Rate limited. Wait {e.value}s'}
-        except Exception as e:
-            logger.error(f"❌ Error sending message: {e}", exc_info=True)
-            return {'success': False, 'error': str(e)}
+        logger.info(f"✅ Message sent to user {user_id}")
+        return {'success': True, 'message_id': message.id}
     
+    @_connected_send('photo')
     async def send_photo(
         self,
         user_id: int,
@@ -385,27 +458,18 @@ class UserbotManager:
         ttl_seconds: int = None
     ) -> dict:
         """Send photo to user with optional TTL"""
-        if not self.is_connected or not self.client:
-            return {'success': False, 'error': 'Userbot not connected'}
+        message = await self._send_with_flood_retry(
+            self.client.send_photo,
+            chat_id=user_id,
+            photo=photo_path,
+            caption=caption,
+            ttl_seconds=ttl_seconds
+        )
         
-        try:
-            message = await self.client.send_photo(
-                chat_id=user_id,
-                photo=photo_path,
-                caption=caption,
-                ttl_seconds=ttl_seconds
-            )
-            
-            logger.info(f"✅ Photo sent to user {user_id}")
-            return {'success': True, 'message_id': message.id}
-            
-        except FloodWait as e:
-            logger.warning(f"⚠️ FloodWait: {e.value} seconds")
-            return {'success': False, 'error': f'Rate limited. Wait {e.value}s'}
-        except Exception as e:
-            logger.error(f"❌ Error sending photo: {e}", exc_info=True)
-            return {'success': False, 'error': str(e)}
+        logger.info(f"✅ Photo sent to user {user_id}")
+        return {'success': True, 'message_id': message.id}
     
+    @_connected_send('video')
     async def send_video(
         self,
         user_id: int,
@@ -414,27 +478,18 @@ class UserbotManager:
         ttl_seconds: int = None
     ) -> dict:
         """Send video to user with optional TTL"""
-        if not self.is_connected or not self.client:
-            return {'success': False, 'error': 'Userbot not connected'}
+        message = await self._send_with_flood_retry(
+            self.client.send_video,
+            chat_id=user_id,
+            video=video_path,
+            caption=caption,
+            ttl_seconds=ttl_seconds
+        )
         
-        try:
-            message = await self.client.send_video(
-                chat_id=user_id,
-                video=video_path,
-                caption=caption,
-                ttl_seconds=ttl_seconds
-            )
-            
-            logger.info(f"✅ Video sent to user {user_id}")
-            return {'success': True, 'message_id': message.id}
-            
-        except FloodWait as e:
-            logger.warning(f"⚠️ FloodWait: {e.value} seconds")
-            return {'success': False, 'error': f'Rate limited. Wait {e.value}s'}
-        except Exception as e:
-            logger.error(f"❌ Error sending video: {e}", exc_info=True)
-            return {'success': False, 'error': str(e)}
+        logger.info(f"✅ Video sent to user {user_id}")
+        return {'success': True, 'message_id': message.id}
     
+    @_connected_send('document')
     async def send_document(
         self,
         user_id: int,
@@ -442,25 +497,15 @@ class UserbotManager:
         caption: str = None
     ) -> dict:
         """Send document to user"""
-        if not self.is_connected or not self.client:
-            return {'success': False, 'error': 'Userbot not connected'}
+        message = await self._send_with_flood_retry(
+            self.client.send_document,
+            chat_id=user_id,
+            document=document_path,
+            caption=caption
+        )
         
-        try:
-            message = await self.client.send_document(
-                chat_id=user_id,
-                document=document_path,
-                caption=caption
-            )
-            
-            logger.info(f"✅ Document sent to user {user_id}")
-            return {'success': True, 'message_id': message.id}
-            
-        except FloodWait as e:
-            logger.warning(f"⚠️ FloodWait: {e.value} seconds")
-            return {'success': False, 'error': f'Rate limited. Wait {e.value}s'}
-        except Exception as e:
-            logger.error(f"❌ Error sending document: {e}", exc_info=True)
-            return {'success': False, 'error': str(e)}
+        logger.info(f"✅ Document sent to user {user_id}")
+        return {'success': True, 'message_id': message.id}
     
     async def get_user_info(self, user_id: int) -> Optional[dict]:
         """Get user information"""
@@ -468,7 +513,8 @@ class UserbotManager:
             return None
         
         try:
-            user = await self.client.get_users(user_id)
+            # Our own account is already known from connect - no get_users round-trip
+            user = self.me if self.me and self.me.id == user_id else await self.client.get_users(user_id)
             return {
                 'id': user.id,
                 'username': user.username,
@@ -477,7 +523,7 @@ class UserbotManager:
                 'is_bot': user.is_bot
             }
         except Exception as e:
-            logger.error(f"❌ Error getting user info: {e}", exc_info=True)
+            logger.error(f"❌ Error getting user info: {e}")
             return None
     
     async def deliver_product_via_secret_chat(
@@ -23,6 +23,59 @@ import io
 
 logger = logging.getLogger(__name__)
 
+# Media items sent concurrently per delivery
+_MEDIA_SEND_CONCURRENCY = 3
+
+# Userbots connected concurrently during pool initialization
+_CONNECT_CONCURRENCY = 5
+
+# Longest FloodWait (seconds) slept out before a retry; longer ones fail the item instead of stalling the delivery
+_MAX_FLOOD_WAIT = 30
+
+# Telegram albums hold at most 10 media items
+_ALBUM_SIZE = 10
+
+# Temp-file extension for media stored without one in its filename
+_DEFAULT_SUFFIXES = {'photo': '.jpg', 'video': '.mp4'}
+
+def _write_temp_file(data, suffix: str, path: Optional[str] = None) -> str:
+    """Write a media buffer (bytes or the DB's memoryview, no copy) over `path`, or a new temp file; returns the path"""
+    if path is None:
+        fd, path = tempfile.mkstemp(suffix=suffix)
+        os.close(fd)
+    with open(path, 'wb') as temp_file:
+        temp_file.write(data)
+    return path
+
+class _MediaReader(io.RawIOBase):
+    """Named, seekable read-only stream over a media buffer; unlike io.BytesIO it never copies the DB's memoryview"""
+    
+    def __init__(self, data, name: str):
+        self._view = memoryview(data).cast('B')
+        self._pos = 0
+        self.name = name
+    
+    def readable(self) -> bool:
+        return True
+    
+    def seekable(self) -> bool:
+        return True
+    
+    def readinto(self, b) -> int:
+        chunk = self._view[self._pos:self._pos + len(b)]
+        n = len(chunk)
+        b[:n] = chunk
+        self._pos += n
+        return n
+    
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._pos, io.SEEK_END: len(self._view)}[whence]
+        self._pos = max(0, base + offset)
+        return self._pos
+    
+    def tell(self) -> int:
+        return self._pos
+
 class UserbotPool:
     """Manages a pool of Telethon userbots for secret chat delivery"""
     
@@ -30,31 +83,33 @@ class UserbotPool:
         self.clients: Dict[int, TelegramClient] = {}  # userbot_id -> client
         self.secret_chat_managers: Dict[int, SecretChatManager] = {}  # userbot_id -> manager
         self.flooded_until: Dict[int, datetime] = {}  # userbot_id -> cooldown end time
+        self.secret_chat_ids: Dict[Tuple[int, int], int] = {}  # (userbot_id, buyer id) -> secret chat id
+        self.user_entities: Dict[Tuple[int, Any], Any] = {}  # (userbot_id, buyer username or id) -> User
+        self._bg_tasks: set = set()  # strong refs so fire-and-forget sends aren't garbage collected
         self.is_initialized = False
         self._last_used_index = 0
+        # Serializes initialize()/connect_single_userbot() so overlapping callers
+        # (startup, admin reconnects) never build two clients for one userbot
+        self._connect_lock = asyncio.Lock()
         
     async def initialize(self):
         """Initialize all enabled userbots from database"""
-        if self.is_initialized:
-            logger.info("Userbot pool already initialized")
-            return
-        
+        async with self._connect_lock:
+            if self.is_initialized:
+                logger.info("Userbot pool already initialized")
+                return
+            await self._initialize_clients()
+    
+    async def _initialize_clients(self):
+        """Connect every enabled userbot (caller holds _connect_lock)"""
         logger.info("🔄 Initializing userbot pool...")
         
-        from userbot_database import get_db_connection
-        conn = get_db_connection()
-        c = conn.cursor()
+        from userbot_database import get_connectable_userbots, update_userbots
+        statuses = []  # (userbot_id, is_connected, status_message), written in one sweep
         
         try:
-            # Get all enabled userbots with sessions
-            c.execute("""
-                SELECT id, name, api_id, api_hash, phone_number, session_string, priority
-                FROM userbots
-                WHERE is_enabled = TRUE AND session_string IS NOT NULL
-                ORDER BY priority DESC, id ASC
-            """)
-            
-            userbots = c.fetchall()
+            # Get all enabled userbots with sessions (pooled connection is returned before connecting)
+            userbots = await asyncio.to_thread(get_connectable_userbots)
             
             if not userbots:
                 logger.warning("⚠️ No enabled userbots found in database")
@@ -62,63 +117,67 @@ class UserbotPool:
             
             logger.info(f"📋 Found {len(userbots)} enabled userbot(s) to initialize")
             
-            # Initialize each userbot
-            for ub in userbots:
+            # Connect up to _CONNECT_CONCURRENCY userbots at once - each connect is several
+            # MTProto round-trips, so a serial loop made startup scale with pool size
+            connect_slots = asyncio.Semaphore(_CONNECT_CONCURRENCY)
+            
+            async def _connect_one(ub) -> Optional[Tuple[TelegramClient, SecretChatManager]]:
                 userbot_id = ub['id']
                 name = ub['name']
-                api_id = int(ub['api_id'])
-                api_hash = ub['api_hash']
-                session_string = ub['session_string']
                 
-                try:
-                    logger.info(f"🔌 Connecting userbot #{userbot_id} ({name})...")
-                    
-                    # Create Telethon client
-                    client = TelegramClient(
-                        StringSession(session_string),
-                        api_id,
-                        api_hash
-                    )
-                    
-                    await client.connect()
-                    
-                    # Check if authorized
-                    if not await client.is_user_authorized():
-                        logger.error(f"❌ Userbot #{userbot_id} not authorized!")
-                        await client.disconnect()
-                        self._update_connection_status(userbot_id, False, "Not authorized")
-                        continue
-                    
-                    # Get user info
-                    me = await client.get_me()
-                    username = me.username or me.first_name
-                    
-                    # Create secret chat manager
-                    secret_chat_manager = SecretChatManager(client, auto_accept=True)
-                    
-                    # Store in pool
-                    self.clients[userbot_id] = client
-                    self.secret_chat_managers[userbot_id] = secret_chat_manager
-                    
-                    # Update database status
-                    self._update_connection_status(userbot_id, True, f"Connected as @{username}")
-                    
-                    logger.info(f"✅ Userbot #{userbot_id} ({name}) connected as @{username}")
-                    
-                    # Set up scout handlers if enabled for this userbot
+                async with connect_slots:
                     try:
-                        c.execute("SELECT scout_mode_enabled FROM userbots WHERE id = %s", (userbot_id,))
-                        scout_result = c.fetchone()
-                        if scout_result and scout_result['scout_mode_enabled']:
-                            logger.info(f"🔍 Setting up Telethon scout handlers for userbot #{userbot_id}...")
-                            self._setup_telethon_scout_handlers(client, userbot_id)
+                        logger.info(f"🔌 Connecting userbot #{userbot_id} ({name})...")
+                        
+                        # Create Telethon client
+                        client = TelegramClient(
+                            StringSession(ub['session_string']),
+                            int(ub['api_id']),
+                            ub['api_hash']
+                        )
+                        
+                        await client.connect()
+                        
+                        # Check if authorized
+                        if not await client.is_user_authorized():
+                            logger.error(f"❌ Userbot #{userbot_id} not authorized!")
+                            await client.disconnect()
+                            statuses.append((userbot_id, False, "Not authorized"))
+                            return None
+                        
+                        # Get user info
+                        me = await client.get_me()
+                        username = me.username or me.first_name
+                        
+                        statuses.append((userbot_id, True, f"Connected as @{username}"))
+                        logger.info(f"✅ Userbot #{userbot_id} ({name}) connected as @{username}")
+                        
+                        # Create secret chat manager
+                        return client, SecretChatManager(client, auto_accept=True)
+                        
+                    except Exception as e:
+                        logger.error(f"❌ Failed to initialize userbot #{userbot_id} ({name}): {e}", exc_info=True)
+                        statuses.append((userbot_id, False, f"Error: {str(e)[:100]}"))
+                        return None
+            
+            connected = await asyncio.gather(*(_connect_one(ub) for ub in userbots))
+            
+            # Store in pool in priority order (round-robin walks self.clients in insertion order)
+            for ub, result in zip(userbots, connected):
+                if not result:
+                    continue
+                userbot_id = ub['id']
+                client, secret_chat_manager = result
+                self.clients[userbot_id] = client
+                self.secret_chat_managers[userbot_id] = secret_chat_manager
+                
+                # Set up scout handlers if enabled for this userbot
+                if ub['scout_mode_enabled']:
+                    try:
+                        logger.info(f"🔍 Setting up Telethon scout handlers for userbot #{userbot_id}...")
+                        self._setup_telethon_scout_handlers(client, userbot_id)
                     except Exception as scout_err:
                         logger.error(f"Error setting up scout handlers for userbot #{userbot_id}: {scout_err}")
-                    
-                except Exception as e:
-                    logger.error(f"❌ Failed to initialize userbot #{userbot_id} ({name}): {e}", exc_info=True)
-                    self._update_connection_status(userbot_id, False, f"Error: {str(e)[:100]}")
-                    continue
             
             self.is_initialized = True
             logger.info(f"✅ Userbot pool initialized with {len(self.clients)} active userbot(s)")
@@ -126,25 +185,12 @@ class UserbotPool:
         except Exception as e:
             logger.error(f"❌ Error initializing userbot pool: {e}", exc_info=True)
         finally:
-            conn.close()
+            await asyncio.to_thread(update_userbots, statuses)
     
-    def _update_connection_status(self, userbot_id: int, is_connected: bool, status_message: str):
+    async def _update_connection_status(self, userbot_id: int, is_connected: bool, status_message: str):
         """Update userbot connection status in database"""
-        from userbot_database import get_db_connection
-        conn = get_db_connection()
-        c = conn.cursor()
-        try:
-            c.execute("""
-                UPDATE userbots
-                SET is_connected = %s, status_message = %s, last_connected_at = %s
-                WHERE id = %s
-            """, (is_connected, status_message, datetime.now(timezone.utc) if is_connected else None, userbot_id))
-            conn.commit()
-        except Exception as e:
-            logger.error(f"Error updating connection status for userbot #{userbot_id}: {e}")
-            conn.rollback()
-        finally:
-            conn.close()
+        from userbot_database import update_userbot_connection
+        await asyncio.to_thread(update_userbot_connection, userbot_id, is_connected, status_message)
     
     def get_available_userbot(self) -> Optional[Tuple[int, TelegramClient, SecretChatManager]]:
         """Get next available userbot using round-robin selection, skipping flooded ones"""
@@ -218,6 +264,22 @@ class UserbotPool:
         
         return False, f"All delivery attempts failed. Errors: {attempt_errors}"
 
+    def _spawn(self, coro):
+        """Run `coro` in the background, keeping a reference until it finishes"""
+        task = asyncio.create_task(coro)
+        self._bg_tasks.add(task)
+        task.add_done_callback(self._bg_tasks.discard)
+        return task
+
+    async def _resolve_user(self, userbot_id: int, client: TelegramClient,
+                            buyer_user_id: int, buyer_username: Optional[str]):
+        """client.get_entity() for a buyer, memoized per userbot (a username lookup is an RPC every time)"""
+        key = (userbot_id, buyer_username or buyer_user_id)
+        user_entity = self.user_entities.get(key)
+        if user_entity is None:
+            user_entity = self.user_entities[key] = await client.get_entity(buyer_username or buyer_user_id)
+        return user_entity
+
     async def _attempt_delivery(
         self,
         userbot_id: int,
@@ -239,11 +301,11 @@ class UserbotPool:
             try:
                 if buyer_username:
                     logger.info(f"🔍 Getting FULL user entity by username: @{buyer_username}...")
-                    user_entity = await client.get_entity(buyer_username)
+                    user_entity = await self._resolve_user(userbot_id, client, buyer_user_id, buyer_username)
                     logger.info(f"✅ Got full user entity by username: {user_entity.id}")
                 else:
                     logger.info(f"🔍 Getting FULL user entity by ID: {buyer_user_id}...")
-                    user_entity = await client.get_entity(buyer_user_id)
+                    user_entity = await self._resolve_user(userbot_id, client, buyer_user_id, None)
                     logger.info(f"✅ Got full user entity by ID: {user_entity.id}")
             except Exception as e:
                 logger.error(f"❌ Error getting user entity for {buyer_user_id} (@{buyer_username or 'N/A'}): {e}")
@@ -260,8 +322,18 @@ class UserbotPool:
                 existing_chat = None
                 
                 try:
+                    # Repeat buyer on this userbot: reuse the chat we opened last time without
+                    # scanning the session or repeating the handshake
+                    cached_chat_id = self.secret_chat_ids.pop((userbot_id, user_entity.id), None)
+                    if cached_chat_id is not None:
+                        existing_chat = secret_chat_manager.get_secret_chat(cached_chat_id)
+                        if existing_chat:
+                            logger.info(f"♻️ Found cached secret chat with user {user_entity.id}: {cached_chat_id}")
+                    
                     # Method 1: Try session.get_all_secret_chats()
-                    if hasattr(secret_chat_manager, 'session'):
+                    if existing_chat:
+                        pass
+                    elif hasattr(secret_chat_manager, 'session'):
                         session = secret_chat_manager.session
                         if hasattr(session, 'get_all_secret_chats'):
                             existing_chats = session.get_all_secret_chats()
@@ -298,6 +370,7 @@ class UserbotPool:
                 
                 if secret_chat_obj:
                     use_secret_chat = True
+                    self.secret_chat_ids[(userbot_id, user_entity.id)] = secret_chat_id
                     logger.info(f"✅ Secret chat setup successful. Using E2E encryption for photos.")
                 else:
                     raise Exception("Retrieved secret chat object is None")
@@ -350,33 +423,59 @@ class UserbotPool:
                 except Exception as e:
                     logger.error(f"❌ Failed to send standard notification: {e}")
             
-            await asyncio.sleep(1)
-            
-            # 4. Send media files
+            # 4. Send media files - up to _MEDIA_SEND_CONCURRENCY items in flight; secret chat
+            # sends stay serialized because the protocol needs in-order sequence numbers
             sent_media_count = 0
             if media_binary_items and len(media_binary_items) > 0:
                 logger.info(f"📂 Sending {len(media_binary_items)} media items via SECRET CHAT...")
-                for idx, media_item in enumerate(media_binary_items, 1):
+                send_slots = asyncio.Semaphore(_MEDIA_SEND_CONCURRENCY)
+                secret_send_lock = asyncio.Lock()
+                uploaded_files = {}  # idx -> InputFile, so retries and fallbacks never re-upload
+                # suffix -> temp path; secret sends hold secret_send_lock, so one file per
+                # extension is rewritten for each item and removed once after the batch
+                secret_temp_files = {}
+                suffixes = {
+                    idx: os.path.splitext(item['filename'] or '')[1] or _DEFAULT_SUFFIXES.get(item['media_type'], '')
+                    for idx, item in enumerate(media_binary_items, 1)
+                }
+                
+                async def _send_media_item(idx: int, media_item: Dict) -> bool:
                     media_type = media_item['media_type']
                     media_binary = media_item['media_binary']
                     filename = media_item['filename']
+                    sent = False
+                    
+                    logger.info(f"📤 Sending SECRET CHAT media {idx}/{len(media_binary_items)} ({len(media_binary)} bytes) type: {media_type}...")
+                    
+                    # Telethon uploads straight from a named in-memory buffer; only the secret chat
+                    # library needs a file path, so the temp file is written on demand
+                    def _upload_buffer() -> _MediaReader:
+                        return _MediaReader(media_binary, filename)
+                    
+                    async def _uploaded_file():
+                        # Upload the bytes once; the FloodWait retry, the "(Retry)" send and the
+                        # video fallback all reference the same server-side file
+                        if idx not in uploaded_files:
+                            uploaded_files[idx] = await client.upload_file(_upload_buffer())
+                        return uploaded_files[idx]
                     
+                    async def _secret_file_path() -> str:
+                        # Called under secret_send_lock. Large videos are written by a worker
+                        # thread so the loop keeps serving the other in-flight sends
+                        suffix = suffixes[idx]
+                        secret_temp_files[suffix] = await asyncio.to_thread(
+                            _write_temp_file, media_binary, suffix, secret_temp_files.get(suffix)
+                        )
+                        return secret_temp_files[suffix]
+
                     try:
-                        logger.info(f"📤 Sending SECRET CHAT media {idx}/{len(media_binary_items)} ({len(media_binary)} bytes) type: {media_type}...")
-                        
-                        # Save to temp file (secret chat library needs file path)
-                        with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(filename)[1]) as temp_file:
-                            temp_file.write(media_binary)
-                            temp_path = temp_file.name
-                        
-                        
-                        try:
-                            if use_secret_chat and media_type == 'photo':
-                                # --- SECRET CHAT PHOTO ---
-                                file_size = len(media_binary)
+                        if use_secret_chat and media_type == 'photo':
+                            # --- SECRET CHAT PHOTO ---
+                            file_size = len(media_binary)
+                            async with secret_send_lock:
                                 await secret_chat_manager.send_secret_photo(
                                     secret_chat_obj,
-                                    temp_path,
+                                    await _secret_file_path(),
                                     thumb=b'',
                                     thumb_w=100,
                                     thumb_h=100,
@@ -384,101 +483,152 @@ class UserbotPool:
                                     h=1280,
                                     size=file_size
                                 )
-                                logger.info(f"✅ SECRET CHAT photo {idx} sent!")
-                                sent_media_count += 1
-                                
-                            elif use_secret_chat and media_type == 'video':
-                                # --- SECRET CHAT VIDEO (Attempt as Document to avoid corruption) ---
-                                logger.info(f"🚀 ATTEMPT: Sending video as Secret Document...")
-                                
-                                try:
-                                    # Try to use send_secret_document if available (avoids re-encoding/corruption)
-                                    method = getattr(secret_chat_manager, 'send_secret_document', None) or getattr(secret_chat_manager, 'send_secret_file', None)
-                                    
-                                    if method:
+                            logger.info(f"✅ SECRET CHAT photo {idx} sent!")
+                            sent = True
+
+                        elif use_secret_chat and media_type == 'video':
+                            # --- SECRET CHAT VIDEO (Attempt as Document to avoid corruption) ---
+                            logger.info(f"🚀 ATTEMPT: Sending video as Secret Document...")
+
+                            try:
+                                # Try to use send_secret_document if available (avoids re-encoding/corruption)
+                                method = getattr(secret_chat_manager, 'send_secret_document', None) or getattr(secret_chat_manager, 'send_secret_file', None)
+
+                                if method:
+                                    async with secret_send_lock:
                                         await method(
                                             secret_chat_obj,
-                                            temp_path,
+                                            await _secret_file_path(),
                                             caption=caption,
                                             # We rely on file extension for detection
                                         )
-                                        logger.info(f"✅ Sent video as secret document!")
-                                        sent_media_count += 1
-                                    else:
-                                        # Fallback to original send_secret_video if document method missing
-                                        # (This might corrupt, but we tried)
-                                        # Actually, let's fallback to PM if we can't do document
-                                        raise Exception("Library missing send_secret_document")
-                                        
-                                except Exception as e:
-                                    logger.error(f"Failed to send secret video as document: {e}")
-                                    
-                                    # Fallback to PM (Reliable)
-                                    video_caption = (
-                                        f"🎬 **Your Video Content**\n"
-                                        f"━━━━━━━━━━━━━━━━━━━━\n\n"
-                                        f"📦 **Order:** #{order_id}\n"
-                                        f"🎞️ **Product:** {product_data.get('product_name', 'Digital Content')}\n"
-                                        f"✨ **Ready to watch!**"
-                                    )
-                                    
-                                    await client.send_file(
-                                        user_entity,
-                                        temp_path,
-                                        caption=video_caption,
-                                        force_document=False,
-                                        supports_streaming=True
-                                    )
-                                    logger.info(f"✅ Video {idx} sent to PRIVATE MESSAGE (Fallback)!")
-                                    
-                                    # Send notification to secret chat
-                                    try:
-                                        await secret_chat_manager.send_secret_message(
-                                            secret_chat_obj,
-                                            f"🎬 Video {idx} sent to your regular chat messages (Secure Delivery Fallback)."
-                                        )
-                                    except: pass
-                                    sent_media_count += 1
-                                    
-                            else:
-                                # --- STANDARD DELIVERY (Fallback) ---
-                                logger.info(f"📤 Sending {media_type} via standard PM (Fallback)...")
-                                caption = (
-                                    f"📦 **Item {idx}/{len(media_binary_items)}**\n"
-                                    f"TYPE: {media_type.upper()}"
+                                    logger.info(f"✅ Sent video as secret document!")
+                                    sent = True
+                                else:
+                                    # Fallback to original send_secret_video if document method missing
+                                    # (This might corrupt, but we tried)
+                                    # Actually, let's fallback to PM if we can't do document
+                                    raise Exception("Library missing send_secret_document")
+
+                            except Exception as e:
+                                logger.error(f"Failed to send secret video as document: {e}")
+
+                                # Fallback to PM (Reliable)
+                                video_caption = (
+                                    f"🎬 **Your Video Content**\n"
+                                    f"━━━━━━━━━━━━━━━━━━━━\n\n"
+                                    f"📦 **Order:** #{order_id}\n"
+                                    f"🎞️ **Product:** {product_data.get('product_name', 'Digital Content')}\n"
+                                    f"✨ **Ready to watch!**"
                                 )
+
                                 await client.send_file(
                                     user_entity,
-                                    temp_path,
-                                    caption=caption,
+                                    await _uploaded_file(),
+                                    caption=video_caption,
                                     force_document=False,
                                     supports_streaming=True
                                 )
-                                logger.info(f"✅ Sent item {idx} via standard PM")
-                                sent_media_count += 1
-                                
+                                logger.info(f"✅ Video {idx} sent to PRIVATE MESSAGE (Fallback)!")
+
+                                # Send notification to secret chat
+                                try:
+                                    async with secret_send_lock:
+                                        await secret_chat_manager.send_secret_message(
+                                            secret_chat_obj,
+                                            f"🎬 Video {idx} sent to your regular chat messages (Secure Delivery Fallback)."
+                                        )
+                                except: pass
+                                sent = True
+
+                        else:
+                            # --- STANDARD DELIVERY (Fallback) ---
+                            logger.info(f"📤 Sending {media_type} via standard PM (Fallback)...")
+                            caption = (
+                                f"📦 **Item {idx}/{len(media_binary_items)}**\n"
+                                f"TYPE: {media_type.upper()}"
+                            )
+                            await client.send_file(
+                                user_entity,
+                                await _uploaded_file(),
+                                caption=caption,
+                                force_document=False,
+                                supports_streaming=True
+                            )
+                            logger.info(f"✅ Sent item {idx} via standard PM")
+                            sent = True
+
+                    except (PeerFloodError, FloodWaitError):
+                        raise
+                    except Exception as send_err:
+                        logger.error(f"❌ Failed to send media {idx}: {send_err}", exc_info=True)
+                        # Try extremely simple fallback
+                        try:
+                            await client.send_file(user_entity, await _uploaded_file(), caption=f"Item {idx} (Retry)")
+                        except: pass
+
+                    return sent
+                
+                async def _send_with_backoff(idx: int, media_item: Dict) -> bool:
+                    async with send_slots:
+                        try:
+                            return await _send_media_item(idx, media_item)
+                        except FloodWaitError as e:
+                            # Only back off when Telegram asks for it, and only for a short wait
+                            if e.seconds > _MAX_FLOOD_WAIT:
+                                raise
+                            logger.warning(f"⏳ FloodWait {e.seconds}s on media {idx}, retrying once")
+                            await asyncio.sleep(e.seconds)
+                            return await _send_media_item(idx, media_item)
+                
+                pending = list(enumerate(media_binary_items, 1))
+                if not use_secret_chat:
+                    # Standard PM: one upload request per album of up to _ALBUM_SIZE items;
+                    # an album that fails falls through to the per-item path below
+                    total = len(media_binary_items)
+                    albums = [pending[start:start + _ALBUM_SIZE] for start in range(0, total, _ALBUM_SIZE)]
+                    for album in albums:
+                        buffers = [_MediaReader(item['media_binary'], item['filename']) for _, item in album]
+                        try:
+                            await client.send_file(
+                                user_entity,
+                                buffers,
+                                caption=[f"📦 **Item {idx}/{total}**\nTYPE: {item['media_type'].upper()}" for idx, item in album],
+                                supports_streaming=True
+                            )
+                            sent_media_count += len(album)
+                            logger.info(f"✅ Sent items {album[0][0]}-{album[-1][0]} as one album via standard PM")
                         except PeerFloodError:
                             raise
-                        except Exception as send_err:
-                            logger.error(f"❌ Failed to send media {idx}: {send_err}", exc_info=True)
-                            # Try extremely simple fallback
-                            try:
-                                await client.send_file(user_entity, temp_path, caption=f"Item {idx} (Retry)")
-                            except: pass
-
-                        finally:
-                            try:
-                                os.unlink(temp_path)
-                            except: pass
-                        
-                        await asyncio.sleep(0.5)
-                        
-                    except Exception as e:
-                        logger.error(f"❌ Outer error sending media {idx}: {e}", exc_info=True)
+                        except Exception as album_err:
+                            logger.warning(f"⚠️ Album send failed, sending items one by one: {album_err}")
+                            continue
+                        album_ids = {idx for idx, _ in album}
+                        pending = [(idx, item) for idx, item in pending if idx not in album_ids]
+                
+                try:
+                    results = await asyncio.gather(
+                        *(_send_with_backoff(idx, item) for idx, item in pending),
+                        return_exceptions=True
+                    )
+                finally:
+                    for temp_path in secret_temp_files.values():
+                        try:
+                            os.unlink(temp_path)
+                        except OSError:
+                            pass
+                media_errors = []
+                for (idx, _), result in zip(pending, results):
+                    if isinstance(result, BaseException):
+                        media_errors.append(f"#{idx}: {type(result).__name__}: {result}")
+                    elif result:
+                        sent_media_count += 1
+                if media_errors:
+                    logger.error(f"❌ {len(media_errors)} media item(s) failed for order {order_id}: {'; '.join(media_errors)}")
             else:
                  logger.warning(f"⚠️ No media items to send for order {order_id}")
             
-            # 5. Send completion message
+            # 5. Send completion message - off the critical path, the media is already delivered
             if use_secret_chat:
                 completion_text = (
                     f"✅ **Delivery Complete!**\n"
@@ -491,11 +641,12 @@ class UserbotPool:
                     f"📦 **Order ID:** #{order_id}\n\n"
                     f"🎉 **Thank you for your purchase!**"
                 )
-                try:
-                    await secret_chat_manager.send_secret_message(secret_chat_obj, completion_text)
-                    logger.info(f"✅ Sent elegant completion message to secret chat")
-                except Exception as e:
-                    logger.error(f"❌ Failed to send completion message: {e}")
+                async def _send_completion():
+                    try:
+                        await secret_chat_manager.send_secret_message(secret_chat_obj, completion_text)
+                        logger.info(f"✅ Sent elegant completion message to secret chat")
+                    except Exception as e:
+                        logger.error(f"❌ Failed to send completion message: {e}")
             else:
                 completion_text = (
                     f"✅ **Delivery Complete!**\n"
@@ -505,16 +656,20 @@ class UserbotPool:
                     f"📦 **Order ID:** #{order_id}\n\n"
                     f"🎉 **Thank you for your purchase!**"
                 )
-                try:
-                    await client.send_message(user_entity, completion_text)
-                    logger.info(f"✅ Sent completion message to standard chat")
-                except Exception as e:
-                    logger.error(f"❌ Failed to send standard completion: {e}")
+                async def _send_completion():
+                    try:
+                        await client.send_message(user_entity, completion_text)
+                        logger.info(f"✅ Sent completion message to standard chat")
+                    except Exception as e:
+                        logger.error(f"❌ Failed to send standard completion: {e}")
+            self._spawn(_send_completion())
 
             return True, f"Product delivered via {'SECRET CHAT' if use_secret_chat else 'STANDARD PM'} (userbot #{userbot_id}) to user {buyer_user_id}"
             
         except Exception as e:
             logger.error(f"❌ Secret chat delivery failed (userbot #{userbot_id}): {e}", exc_info=True)
+            # The cached entity may be stale (username changed hands, peer invalid) - resolve fresh next time
+            self.user_entities.pop((userbot_id, buyer_username or buyer_user_id), None)
             return False, f"Delivery error: {e}"
     
     def _setup_telethon_scout_handlers(self, client: TelegramClient, userbot_id: int):
@@ -536,15 +691,9 @@ class UserbotPool:
                 if event.out:
                     return
                 
-                # Check if scout mode is still enabled
-                from userbot_database import get_db_connection
-                conn = get_db_connection()
-                c = conn.cursor()
-                c.execute("SELECT scout_mode_enabled FROM userbots WHERE id = %s", (userbot_id,))
-                result = c.fetchone()
-                conn.close()
-                
-                if not result or not result['scout_mode_enabled']:
+                # Check if scout mode is still enabled (off the event loop)
+                from userbot_database import is_scout_mode_enabled
+                if not await asyncio.to_thread(is_scout_mode_enabled, userbot_id):
                     return
                 
                 # Check message for keywords
@@ -604,7 +753,12 @@ class UserbotPool:
     
     async def connect_single_userbot(self, userbot_id: int) -> bool:
         """Connect a single userbot by ID"""
-        from userbot_database import get_db_connection
+        async with self._connect_lock:
+            return await self._connect_single_userbot(userbot_id)
+    
+    async def _connect_single_userbot(self, userbot_id: int) -> bool:
+        """Connect a single userbot (caller holds _connect_lock)"""
+        from userbot_database import get_connectable_userbots
         
         logger.info(f"🔄 Connecting single userbot #{userbot_id}...")
         
@@ -613,18 +767,10 @@ class UserbotPool:
             logger.info(f"⚠️ Userbot #{userbot_id} already connected")
             return True
         
-        conn = get_db_connection()
-        c = conn.cursor()
-        
         try:
-            # Get userbot info
-            c.execute("""
-                SELECT id, name, api_id, api_hash, phone_number, session_string
-                FROM userbots
-                WHERE id = %s AND is_enabled = TRUE AND session_string IS NOT NULL
-            """, (userbot_id,))
-            
-            ub = c.fetchone()
+            # Get userbot info and its scout flag in one read
+            rows = await asyncio.to_thread(get_connectable_userbots, userbot_id)
+            ub = rows[0] if rows else None
             
             if not ub:
                 logger.warning(f"⚠️ Userbot #{userbot_id} not found or not enabled")
@@ -651,7 +797,7 @@ class UserbotPool:
             if not await client.is_user_authorized():
                 logger.error(f"❌ Userbot #{userbot_id} not authorized!")
                 await client.disconnect()
-                self._update_connection_status(userbot_id, False, "Not authorized")
+                await self._update_connection_status(userbot_id, False, "Not authorized")
                 return False
             
             # Get user info
@@ -666,33 +812,21 @@ class UserbotPool:
             self.secret_chat_managers[userbot_id] = secret_chat_manager
             
             # Update database status
-            self._update_connection_status(userbot_id, True, f"Connected as @{username}")
+            await self._update_connection_status(userbot_id, True, f"Connected as @{username}")
             
             logger.info(f"✅ Userbot #{userbot_id} ({name}) connected as @{username}")
             
             # Set up scout handlers if needed (Telethon-based)
-            from userbot_database import get_db_connection
-            scout_conn = get_db_connection()
-            scout_c = scout_conn.cursor()
-            try:
-                scout_c.execute("SELECT scout_mode_enabled FROM userbots WHERE id = %s", (userbot_id,))
-                result = scout_c.fetchone()
-                if result and result['scout_mode_enabled']:
-                    logger.info(f"🔍 Setting up Telethon scout handlers for userbot #{userbot_id}...")
-                    self._setup_telethon_scout_handlers(client, userbot_id)
-            except Exception as e:
-                logger.error(f"Error checking scout mode: {e}")
-            finally:
-                scout_conn.close()
+            if ub['scout_mode_enabled']:
+                logger.info(f"🔍 Setting up Telethon scout handlers for userbot #{userbot_id}...")
+                self._setup_telethon_scout_handlers(client, userbot_id)
             
             return True
             
         except Exception as e:
             logger.error(f"❌ Failed to connect userbot #{userbot_id}: {e}", exc_info=True)
-            self._update_connection_status(userbot_id, False, f"Error: {str(e)[:100]}")
+            await self._update_connection_status(userbot_id, False, f"Error: {str(e)[:100]}")
             return False
-        finally:
-            conn.close()
     
     async def disconnect_all(self):
         """Disconnect all userbots in the pool"""
@@ -701,13 +835,15 @@ class UserbotPool:
         for userbot_id, client in list(self.clients.items()):
             try:
                 await client.disconnect()
-                self._update_connection_status(userbot_id, False, "Disconnected")
+                await self._update_connection_status(userbot_id, False, "Disconnected")
                 logger.info(f"✅ Disconnected userbot #{userbot_id}")
             except Exception as e:
                 logger.error(f"❌ Error disconnecting userbot #{userbot_id}: {e}")
         
         self.clients.clear()
         self.secret_chat_managers.clear()
+        self.secret_chat_ids.clear()
+        self.user_entities.clear()
         self.is_initialized = False
         logger.info("✅ All userbots disconnected")
 
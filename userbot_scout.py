@@ -16,7 +16,7 @@ try:
 except ImportError:
     PYROGRAM_AVAILABLE = False
 
-from utils import get_db_connection
+from utils import get_db_connection, db_cursor
 
 logger = logging.getLogger(__name__)
 
@@ -30,18 +30,16 @@ class ScoutSystem:
         
     async def load_keywords(self) -> List[Dict]:
         """Load active keywords from database"""
-        conn = None
         try:
-            conn = get_db_connection()
-            c = conn.cursor()
-            c.execute("""
-                SELECT id, keyword, match_type, case_sensitive, 
-                       response_text, response_delay_seconds
-                FROM scout_keywords 
-                WHERE is_active = TRUE
-                ORDER BY keyword
-            """)
-            keywords = c.fetchall()
+            with db_cursor(readonly=True) as c:
+                c.execute("""
+                    SELECT id, keyword, match_type, case_sensitive, 
+                           response_text, response_delay_seconds
+                    FROM scout_keywords 
+                    WHERE is_active = TRUE
+                    ORDER BY keyword
+                """)
+                keywords = c.fetchall()
             self.keywords_cache = [dict(k) for k in keywords]
             self.last_cache_update = datetime.now()
             logger.info(f"✅ Loaded {len(self.keywords_cache)} active scout keywords")
@@ -49,9 +47,6 @@ class ScoutSystem:
         except Exception as e:
             logger.error(f"Error loading scout keywords: {e}")
             return []
-        finally:
-            if conn:
-                conn.close()
     
     async def check_message(self, message_text: str) -> Optional[Dict]:
         """Check if message contains any keywords. Returns matched keyword."""
@@ -205,14 +200,9 @@ def setup_scout_handlers(client: Client, userbot_id: int):
         async def handle_group_message(client: Client, message: Message):
             """Monitor all group messages for keywords"""
             try:
-                # Check if this userbot has scout mode enabled
-                conn = get_db_connection()
-                c = conn.cursor()
-                c.execute("SELECT scout_mode_enabled FROM userbots WHERE id = %s", (userbot_id,))
-                result = c.fetchone()
-                conn.close()
-                
-                if not result or not result['scout_mode_enabled']:
+                # Check if this userbot has scout mode enabled (off the event loop)
+                from userbot_database import is_scout_mode_enabled
+                if not await asyncio.to_thread(is_scout_mode_enabled, userbot_id):
                     return  # Scout mode disabled for this userbot
                 
                 # Check message for keywords
@@ -312,6 +302,8 @@ def toggle_scout_mode(userbot_id: int, enabled: bool) -> bool:
         conn = get_db_connection()
         c = conn.cursor()
         c.execute("UPDATE userbots SET scout_mode_enabled = %s WHERE id = %s", (enabled, userbot_id))
+        from userbot_database import notify_userbots_changed
+        notify_userbots_changed(c)
         conn.commit()
         logger.info(f"✅ Scout mode {'enabled' if enabled else 'disabled'} for userbot {userbot_id}")
         return True
@@ -342,27 +334,24 @@ def test_scout_mode() -> Dict:
         status['errors'].append("Pyrogram library not installed")
         return status
     
-    # Check database
-    conn = None
+    # Check database (pure reads - autocommit, no transaction)
     try:
-        conn = get_db_connection()
-        c = conn.cursor()
-        
-        # Count userbots
-        c.execute("SELECT COUNT(*) as count FROM userbots")
-        status['userbots_configured'] = c.fetchone()['count']
-        
-        # Count connected userbots
-        c.execute("SELECT COUNT(*) as count FROM userbots WHERE is_connected = TRUE")
-        status['userbots_connected'] = c.fetchone()['count']
-        
-        # Count userbots with scout mode
-        c.execute("SELECT COUNT(*) as count FROM userbots WHERE scout_mode_enabled = TRUE")
-        status['userbots_with_scout'] = c.fetchone()['count']
-        
-        # Count active keywords
-        c.execute("SELECT COUNT(*) as count FROM scout_keywords WHERE is_active = TRUE")
-        status['active_keywords'] = c.fetchone()['count']
+        with db_cursor(readonly=True) as c:
+            # Count userbots
+            c.execute("SELECT COUNT(*) as count FROM userbots")
+            status['userbots_configured'] = c.fetchone()['count']
+            
+            # Count connected userbots
+            c.execute("SELECT COUNT(*) as count FROM userbots WHERE is_connected = TRUE")
+            status['userbots_connected'] = c.fetchone()['count']
+            
+            # Count userbots with scout mode
+            c.execute("SELECT COUNT(*) as count FROM userbots WHERE scout_mode_enabled = TRUE")
+            status['userbots_with_scout'] = c.fetchone()['count']
+            
+            # Count active keywords
+            c.execute("SELECT COUNT(*) as count FROM scout_keywords WHERE is_active = TRUE")
+            status['active_keywords'] = c.fetchone()['count']
         
         # Check for issues
         if status['userbots_configured'] == 0:
@@ -377,9 +366,6 @@ def test_scout_mode() -> Dict:
     except Exception as e:
         status['errors'].append(f"Database error: {e}")
         logger.error(f"Error testing scout mode: {e}")
-    finally:
-        if conn:
-            conn.close()
     
     return status
 